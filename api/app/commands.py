@@ -0,0 +1,23 @@
+import json
+
+from app.flask_app import app, migration, project
+
+
+@app.cli.command("migrate")
+def migrate():
+    """Apply pending index migrations and wait for indexes to be online."""
+    applied_versions = migration.migrate()
+    print(json.dumps({"applied": applied_versions, "version": migration.get_version()}))
+
+
+@app.cli.command("indexes")
+def indexes():
+    """Report the index migration version and existing indexes."""
+    print(json.dumps(migration.status(), indent=2, default=str))
+
+
+@app.cli.command("rebuild-statistics")
+def rebuild_statistics():
+    """Rebuild the materialized label statistics from the existing labels."""
+    annotated = project.get_statistics().rebuild_label_statistics()
+    print(json.dumps({"annotated": annotated}))
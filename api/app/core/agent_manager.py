@@ -168,8 +168,12 @@ class AgentManager:
         -------
         1. verify annotator == job_uuid
         2. verify agent_uuid is valid in db
-        3. verify label_name in schema
+
+        label_name is checked against the active schema if the project
+        validates labels.
         """
+        if self.project.validate_labels:
+            self.project.get_schemas().check_labels([{"label_name": label_name}])
 
         # if job_uuid alreday exists, only adding new links to annotation nodes
         q = """
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+# aggregated label of a record whose top labels have the same votes
+TIED_ANNOTATIONS = "tied_annotations"
+# votes closer than this are equal
+__VOTE_TOLERANCE = 1e-9
+
+
+def aggregate_labels(rows, aggregation="majority_vote", annotator_weights=None):
+    """
+    Aggregate the labels of each record, for all records at once.
+    Records and joined label values are encoded to integer ids once, the
+    votes of each (record, label) are summed over the sorted ids, and a
+    record whose top labels have the same votes is tied (as majority_vote).
+    Aggregation functions (see SUPPORTED_AGGREGATION_FUNCTIONS):
+        - majority_vote: one vote per label
+        - weighted_majority_vote: votes weighted by annotator_weights,
+          1 for annotators without a weight
+        - verified_label: verified labels win; records without a
+          verification fall back to majority_vote
+    :param rows: list of {"uuid":.., "label_value": list of str,
+        "annotator":.., "verified": bool}
+    :return: dict of record uuid to aggregated label
+    """
+    if len(rows) == 0:
+        return {}
+    record_codes, records = pd.factorize(
+        np.asarray([row["uuid"] for row in rows], dtype=object)
+    )
+    label_codes, labels = pd.factorize(
+        np.asarray([",".join(row["label_value"]) for row in rows], dtype=object)
+    )
+    weights = np.ones(len(rows), dtype=np.float64)
+    if aggregation == "weighted_majority_vote" and annotator_weights:
+        weights = np.asarray(
+            [annotator_weights.get(row.get("annotator"), 1.0) for row in rows],
+            dtype=np.float64,
+        )
+    if aggregation == "verified_label":
+        verified = np.asarray([bool(row.get("verified")) for row in rows])
+        has_verified = np.zeros(len(records), dtype=bool)
+        has_verified[record_codes[verified]] = True
+        keep = verified | ~has_verified[record_codes]
+        record_codes, label_codes = record_codes[keep], label_codes[keep]
+        weights = weights[keep]
+
+    # votes of each (record, label), sorted by record
+    keys = record_codes.astype(np.int64) * len(labels) + label_codes
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    votes = np.add.reduceat(weights[order], starts)
+    vote_records = keys[starts] // len(labels)
+    vote_labels = keys[starts] % len(labels)
+    # top labels of each record
+    record_starts = np.flatnonzero(np.r_[True, vote_records[1:] != vote_records[:-1]])
+    top_votes = np.maximum.reduceat(votes, record_starts)
+    sizes = np.diff(np.r_[record_starts, len(votes)])
+    is_top = votes >= np.repeat(top_votes, sizes) - __VOTE_TOLERANCE
+    top_counts = np.add.reduceat(is_top.astype(np.int64), record_starts)
+    # the first top label of each record
+    top_index = np.flatnonzero(is_top)
+    _, first = np.unique(vote_records[top_index], return_index=True)
+    values = np.asarray(labels, dtype=object)[vote_labels[top_index[first]]]
+    values[top_counts > 1] = TIED_ANNOTATIONS
+    return dict(zip(records[vote_records[record_starts]], values.tolist()))
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+# code of a record not labeled by an annotator
+MISSING_CODE = -1
+
+
+def factorize_labels(rows):
+    """
+    Factorize (record, annotator, label) rows once into a matrix of
+    integer label codes, records x annotators.
+    Records and annotators are those of the rows; a record not labeled by an
+    annotator is MISSING_CODE. If an annotator has several labels on a
+    record (e.g. span labels), the last one is kept.
+    :param rows: list of {"uuid":.., "annotator":.., "label":..}
+    :return: (codes, annotators, categories), annotators sorted by name
+    """
+    df = pd.DataFrame(rows, columns=["uuid", "annotator", "label"])
+    record_codes, records = pd.factorize(df["uuid"])
+    annotator_codes, annotators = pd.factorize(df["annotator"], sort=True)
+    label_codes, categories = pd.factorize(df["label"], sort=True)
+    codes = np.full((len(records), len(annotators)), MISSING_CODE, dtype=np.int32)
+    codes[record_codes, annotator_codes] = label_codes
+    return codes, annotators.to_list(), categories.to_list()
+
+
+def __indicators(codes, n_categories):
+    # one records x annotators 0/1 matrix per category, built one at a time
+    for category in range(n_categories):
+        yield (codes == category).astype(np.float32)
+
+
+def pairwise_cohen_kappa(codes, n_categories):
+    """
+    Cohen's kappa of every pair of annotators.
+    The agreement counts of all pairs (the diagonals of their confusion
+    matrices) are matrix products of the per-category indicator matrices;
+    the expected agreements are products of the per-annotator marginals.
+    Only the upper triangle is evaluated and mirrored.
+    Missing labels must be given a category of their own beforehand.
+    :return: annotators x annotators matrix, 1 on the diagonal
+    """
+    n_records, n_annotators = codes.shape
+    agreements = np.zeros((n_annotators, n_annotators), dtype=np.float64)
+    marginals = np.zeros((n_annotators, n_categories), dtype=np.float64)
+    for category, indicator in enumerate(__indicators(codes, n_categories)):
+        agreements += indicator.T @ indicator
+        marginals[:, category] = indicator.sum(axis=0)
+    rows, columns = np.triu_indices(n_annotators, k=1)
+    observed = agreements[rows, columns] / n_records
+    marginals /= n_records
+    expected = np.einsum("ij,ij->i", marginals[rows], marginals[columns])
+    # both annotators always chose the same single category
+    chance = expected >= 1
+    kappa = np.ones(len(rows), dtype=np.float64)
+    kappa[~chance] = (observed[~chance] - expected[~chance]) / (1 - expected[~chance])
+    result = np.eye(n_annotators, dtype=np.float64)
+    result[rows, columns] = kappa
+    result[columns, rows] = kappa
+    return result
+
+
+def __category_counts(codes, n_categories):
+    # records x categories number of annotators who chose each category,
+    # for records labeled by at least two annotators
+    record_index, annotator_index = np.nonzero(codes != MISSING_CODE)
+    counts = np.bincount(
+        record_index * n_categories + codes[record_index, annotator_index],
+        minlength=codes.shape[0] * n_categories,
+    ).reshape(codes.shape[0], n_categories)
+    return counts[counts.sum(axis=1) >= 2].astype(np.float64)
+
+
+def fleiss_kappa(codes, n_categories):
+    """
+    Fleiss' kappa over all annotators. Records may have a varying number
+    of labels; records labeled by fewer than two annotators are ignored.
+    :return: float, or None if no record has two labels
+    """
+    counts = __category_counts(codes, n_categories)
+    if len(counts) == 0:
+        return None
+    raters = counts.sum(axis=1)
+    observed = np.mean(((counts**2).sum(axis=1) - raters) / (raters * (raters - 1)))
+    proportions = counts.sum(axis=0) / raters.sum()
+    expected = (proportions**2).sum()
+    if expected >= 1:
+        return 1.0
+    return float((observed - expected) / (1 - expected))
+
+
+def krippendorff_alpha(codes, n_categories):
+    """
+    Krippendorff's alpha for nominal labels, from the coincidence matrix of
+    the records labeled by at least two annotators. Missing labels are
+    left out rather than counted as a category.
+    :return: float, or None if no record has two labels
+    """
+    counts = __category_counts(codes, n_categories)
+    if len(counts) == 0:
+        return None
+    weighted = counts / (counts.sum(axis=1, keepdims=True) - 1)
+    coincidences = weighted.T @ counts - np.diag(weighted.sum(axis=0))
+    totals = coincidences.sum(axis=1)
+    n = totals.sum()
+    expected = n**2 - (totals**2).sum()
+    if expected <= 0:
+        return 1.0
+    disagreement = n - np.trace(coincidences)
+    return float(1 - (n - 1) * disagreement / expected)
@@ -1,12 +1,69 @@
-from neo4j import GraphDatabase
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from app.core.query_stats import (
+    DEFAULT_QUERY_PROFILE_RATE,
+    DEFAULT_SLOW_QUERY_SECONDS,
+    QueryStats,
+)
+from neo4j import READ_ACCESS, GraphDatabase, Query, unit_of_work
+from neo4j.exceptions import ClientError
+
+# max connections of the driver pool, per worker process
+DEFAULT_NEO4J_POOL_SIZE = 100
+# seconds to wait for a free pool connection before failing
+DEFAULT_NEO4J_ACQUISITION_TIMEOUT = 60
+# seconds a pool connection is kept before it is replaced
+DEFAULT_NEO4J_MAX_CONNECTION_LIFETIME = 3600
 
 
 class Database:
+    """
+    Neo4j driver of a worker process.
+    Sessions are cheap and not thread-safe, so each call opens its own;
+    the connections behind them are reused from the driver pool.
+    query_timeout (seconds) is the default timeout of every transaction,
+    None for the dbms.transaction.timeout of the database.
+    Every call is recorded in query_stats under a query name, by default
+    the module.function calling it.
+    """
 
-    def __init__(self, uri, username, password):
-        driver = GraphDatabase.driver(uri, auth=(username, password))
+    def __init__(
+        self,
+        uri,
+        username,
+        password,
+        max_connection_pool_size=DEFAULT_NEO4J_POOL_SIZE,
+        connection_acquisition_timeout=DEFAULT_NEO4J_ACQUISITION_TIMEOUT,
+        max_connection_lifetime=DEFAULT_NEO4J_MAX_CONNECTION_LIFETIME,
+        query_timeout=None,
+        slow_query_seconds=DEFAULT_SLOW_QUERY_SECONDS,
+        profile_rate=DEFAULT_QUERY_PROFILE_RATE,
+    ):
+        self.max_connection_pool_size = int(max_connection_pool_size)
+        self.connection_acquisition_timeout = float(connection_acquisition_timeout)
+        self.max_connection_lifetime = float(max_connection_lifetime)
+        self.query_timeout = (
+            None if query_timeout in (None, "") else float(query_timeout)
+        )
+        driver = GraphDatabase.driver(
+            uri,
+            auth=(username, password),
+            max_connection_pool_size=self.max_connection_pool_size,
+            connection_acquisition_timeout=self.connection_acquisition_timeout,
+            max_connection_lifetime=self.max_connection_lifetime,
+        )
         driver.verify_connectivity()
         self.driver = driver
+        self.__lock = threading.Lock()
+        self.__sessions = 0
+        self.__max_sessions = 0
+        self.__acquisition_errors = 0
+        self.query_stats = QueryStats(
+            slow_query_seconds=slow_query_seconds, profile_rate=profile_rate
+        )
 
     def close(self):
         self.driver.close()
@@ -14,21 +71,241 @@ class Database:
     def verify_connectivity(self):
         self.driver.verify_connectivity()
 
-    def read_db(self, query, args={}):
-        with self.driver.session() as session:
-            result = session.execute_read(self._run_cypher_query, query, args)
-        return result
+    def read_db(self, query, args={}, timeout=None, name=None):
+        return self.__execute(
+            "execute_read",
+            self._run_cypher_query,
+            query,
+            args,
+            timeout,
+            name or self.__caller_name(),
+            profile=True,
+        )
 
-    def write_db(self, query, args={}):
-        with self.driver.session() as session:
-            result = session.execute_write(self._run_cypher_query, query, args)
-        return result
+    def write_db(self, query, args={}, timeout=None, name=None):
+        return self.__execute(
+            "execute_write",
+            self._run_cypher_query,
+            query,
+            args,
+            timeout,
+            name or self.__caller_name(),
+            profile=True,
+        )
 
-    def write_db_transction(self, query_func, query, args={}):
-        with self.driver.session() as session:
-            result = session.execute_write(query_func, query, args)
-        return result
+    def write_db_transction(self, query_func, query, args={}, timeout=None, name=None):
+        return self.__execute(
+            "execute_write",
+            query_func,
+            query,
+            args,
+            timeout,
+            name or self.__caller_name(),
+        )
+
+    def iter_db(self, query, args={}, timeout=None, name=None):
+        """
+        Run a read query and yield its records as they are fetched, instead
+        of materializing the result. The session and its connection are held
+        until the iterator is exhausted or closed, and a failure is not
+        retried as records may have been consumed already.
+        Its latency runs until the iterator is exhausted or closed.
+        """
+        return self.__iter(query, args, timeout, name or self.__caller_name())
+
+    def run_schema(self, query, args={}, timeout=None, name=None):
+        # schema statements (index/constraint) run in their own auto-commit
+        # transaction; mixing them with data writes is rejected by neo4j
+        return self.__auto_commit(query, args, timeout, name or self.__caller_name())
+
+    def write_db_auto_commit(self, query, args={}, timeout=None, name=None):
+        # CALL {} IN TRANSACTIONS commits its own inner transactions and is
+        # only allowed in an auto-commit transaction
+        return self.__auto_commit(query, args, timeout, name or self.__caller_name())
+
+    def __execute(self, access, query_func, query, args, timeout, name, profile=False):
+        if profile and self.query_stats.sample_profile(query):
+            query = "PROFILE " + query
+        summaries = []
+        queries = []
+
+        def query_function(tx, query, args):
+            # queries of the last attempt
+            queries.clear()
+            recording = _RecordingTransaction(tx, queries)
+            value = query_func(recording, query, args)
+            # summaries of the attempt that commits, remaining records are
+            # discarded by the commit anyway
+            summaries[:] = [result.consume() for result in recording.results]
+            return value
+
+        start = time.perf_counter()
+        try:
+            with self.__session() as session:
+                value = getattr(session, access)(
+                    self.__with_timeout(query_function, timeout), query, args
+                )
+        except Exception:
+            self.query_stats.record(
+                name,
+                query if query is not None else "; ".join(queries),
+                args,
+                time.perf_counter() - start,
+                error=True,
+            )
+            raise
+        # query functions may run other queries than the given one
+        self.query_stats.record(
+            name,
+            query if query is not None else "; ".join(queries),
+            args,
+            time.perf_counter() - start,
+            rows=len(value) if isinstance(value, list) else None,
+            summaries=summaries,
+        )
+        return value
+
+    def __iter(self, query, args, timeout, name):
+        start = time.perf_counter()
+        rows = 0
+        summaries = []
+        error = False
+        try:
+            with self.__session(default_access_mode=READ_ACCESS) as session:
+                with session.begin_transaction(timeout=self.__timeout(timeout)) as tx:
+                    result = tx.run(query, args)
+                    for record in result:
+                        rows += 1
+                        yield record
+                    summaries.append(result.consume())
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.query_stats.record(
+                name,
+                query,
+                args,
+                time.perf_counter() - start,
+                rows=rows,
+                summaries=summaries,
+                error=error,
+            )
+
+    def __auto_commit(self, query, args, timeout, name):
+        start = time.perf_counter()
+        try:
+            with self.__session() as session:
+                result = session.run(self.__query(query, timeout), args)
+                records = list(result)
+                summary = result.consume()
+        except Exception:
+            self.query_stats.record(
+                name, query, args, time.perf_counter() - start, error=True
+            )
+            raise
+        self.query_stats.record(
+            name,
+            query,
+            args,
+            time.perf_counter() - start,
+            rows=len(records),
+            summaries=[summary],
+        )
+        return records
+
+    @staticmethod
+    def __caller_name():
+        # module.function of the code calling the public method
+        frame = sys._getframe(2)
+        module = frame.f_globals.get("__name__", "").rsplit(".", 1)[-1]
+        return f"{module}.{frame.f_code.co_name}"
+
+    def pool_stats(self):
+        """
+        Utilization of the driver connection pool of this worker process.
+        in_use/idle are the connections of the pool; sessions counts the
+        open sessions of this Database, max_sessions its peak, and
+        acquisition_errors the sessions that waited
+        connection_acquisition_timeout for a connection of a full pool.
+        """
+        in_use, idle = 0, 0
+        # the pool is internal to the driver, its stats are best effort
+        pool = getattr(self.driver, "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if pool is not None and connections is not None:
+            with pool.lock:
+                for address_connections in connections.values():
+                    for connection in address_connections:
+                        if connection.in_use:
+                            in_use += 1
+                        else:
+                            idle += 1
+        with self.__lock:
+            return {
+                "max_connection_pool_size": self.max_connection_pool_size,
+                "in_use": in_use,
+                "idle": idle,
+                "utilization": round(in_use / self.max_connection_pool_size, 4),
+                "sessions": self.__sessions,
+                "max_sessions": self.__max_sessions,
+                "acquisition_errors": self.__acquisition_errors,
+                "connection_acquisition_timeout": self.connection_acquisition_timeout,
+                "max_connection_lifetime": self.max_connection_lifetime,
+                "query_timeout": self.query_timeout,
+            }
+
+    @contextmanager
+    def __session(self, **config):
+        # counts the open sessions, and those failing to get a connection
+        with self.__lock:
+            self.__sessions += 1
+            self.__max_sessions = max(self.__max_sessions, self.__sessions)
+        try:
+            with self.driver.session(**config) as session:
+                yield session
+        except ClientError as ex:
+            if "failed to obtain a connection from the pool" in str(ex):
+                with self.__lock:
+                    self.__acquisition_errors += 1
+            raise
+        finally:
+            with self.__lock:
+                self.__sessions -= 1
+
+    def __timeout(self, timeout):
+        return self.query_timeout if timeout is None else timeout
+
+    def __with_timeout(self, query_func, timeout):
+        timeout = self.__timeout(timeout)
+        if timeout is None:
+            return query_func
+        return unit_of_work(timeout=timeout)(query_func)
+
+    def __query(self, query, timeout):
+        timeout = self.__timeout(timeout)
+        if timeout is None:
+            return query
+        return Query(query, timeout=timeout)
 
     @staticmethod
     def _run_cypher_query(tx, query, args):
         return list(tx.run(query, args))
+
+
+class _RecordingTransaction:
+    """Transaction of a query function, keeping the queries it runs."""
+
+    def __init__(self, tx, queries):
+        self.tx = tx
+        self.queries = queries
+        self.results = []
+
+    def run(self, query, parameters=None, **kwargs):
+        result = self.tx.run(query, parameters, **kwargs)
+        self.queries.append(str(query))
+        self.results.append(result)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.tx, name)
@@ -0,0 +1,162 @@
+import threading
+
+import numpy as np
+from app.core.database import Database
+
+# number of query vectors scored per matrix product
+EMBEDDING_QUERY_BATCH_SIZE = 1024
+
+
+class EmbeddingIndex:
+    """
+    In-memory index of the record-level metadata vectors of one
+    record_meta_name, for cosine similarity search.
+    Vectors are kept L2-normalized in a contiguous float32 matrix, so
+    top-k similarity is a batched matrix product.
+    batch_update_metadata bumps a version counter on the (:MetadataVersion)
+    node of the name and stamps the written Metadata nodes with it; before
+    each search, only vectors newer than the loaded version are read.
+    """
+
+    def __init__(self, database: Database, record_meta_name):
+        self.database = database
+        self.record_meta_name = record_meta_name
+        self.version = -1
+        self.dimension = None
+        self.__uuids = []
+        self.__rows = {}
+        self.__matrix = np.zeros((0, 0), dtype=np.float32)
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__uuids)
+
+    def get_database_version(self):
+        q = """
+            MATCH (v:MetadataVersion {name: $record_meta_name})
+            RETURN v.version as version
+        """
+        result = self.database.read_db(
+            q, args={"record_meta_name": self.record_meta_name}
+        )
+        if len(result) == 0:
+            return 0
+        return result[0]["version"]
+
+    def refresh(self):
+        """
+        Load the vectors written since the loaded version.
+        The first refresh loads all vectors of the name.
+        """
+        version = self.get_database_version()
+        with self.__lock:
+            if version == self.version:
+                return
+            q = """
+                MATCH (n:Record)-[:RECORD_META_OF {name:$record_meta_name}]-(m:Metadata)
+                WHERE $version < 0 OR coalesce(m.version, 0) > $version
+                RETURN n.uuid as uuid, m.value as value
+            """
+            # vectors are streamed, not materialized as records first
+            result = self.database.iter_db(
+                q,
+                args={
+                    "record_meta_name": self.record_meta_name,
+                    "version": self.version,
+                },
+            )
+            self.__update((item["uuid"], item["value"]) for item in result)
+            self.version = version
+
+    def __update(self, items):
+        uuids = []
+        vectors = []
+        for uuid, value in items:
+            if not isinstance(value, list) or len(value) == 0:
+                continue
+            if self.dimension is None:
+                self.dimension = len(value)
+            if len(value) != self.dimension:
+                continue
+            uuids.append(uuid)
+            vectors.append(value)
+        if len(vectors) == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+        new_uuids = [uuid for uuid in dict.fromkeys(uuids) if uuid not in self.__rows]
+        size = len(self.__uuids)
+        if size + len(new_uuids) > self.__matrix.shape[0]:
+            capacity = max(size + len(new_uuids), 2 * self.__matrix.shape[0])
+            matrix = np.zeros((capacity, self.dimension), dtype=np.float32)
+            if size > 0:
+                matrix[:size] = self.__matrix[:size]
+            self.__matrix = matrix
+        for uuid in new_uuids:
+            self.__rows[uuid] = len(self.__uuids)
+            self.__uuids.append(uuid)
+        self.__matrix[[self.__rows[uuid] for uuid in uuids]] = vectors
+
+    def search(self, uuid_list, limit):
+        """
+        Find the most similar records of each record in uuid_list.
+        :return: list of record uuids, 'limit' per query record
+            (excluding itself), most similar first, concatenated in
+            uuid_list order. Records without a vector are skipped.
+        """
+        self.refresh()
+        with self.__lock:
+            size = len(self.__uuids)
+            matrix = self.__matrix[:size]
+            uuids = list(self.__uuids)
+            query_rows = [
+                self.__rows[uuid] for uuid in uuid_list if uuid in self.__rows
+            ]
+        k = min(int(limit), size - 1)
+        if k <= 0 or len(query_rows) == 0:
+            return []
+        result = []
+        for start in range(0, len(query_rows), EMBEDDING_QUERY_BATCH_SIZE):
+            rows = np.asarray(query_rows[start : start + EMBEDDING_QUERY_BATCH_SIZE])
+            scores = matrix[rows] @ matrix.T
+            # a record is never similar to itself
+            scores[np.arange(len(rows)), rows] = -np.inf
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            for columns in np.take_along_axis(top, order, axis=1):
+                result.extend([uuids[column] for column in columns])
+        return result
+
+
+class EmbeddingIndexes:
+    """
+    Embedding indexes of a project, keyed by record_meta_name, built on
+    first use in each worker process.
+    """
+
+    def __init__(self, database: Database):
+        self.database = database
+        self.__indexes = {}
+        self.__lock = threading.Lock()
+
+    def get(self, record_meta_name):
+        with self.__lock:
+            if record_meta_name not in self.__indexes:
+                self.__indexes[record_meta_name] = EmbeddingIndex(
+                    self.database, record_meta_name
+                )
+            return self.__indexes[record_meta_name]
+
+    def stats(self):
+        with self.__lock:
+            return {
+                name: {
+                    "size": len(index),
+                    "dimension": index.dimension,
+                    "version": index.version,
+                }
+                for name, index in self.__indexes.items()
+            }
@@ -0,0 +1,176 @@
+import re
+
+from app.enums.search_mode import SearchMode
+
+# fulltext index on Record.content, created by index migration 2
+RECORD_CONTENT_INDEX = "index_record_content"
+# shortest literal used as a prefix query by the regex prefilter
+MIN_PREFIX_LENGTH = 2
+# longer words are split by the index analyzer
+MAX_TERM_LENGTH = 255
+
+__LUCENE_SPECIAL_CHARACTERS = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+__INLINE_FLAGS = re.compile(r"\(\?[a-zA-Z\-]*\)")
+__QUANTIFIERS = "*?+{"
+__WORD = re.compile(r"[A-Za-z0-9]")
+
+
+def escape_term(term):
+    return __LUCENE_SPECIAL_CHARACTERS.sub(r"\\\1", term)
+
+
+def quote_phrase(text):
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def build_keyword_query(keyword, search_mode):
+    """
+    Translate a keyword into a fulltext (Lucene) query.
+    Terms are quoted, so they go through the index analyzer and
+    Lucene operators in the keyword are matched literally.
+    :return: query string, or None if the keyword has no terms
+    """
+    terms = keyword.split()
+    if len(terms) == 0:
+        return None
+    if search_mode == SearchMode.PHRASE.value:
+        return quote_phrase(" ".join(terms))
+    if search_mode == SearchMode.PREFIX.value:
+        *terms, prefix = terms
+        return " ".join(
+            [f"+{quote_phrase(term)}" for term in terms]
+            + [f"+{escape_term(prefix.lower())}*"]
+        )
+    return " ".join([f"+{quote_phrase(term)}" for term in terms])
+
+
+def __regex_items(pattern):
+    """
+    Reduce a regex to the sequence of single-character items it must match:
+    ("char", c) a literal character, ("space",) a whitespace,
+    ("edge",) start/end of the content, ("any",) anything else.
+    Returns None if the pattern can not be reduced safely.
+    """
+    items = [("edge",)]
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "|":
+            return None
+        elif c == "\\":
+            if i + 1 >= len(pattern):
+                return None
+            escaped = pattern[i + 1]
+            i += 1
+            if escaped == "Q":
+                return None
+            elif escaped == "s" or escaped.isspace():
+                items.append(("space",))
+            elif escaped.isalnum():
+                items.append(("any",))
+            else:
+                items.append(("char", escaped))
+        elif c == "[":
+            j = i + 1
+            if j < len(pattern) and pattern[j] == "^":
+                j += 1
+            if j < len(pattern) and pattern[j] == "]":
+                j += 1
+            depth = 1
+            while j < len(pattern) and depth > 0:
+                if pattern[j] == "\\":
+                    j += 1
+                elif pattern[j] == "[":
+                    depth += 1
+                elif pattern[j] == "]":
+                    depth -= 1
+                j += 1
+            if depth > 0:
+                return None
+            items.append(("any",))
+            i = j - 1
+        elif c == "(":
+            flags = __INLINE_FLAGS.match(pattern, i)
+            if flags is not None:
+                # comments mode changes the meaning of whitespace
+                if "x" in flags.group(0):
+                    return None
+                i = flags.end()
+                continue
+            j = i + 1
+            depth = 1
+            while j < len(pattern) and depth > 0:
+                if pattern[j] == "\\":
+                    j += 1
+                elif pattern[j] == "[":
+                    while j < len(pattern) and pattern[j] != "]":
+                        j += 1 + (pattern[j] == "\\")
+                elif pattern[j] == "(":
+                    depth += 1
+                elif pattern[j] == ")":
+                    depth -= 1
+                j += 1
+            if depth > 0:
+                return None
+            items.append(("any",))
+            i = j - 1
+        elif c in __QUANTIFIERS:
+            if c == "{":
+                j = pattern.find("}", i)
+                if j < 0:
+                    return None
+                i = j
+            previous = items[-1]
+            if c != "+":
+                items.pop()
+            # a quantified literal may repeat, so what follows it is unknown
+            if previous[0] == "char" or c != "+":
+                items.append(("any",))
+            # lazy / possessive quantifier suffix
+            if i + 1 < len(pattern) and pattern[i + 1] in "?+":
+                i += 1
+        elif c in "^$":
+            items.append(("edge",))
+        elif c == ".":
+            items.append(("any",))
+        elif c.isspace():
+            items.append(("space",))
+        else:
+            items.append(("char", c))
+        i += 1
+    items.append(("edge",))
+    return items
+
+
+def build_regex_prefilter_query(pattern):
+    """
+    Derive a fulltext query that matches a superset of the records matched by
+    a regex (Cypher =~, full match), from the literal words the regex requires.
+    A word bounded by whitespace or the content edges on both sides is
+    required as a term, a word bounded on its left side only as a prefix.
+    :return: query string, or None if the pattern has no usable literal
+    """
+    items = __regex_items(pattern)
+    if items is None:
+        return None
+    clauses = []
+    i = 0
+    while i < len(items):
+        if items[i][0] != "char" or not __WORD.match(items[i][1]):
+            i += 1
+            continue
+        j = i
+        while j < len(items) and items[j][0] == "char" and __WORD.match(items[j][1]):
+            j += 1
+        word = "".join([item[1] for item in items[i:j]]).lower()
+        left_bounded = items[i - 1][0] in ["space", "edge"]
+        right_bounded = items[j][0] in ["space", "edge"]
+        if left_bounded and len(word) <= MAX_TERM_LENGTH:
+            if right_bounded:
+                clauses.append(f"+{word}")
+            elif len(word) >= MIN_PREFIX_LENGTH:
+                clauses.append(f"+{word}*")
+        i = j
+    if len(clauses) == 0:
+        return None
+    return " ".join(clauses)
@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_HTTP_POOL_SIZE = 10
+DEFAULT_HTTP_CONNECT_TIMEOUT = 3.05
+DEFAULT_HTTP_READ_TIMEOUT = 30
+DEFAULT_HTTP_RETRIES = 2
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class StreamingBody:
+    """
+    File-like request body read from an input stream, with a known length
+    so it is forwarded with Content-Length instead of being buffered.
+    """
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.length = int(length)
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def __iter__(self):
+        while True:
+            chunk = self.stream.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+class HttpClient:
+    """
+    Keep-alive HTTP client for calls to upstream services (auth).
+    Each worker process gets its own pooled session, created lazily, so
+    connections opened before a gunicorn fork are never shared.
+    Only connection errors are retried: request bodies are streamed and
+    can not be replayed after they have been sent.
+    The session stores no cookies: it is shared by the requests of all
+    users, so a cookie set by an upstream response to one user must never
+    be sent with another user's request.
+    observer(name, seconds, error), if given, is called with the latency
+    of every request, e.g. to export it as a metric.
+    """
+
+    def __init__(
+        self,
+        pool_size=DEFAULT_HTTP_POOL_SIZE,
+        connect_timeout=DEFAULT_HTTP_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_HTTP_READ_TIMEOUT,
+        retries=DEFAULT_HTTP_RETRIES,
+        observer=None,
+    ):
+        self.pool_size = int(pool_size)
+        self.timeout = (float(connect_timeout), float(read_timeout))
+        self.retries = int(retries)
+        self.observer = observer
+        self.__session = None
+        self.__pid = None
+        self.__lock = threading.Lock()
+        self.__latency = {}
+
+    @property
+    def session(self):
+        pid = os.getpid()
+        if self.__session is None or self.__pid != pid:
+            with self.__lock:
+                if self.__session is None or self.__pid != pid:
+                    self.__session = self.__create_session()
+                    self.__pid = pid
+        return self.__session
+
+    def __create_session(self):
+        session = requests.Session()
+        # no domain is allowed to set or receive cookies, see the class doc
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=Retry(
+                total=self.retries,
+                connect=self.retries,
+                read=False,
+                status=0,
+                backoff_factor=0.1,
+                raise_on_status=False,
+            ),
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def request(self, name, method, url, **kwargs):
+        """
+        Send a request through the pooled session and record its latency
+        (time until response headers are received) under 'name'.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method=method, url=url, **kwargs)
+        except Exception:
+            self.__record(name, time.perf_counter() - start, error=True)
+            raise
+        self.__record(name, time.perf_counter() - start, error=False)
+        return response
+
+    def get(self, name, url, **kwargs):
+        return self.request(name, "GET", url, **kwargs)
+
+    def post(self, name, url, **kwargs):
+        return self.request(name, "POST", url, **kwargs)
+
+    def __record(self, name, seconds, error):
+        if self.observer is not None:
+            self.observer(name, seconds, error)
+        with self.__lock:
+            stats = self.__latency.setdefault(
+                name,
+                {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0},
+            )
+            stats["count"] += 1
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            if error:
+                stats["errors"] += 1
+
+    def stats(self):
+        with self.__lock:
+            return {
+                name: {
+                    **stats,
+                    "avg_seconds": (
+                        round(stats["total_seconds"] / stats["count"], 6)
+                        if stats["count"] > 0
+                        else 0
+                    ),
+                }
+                for name, stats in self.__latency.items()
+            }
+
+
+def stream_response_content(response):
+    """
+    Iterate over an upstream response body and release the connection
+    back to the pool once it is fully read.
+    """
+    try:
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            yield chunk
+    finally:
+        response.close()
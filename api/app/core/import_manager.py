@@ -0,0 +1,626 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.constants import IMPORT_CHUNK_SIZE
+from app.core.project import Project
+from app.enums.import_type import ImportType
+
+DEFAULT_IMPORT_WORKERS = 4
+# seconds a worker owns a running import job without making progress,
+# before another worker may resume it
+DEFAULT_IMPORT_LEASE_SECONDS = 60
+# seconds between scans for import jobs to resume
+DEFAULT_IMPORT_RESUME_INTERVAL = 30
+# max number of chunk errors kept on an import job
+MAX_IMPORT_JOB_ERRORS = 20
+# error raised by an import transaction of a worker that lost its lease
+IMPORT_LEASE_LOST_ERROR = "ImportLeaseLostError"
+
+
+class ImportManager:
+    """
+    Background data imports, resumable after a crash or restart.
+    A job is persisted as an (:ImportJob) node with its source,
+    column_mapping, dataset, status and last_committed_offset.
+    DF rows and rows of uploaded files are stored once as (:ImportChunk)
+    nodes (JSON rows), so an interrupted job can resume without them, and
+    each chunk is imported, and deleted, in one transaction on a bounded
+    thread pool. DF rows are stored on the pool too; an uploaded file is
+    stored while the request reads it. CSV files are re-read from the
+    source url, skipping the rows already committed.
+    Committed and failed chunks are counted on the job, which completes
+    once they add up to its total_chunks.
+    Imports MERGE records, so a chunk written twice is harmless, but a chunk
+    is only counted once. The worker running a job holds a lease on it,
+    renewed on progress (and by a heartbeat while a csv file is read);
+    jobs with an expired lease are picked up by the periodic resume scan
+    of any worker. A csv import whose lease was taken over stops at its
+    next commit, so rows are counted by a single worker.
+    """
+
+    def __init__(
+        self,
+        project: Project,
+        max_workers=DEFAULT_IMPORT_WORKERS,
+        chunk_size=IMPORT_CHUNK_SIZE,
+        lease_seconds=DEFAULT_IMPORT_LEASE_SECONDS,
+        resume_interval=DEFAULT_IMPORT_RESUME_INTERVAL,
+    ):
+        self.project = project
+        self.max_workers = int(max_workers)
+        self.chunk_size = int(chunk_size)
+        self.lease_seconds = float(lease_seconds)
+        self.resume_interval = float(resume_interval)
+        self.__executor = None
+        self.__resume_thread = None
+        self.__pid = None
+        self.__owner = None
+        self.__lock = threading.Lock()
+
+    def __ensure_process(self):
+        # thread pools do not survive a fork, create one per worker process
+        pid = os.getpid()
+        if self.__executor is None or self.__pid != pid:
+            with self.__lock:
+                if self.__executor is None or self.__pid != pid:
+                    self.__executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="import",
+                    )
+                    self.__resume_thread = None
+                    self.__owner = f"{socket.gethostname()}:{pid}:{uuid.uuid4()}"
+                    self.__pid = pid
+
+    @property
+    def executor(self):
+        self.__ensure_process()
+        return self.__executor
+
+    @property
+    def owner(self):
+        """Lease owner id of this worker process."""
+        self.__ensure_process()
+        return self.__owner
+
+    def start(self):
+        """
+        Start the periodic resume scan of this worker process.
+        Call after forking, e.g. in the gunicorn post_fork hook.
+        """
+        self.__ensure_process()
+        with self.__lock:
+            if self.__resume_thread is None:
+                self.__resume_thread = threading.Thread(
+                    target=self.__resume_loop, name="import-resume", daemon=True
+                )
+                self.__resume_thread.start()
+
+    def __resume_loop(self):
+        while True:
+            try:
+                self.resume()
+            except Exception as ex:
+                print(f"Failed to resume import jobs: {ex}")
+            time.sleep(self.resume_interval)
+
+    def __lease_ms(self):
+        return int(self.lease_seconds * 1000)
+
+    def __create_job(self, file_type, source, column_mapping, dataset, created_by):
+        if "id" not in column_mapping or "content" not in column_mapping:
+            raise Exception("'column_mapping' is missing either 'id' or 'content'.")
+        return {
+            "file_type": file_type,
+            "source": source,
+            "column_mapping": json.dumps(column_mapping),
+            "dataset": dataset,
+            "created_by": created_by,
+            "chunk_size": self.chunk_size,
+            "owner": self.owner,
+            "lease_ms": self.__lease_ms(),
+        }
+
+    __CREATE_JOB_QUERY = """
+        CREATE (j:ImportJob {
+            uuid: randomUUID(),
+            status: $status,
+            file_type: $file_type,
+            source: $source,
+            column_mapping: $column_mapping,
+            dataset: $dataset,
+            created_by: $created_by,
+            created_on: DateTime(),
+            updated_on: DateTime(),
+            total_rows: $total_rows,
+            chunk_size: $chunk_size,
+            total_chunks: $total_chunks,
+            committed_chunks: 0,
+            failed_chunks: 0,
+            last_committed_offset: 0,
+            created: 0,
+            matched: 0,
+            errors: [],
+            upload_failed: false,
+            lease_owner: $owner,
+            lease_until: timestamp() + $lease_ms
+        })
+    """
+
+    def submit_rows(self, rows, column_mapping, dataset="", created_by=None):
+        """
+        Start a background import of rows (list of dicts). The rows are
+        stored as chunks on the thread pool, without waiting for them.
+        :return: uuid of the import job
+        """
+        job_uuid = self.__create_upload_job(
+            ImportType.DF.value, column_mapping, dataset, created_by
+        )
+        self.executor.submit(
+            self.__upload,
+            job_uuid,
+            [
+                rows[start : start + self.chunk_size]
+                for start in range(0, len(rows), self.chunk_size)
+            ],
+        )
+        return job_uuid
+
+    def submit_batches(
+        self,
+        batches,
+        column_mapping,
+        dataset="",
+        created_by=None,
+        file_type=ImportType.DF.value,
+    ):
+        """
+        Start a background import of batches of rows (iterable of lists of
+        dicts, e.g. read from an uploaded file). All rows are stored as chunks
+        of the job, with status UPLOADING, before it starts running; each
+        chunk is written in its own transaction. The batches are read before
+        returning, as a request stream can not be read after its request.
+        :return: uuid of the import job
+        """
+        job_uuid = self.__create_upload_job(
+            file_type, column_mapping, dataset, created_by
+        )
+        self.__upload(job_uuid, batches)
+        return job_uuid
+
+    def __create_upload_job(self, file_type, column_mapping, dataset, created_by):
+        args = self.__create_job(file_type, None, column_mapping, dataset, created_by)
+        args.update({"status": "UPLOADING", "total_rows": None, "total_chunks": None})
+        q = self.__CREATE_JOB_QUERY + "RETURN j.uuid as uuid"
+        return self.project.database.write_db(q, args=args)[0]["uuid"]
+
+    def __upload(self, job_uuid, batches):
+        """Store the batches of rows of a job as chunks, then run it."""
+        # each stored chunk renews the lease of the upload; an upload that
+        # outlived it was failed by the resume scan of a worker
+        q = """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            WHERE j.status = 'UPLOADING'
+            SET j.lease_until = timestamp() + $lease_ms
+            CREATE (:ImportChunk {
+                job_uuid: $job_uuid,
+                index: $index,
+                offset: $offset,
+                rows: $rows,
+                status: 'PENDING'
+            })
+            RETURN j.uuid as uuid
+        """
+        total_rows = 0
+        total_chunks = 0
+        try:
+            for rows in batches:
+                for start in range(0, len(rows), self.chunk_size):
+                    result = self.project.database.write_db(
+                        q,
+                        args={
+                            "job_uuid": job_uuid,
+                            "index": total_chunks,
+                            "offset": total_rows + start,
+                            "rows": json.dumps(
+                                rows[start : start + self.chunk_size], default=str
+                            ),
+                            "lease_ms": self.__lease_ms(),
+                        },
+                    )
+                    if len(result) == 0:
+                        raise Exception("the upload lease expired.")
+                    total_chunks += 1
+                total_rows += len(rows)
+        except Exception as ex:
+            self.__fail_upload(job_uuid, f"upload: {ex}")
+            raise
+        q = """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            WHERE j.status = 'UPLOADING'
+            SET j.status = 'RUNNING',
+                j.total_rows = $total_rows,
+                j.total_chunks = $total_chunks,
+                j.lease_until = timestamp() + $lease_ms,
+                j.updated_on = DateTime()
+        """
+        self.project.database.write_db(
+            q,
+            args={
+                "job_uuid": job_uuid,
+                "total_rows": total_rows,
+                "total_chunks": total_chunks,
+                "lease_ms": self.__lease_ms(),
+            },
+        )
+        self.__run(job_uuid)
+
+    def submit_csv(self, url, column_mapping, dataset="", created_by=None):
+        """
+        Start a background import of a csv file at url.
+        :return: uuid of the import job
+        """
+        if url is None or len(url) == 0:
+            raise Exception("'url' can not be None or empty.")
+        args = self.__create_job(
+            ImportType.CSV.value, url, column_mapping, dataset, created_by
+        )
+        args.update({"status": "RUNNING", "total_rows": None, "total_chunks": None})
+        q = self.__CREATE_JOB_QUERY + "RETURN j.uuid as uuid"
+        job_uuid = self.project.database.write_db(q, args=args)[0]["uuid"]
+        self.__run(job_uuid)
+        return job_uuid
+
+    def resume(self):
+        """
+        Take over the running import jobs whose lease has expired, e.g. after
+        the worker running them crashed or the service restarted. Uploading
+        jobs whose lease has expired are failed: the rows not stored yet
+        were lost with the upload request.
+        :return: uuids of the resumed jobs
+        """
+        # the uploads of this worker are alive, even while waiting for the
+        # thread pool (DF rows are stored on it)
+        q = """
+            MATCH (j:ImportJob {status: 'UPLOADING', lease_owner: $owner})
+            SET j.lease_until = timestamp() + $lease_ms
+        """
+        self.project.database.write_db(
+            q, args={"owner": self.owner, "lease_ms": self.__lease_ms()}
+        )
+        q = """
+            MATCH (j:ImportJob {status: 'UPLOADING'})
+            WHERE j.lease_until < timestamp()
+            CALL apoc.lock.nodes([j])
+            WITH j
+            WHERE j.status = 'UPLOADING' AND j.lease_until < timestamp()
+            SET j.status = 'FAILED',
+                j.upload_failed = true,
+                j.errors = j.errors + ['upload: the upload was interrupted.'],
+                j.lease_owner = null,
+                j.updated_on = DateTime()
+            RETURN j.uuid as uuid
+        """
+        for item in self.project.database.write_db(q):
+            self.__delete_chunks(item["uuid"])
+        # the lease is checked again once the write lock on the job is held,
+        # so a job is taken over by a single worker
+        q = """
+            MATCH (j:ImportJob {status: 'RUNNING'})
+            WHERE j.lease_until < timestamp()
+            CALL apoc.lock.nodes([j])
+            WITH j
+            WHERE j.status = 'RUNNING' AND j.lease_until < timestamp()
+            SET j.lease_owner = $owner,
+                j.lease_until = timestamp() + $lease_ms
+            RETURN j.uuid as uuid
+        """
+        result = self.project.database.write_db(
+            q, args={"owner": self.owner, "lease_ms": self.__lease_ms()}
+        )
+        job_uuids = [item["uuid"] for item in result]
+        for job_uuid in job_uuids:
+            self.__run(job_uuid)
+        return job_uuids
+
+    def retry(self, job_uuid):
+        """
+        Run the failed chunks of a failed import job again.
+        :return: the job, or None if it does not exist
+        :raises ValueError: if the job has not failed
+        """
+        q = """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            CALL apoc.lock.nodes([j])
+            WITH j
+            WHERE j.status = 'FAILED'
+            OPTIONAL MATCH (c:ImportChunk {job_uuid: j.uuid, status: 'FAILED'})
+            SET c.status = 'PENDING'
+            WITH DISTINCT j
+            SET j.status = 'RUNNING',
+                j.failed_chunks = 0,
+                j.errors = [],
+                j.lease_owner = $owner,
+                j.lease_until = timestamp() + $lease_ms,
+                j.updated_on = DateTime()
+            RETURN j.uuid as uuid
+        """
+        job = self.get_job(job_uuid)
+        if job is None:
+            return None
+        if job["status"] != "FAILED":
+            raise ValueError(f"Import job {job_uuid} has not failed.")
+        if job.get("upload_failed"):
+            # the rows that were not stored are gone with the upload request
+            raise ValueError(
+                f"The upload of import job {job_uuid} failed, upload the data again."
+            )
+        if job["file_type"] != ImportType.CSV.value and job["failed_chunks"] == 0:
+            raise ValueError(f"Import job {job_uuid} has no failed chunks.")
+        result = self.project.database.write_db(
+            q,
+            args={
+                "job_uuid": job_uuid,
+                "owner": self.owner,
+                "lease_ms": self.__lease_ms(),
+            },
+        )
+        if len(result) > 0:
+            self.__run(job_uuid)
+        return self.get_job(job_uuid)
+
+    def __run(self, job_uuid):
+        q = """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            OPTIONAL MATCH (c:ImportChunk {job_uuid: j.uuid, status: 'PENDING'})
+            RETURN j{.file_type, .source, .column_mapping, .dataset,
+                .last_committed_offset} as job,
+                collect(c.index) as pending_chunks
+        """
+        result = self.project.database.read_db(q, args={"job_uuid": job_uuid})
+        if len(result) == 0:
+            return
+        job = dict(result[0]["job"])
+        job["uuid"] = job_uuid
+        job["column_mapping"] = json.loads(job["column_mapping"])
+        if job["file_type"] == ImportType.CSV.value:
+            self.executor.submit(self.__import_csv, job)
+            return
+        for index in sorted(result[0]["pending_chunks"]):
+            self.executor.submit(self.__import_chunk, job, index)
+        if len(result[0]["pending_chunks"]) == 0:
+            self.__finish(job_uuid)
+
+    def __import_chunk(self, job, index):
+        args = {
+            "job_uuid": job["uuid"],
+            "index": index,
+            "lease_ms": self.__lease_ms(),
+        }
+        q = """
+            MATCH (c:ImportChunk {job_uuid: $job_uuid, index: $index})
+            WHERE c.status = 'PENDING'
+            RETURN c.rows as rows
+        """
+        # a chunk is committed once: the claim re-checks its status
+        # under the write lock, in the transaction importing it
+        claim_query = """
+            MATCH (c:ImportChunk {job_uuid: $job_uuid, index: $index})
+            CALL apoc.lock.nodes([c])
+            WITH c
+            WHERE c.status = 'PENDING'
+            RETURN c.index
+        """
+        # the offset of the first row not committed is read by get_job, so
+        # committing a chunk does not scan the other chunks
+        job_query = """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            SET j.committed_chunks = j.committed_chunks + 1,
+                j.created = j.created + $created,
+                j.matched = j.matched + $matched,
+                j.lease_until = timestamp() + $lease_ms,
+                j.updated_on = DateTime()
+            WITH j
+            MATCH (c:ImportChunk {job_uuid: j.uuid, index: $index})
+            DELETE c
+        """
+        try:
+            result = self.project.database.read_db(q, args=args)
+            if len(result) > 0:
+                self.project.import_rows(
+                    rows=json.loads(result[0]["rows"]),
+                    column_mapping=job["column_mapping"],
+                    dataset=job["dataset"],
+                    job_query=job_query,
+                    job_args=args,
+                    claim_query=claim_query,
+                )
+        except Exception as ex:
+            self.__record_failure(job["uuid"], f"chunk {index}: {ex}", index=index)
+        self.__finish(job["uuid"])
+
+    def __import_csv(self, job):
+        # rolls back the batch and stops the import if another worker owns
+        # the job, as it imports (and counts) the same rows
+        row_query = """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            CALL apoc.util.validate(
+                coalesce(j.lease_owner, '') <> $owner, $lease_lost_error, [])
+            SET j.last_committed_offset = j.last_committed_offset + 1,
+                j.created = j.created + CASE WHEN matched THEN 0 ELSE 1 END,
+                j.matched = j.matched + CASE WHEN matched THEN 1 ELSE 0 END,
+                j.lease_until = timestamp() + $lease_ms,
+                j.updated_on = DateTime()
+        """
+        # skipping the committed rows of a large file, or a slow batch, may
+        # take longer than the lease
+        heartbeat_stop = threading.Event()
+        threading.Thread(
+            target=self.__heartbeat,
+            args=(job["uuid"], heartbeat_stop),
+            name="import-heartbeat",
+            daemon=True,
+        ).start()
+        try:
+            self.project.import_csv_rows(
+                url=job["source"],
+                column_mapping=job["column_mapping"],
+                dataset=job["dataset"],
+                skip=job["last_committed_offset"],
+                batch_size=self.chunk_size,
+                row_query=row_query,
+                job_args={
+                    "job_uuid": job["uuid"],
+                    "lease_ms": self.__lease_ms(),
+                    "owner": self.owner,
+                    "lease_lost_error": IMPORT_LEASE_LOST_ERROR,
+                },
+            )
+        except Exception as ex:
+            if IMPORT_LEASE_LOST_ERROR in str(ex):
+                print(f"Import job {job['uuid']} was taken over by another worker.")
+            else:
+                self.__record_failure(job["uuid"], str(ex))
+            return
+        finally:
+            heartbeat_stop.set()
+        q = """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            WHERE j.status = 'RUNNING' AND j.lease_owner = $owner
+            SET j.status = 'COMPLETED',
+                j.total_rows = j.last_committed_offset,
+                j.lease_owner = null,
+                j.updated_on = DateTime()
+        """
+        self.project.database.write_db(
+            q, args={"job_uuid": job["uuid"], "owner": self.owner}
+        )
+
+    def __heartbeat(self, job_uuid, stop):
+        # renew the lease of a running job while this worker still owns it
+        q = """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            WHERE j.status = 'RUNNING' AND j.lease_owner = $owner
+            SET j.lease_until = timestamp() + $lease_ms
+            RETURN j.uuid as uuid
+        """
+        args = {
+            "job_uuid": job_uuid,
+            "owner": self.owner,
+            "lease_ms": self.__lease_ms(),
+        }
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                if len(self.project.database.write_db(q, args=args)) == 0:
+                    return
+            except Exception as ex:
+                print(f"Failed to renew the lease of import job {job_uuid}: {ex}")
+
+    def __record_failure(self, job_uuid, error, index=None):
+        # a chunk is counted failed once, and never after another worker
+        # committed it
+        q = """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            OPTIONAL MATCH (c:ImportChunk {job_uuid: j.uuid, index: $index})
+            WHERE c.status = 'PENDING'
+            SET c.status = 'FAILED'
+            WITH j, count(c) as failed
+            SET j.failed_chunks = j.failed_chunks + failed,
+                j.errors = CASE WHEN size(j.errors) < $max_errors
+                    THEN j.errors + [$error] ELSE j.errors END,
+                j.updated_on = DateTime()
+            SET j.status = CASE WHEN $index IS NULL THEN 'FAILED' ELSE j.status END
+        """
+        try:
+            self.project.database.write_db(
+                q,
+                args={
+                    "job_uuid": job_uuid,
+                    "index": index,
+                    "error": error[:500],
+                    "max_errors": MAX_IMPORT_JOB_ERRORS,
+                },
+            )
+        except Exception as ex:
+            print(f"Failed to record import failure of job {job_uuid}: {ex}")
+
+    def __fail_upload(self, job_uuid, error):
+        # the job can not be retried: its stored chunks are removed, as
+        # importing them would report a partial import as completed
+        q = """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            SET j.status = 'FAILED',
+                j.upload_failed = true,
+                j.errors = CASE WHEN size(j.errors) < $max_errors
+                    THEN j.errors + [$error] ELSE j.errors END,
+                j.lease_owner = null,
+                j.updated_on = DateTime()
+        """
+        try:
+            self.project.database.write_db(
+                q,
+                args={
+                    "job_uuid": job_uuid,
+                    "error": error[:500],
+                    "max_errors": MAX_IMPORT_JOB_ERRORS,
+                },
+            )
+            self.__delete_chunks(job_uuid)
+        except Exception as ex:
+            print(f"Failed to record upload failure of job {job_uuid}: {ex}")
+
+    def __delete_chunks(self, job_uuid):
+        q = f"""
+            MATCH (c:ImportChunk {{job_uuid: $job_uuid}})
+            CALL {{
+                WITH c
+                DELETE c
+            }} IN TRANSACTIONS OF {int(self.chunk_size)} ROWS
+        """
+        self.project.database.write_db_auto_commit(q, args={"job_uuid": job_uuid})
+
+    def __finish(self, job_uuid):
+        # complete the job once none of its chunks is pending, from the
+        # counts on the job; failed chunks are kept for retry
+        q = """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            CALL apoc.lock.nodes([j])
+            WITH j
+            WHERE j.status = 'RUNNING'
+                AND j.committed_chunks + j.failed_chunks >= j.total_chunks
+            SET j.status = CASE WHEN j.failed_chunks > 0
+                    THEN 'FAILED' ELSE 'COMPLETED' END,
+                j.lease_owner = null,
+                j.updated_on = DateTime()
+        """
+        try:
+            self.project.database.write_db(q, args={"job_uuid": job_uuid})
+        except Exception as ex:
+            print(f"Failed to complete import job {job_uuid}: {ex}")
+
+    def get_job(self, job_uuid):
+        """
+        Get the progress of an import job, or None if it does not exist.
+        """
+        # the first row not committed of a chunked job is the first row of
+        # its remaining (pending or failed) chunks
+        q = """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            OPTIONAL MATCH (c:ImportChunk {job_uuid: j.uuid})
+            WITH j, min(c.offset) as pending_offset
+            RETURN j{.*,
+                last_committed_offset: CASE WHEN j.file_type = 'CSV'
+                    THEN j.last_committed_offset
+                    ELSE coalesce(pending_offset, j.total_rows, 0) END,
+                column_mapping: apoc.convert.fromJsonMap(j.column_mapping),
+                created_on: datetime(j.created_on).epochMillis,
+                updated_on: datetime(j.updated_on).epochMillis} as job
+        """
+        result = self.project.database.read_db(q, args={"job_uuid": job_uuid})
+        if len(result) == 0:
+            return None
+        return dict(result[0]["job"])
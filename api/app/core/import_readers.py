@@ -0,0 +1,219 @@
+import json
+import shutil
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from app.constants import IMPORT_CHUNK_SIZE, METADATA_UPLOAD_CHUNK_SIZE
+from app.enums.import_type import ImportType
+from app.enums.vector_format import VectorFormat
+
+__ARROW_FILE_MAGIC = b"ARROW1"
+
+
+def read_batches(stream, file_type, column_mapping, batch_size=IMPORT_CHUNK_SIZE):
+    """
+    Read an uploaded Parquet, Arrow IPC (file or stream format) or NDJSON
+    file in batches of rows. Only the columns of column_mapping are read;
+    a numeric list column (e.g. embeddings) is converted column-wise to
+    lists of floats.
+    :return: iterator of lists of row dicts
+    """
+    if "id" not in column_mapping or "content" not in column_mapping:
+        raise Exception("'column_mapping' is missing either 'id' or 'content'.")
+    columns = [column_mapping["id"], column_mapping["content"]]
+    if "metadata" in column_mapping:
+        columns.append(column_mapping["metadata"])
+    columns = list(dict.fromkeys(columns))
+    batch_size = int(batch_size)
+    if file_type == ImportType.NDJSON.value:
+        return __read_ndjson(stream, columns, batch_size)
+    if file_type == ImportType.PARQUET.value:
+        return __read_parquet(stream, columns, batch_size)
+    if file_type == ImportType.ARROW.value:
+        return __read_arrow(stream, columns, batch_size)
+    raise NotImplementedError(f"Reading {file_type} files is not supported.")
+
+
+def read_vector_batches(
+    stream,
+    file_type,
+    uuid_list=None,
+    uuid_column="uuid",
+    value_column="value",
+    batch_size=METADATA_UPLOAD_CHUNK_SIZE,
+):
+    """
+    Read uploaded record vectors (e.g. embeddings) in batches.
+    NPY files hold a 2-d float array whose rows follow uuid_list, and are
+    read row-block by row-block from the stream; Arrow and Parquet files
+    hold a uuid column and a list column.
+    :return: iterator of lists of {"uuid":.., "value": list of floats}
+    """
+    batch_size = int(batch_size)
+    if file_type == VectorFormat.NPY.value:
+        if not isinstance(uuid_list, list):
+            raise ValueError("'uuid_list' is required for NPY files.")
+        return __read_npy(stream, uuid_list, batch_size)
+    columns = [uuid_column, value_column]
+    if file_type == VectorFormat.PARQUET.value:
+        batches = __read_parquet(stream, columns, batch_size)
+    elif file_type == VectorFormat.ARROW.value:
+        batches = __read_arrow(stream, columns, batch_size)
+    else:
+        raise NotImplementedError(f"Reading {file_type} vectors is not supported.")
+    return (
+        [{"uuid": row[uuid_column], "value": row[value_column]} for row in rows]
+        for rows in batches
+    )
+
+
+def __read_npy(stream, uuid_list, batch_size):
+    version = np.lib.format.read_magic(stream)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+    elif version == (2, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    else:
+        raise ValueError(f"NPY format version {version} is not supported.")
+    if len(shape) != 2 or fortran_order or dtype.kind != "f":
+        raise ValueError("NPY files must hold a 2-d float array in C order.")
+    if shape[0] != len(uuid_list):
+        raise ValueError(
+            f"NPY file has {shape[0]} rows but 'uuid_list' has {len(uuid_list)} uuids."
+        )
+    row_size = shape[1] * dtype.itemsize
+    for offset in range(0, shape[0], batch_size):
+        count = min(batch_size, shape[0] - offset)
+        data = __read_exactly(stream, count * row_size)
+        vectors = np.frombuffer(data, dtype=dtype).reshape(count, shape[1])
+        yield [
+            {"uuid": uuid, "value": vector}
+            for uuid, vector in zip(
+                uuid_list[offset : offset + count],
+                vectors.astype(np.float64).tolist(),
+            )
+        ]
+
+
+def __read_exactly(stream, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise ValueError("The uploaded file is truncated.")
+        data += chunk
+    return data
+
+
+def __read_ndjson(stream, columns, batch_size):
+    rows = []
+    for line_number, line in enumerate(iter(stream.readline, b""), start=1):
+        if len(line.strip()) == 0:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as ex:
+            raise ValueError(f"Invalid JSON on line {line_number}: {ex}")
+        if not isinstance(item, dict):
+            raise ValueError(f"Line {line_number} is not a JSON object.")
+        # id and content columns are required, others may be missing
+        missing = [column for column in columns[:2] if item.get(column) is None]
+        if len(missing) > 0:
+            raise ValueError(f"Line {line_number} is missing columns {missing}.")
+        row = {column: item.get(column) for column in columns}
+        for column, value in row.items():
+            if isinstance(value, list) and all(
+                isinstance(v, (int, float)) and not isinstance(v, bool) for v in value
+            ):
+                row[column] = [float(v) for v in value]
+        rows.append(row)
+        if len(rows) == batch_size:
+            yield rows
+            rows = []
+    if len(rows) > 0:
+        yield rows
+
+
+def __read_parquet(stream, columns, batch_size):
+    source = __seekable(stream)
+    try:
+        parquet_file = pq.ParquetFile(source)
+        __check_columns(parquet_file.schema_arrow, columns)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            yield __batch_rows(batch, columns)
+    finally:
+        if source is not stream:
+            source.close()
+
+
+def __read_arrow(stream, columns, batch_size):
+    source = __seekable(stream)
+    try:
+        is_file_format = source.read(len(__ARROW_FILE_MAGIC)) == __ARROW_FILE_MAGIC
+        source.seek(0)
+        if is_file_format:
+            reader = pa.ipc.open_file(source)
+            batches = (
+                reader.get_batch(index) for index in range(reader.num_record_batches)
+            )
+        else:
+            reader = pa.ipc.open_stream(source)
+            batches = iter(reader)
+        __check_columns(reader.schema, columns)
+        # record batches of the writer are re-sliced to batch_size rows
+        for batch in batches:
+            for offset in range(0, batch.num_rows, batch_size):
+                yield __batch_rows(batch.slice(offset, batch_size), columns)
+    finally:
+        if source is not stream:
+            source.close()
+
+
+def __seekable(stream):
+    # parquet and arrow file footers are read before the data, so streamed
+    # uploads are copied to a temporary file first
+    seekable = getattr(stream, "seekable", None)
+    if seekable is not None and seekable():
+        return stream
+    source = tempfile.TemporaryFile()
+    shutil.copyfileobj(stream, source)
+    source.seek(0)
+    return source
+
+
+def __check_columns(schema, columns):
+    missing = [column for column in columns if schema.get_field_index(column) < 0]
+    if len(missing) > 0:
+        raise ValueError(f"Columns {missing} do not exist in the uploaded file.")
+
+
+def __batch_rows(batch, columns):
+    values = [
+        __column_values(batch.column(batch.schema.get_field_index(column)))
+        for column in columns
+    ]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def __column_values(array):
+    is_list = (
+        pa.types.is_list(array.type)
+        or pa.types.is_large_list(array.type)
+        or pa.types.is_fixed_size_list(array.type)
+    )
+    if (
+        not is_list
+        or not (
+            pa.types.is_floating(array.type.value_type)
+            or pa.types.is_integer(array.type.value_type)
+        )
+        or array.null_count > 0
+    ):
+        return array.to_pylist()
+    # one numpy conversion per column instead of one python float per element
+    lengths = pc.list_value_length(array).to_numpy(zero_copy_only=False)
+    values = array.flatten().to_numpy(zero_copy_only=False).astype(np.float64)
+    return [vector.tolist() for vector in np.split(values, np.cumsum(lengths)[:-1])]
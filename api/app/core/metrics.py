@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+import traceback
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# path of the metrics endpoint, exempt from token verification
+METRICS_PATH = "/metrics"
+# min seconds between two refreshes of the state metrics of a worker
+METRICS_REFRESH_INTERVAL = 1
+
+REQUESTS = Counter(
+    "meganno_http_requests", "HTTP requests", ["method", "route", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "meganno_http_request_duration_seconds",
+    "Seconds until the response of an HTTP request is returned",
+    ["method", "route"],
+)
+IN_FLIGHT = Gauge(
+    "meganno_http_requests_in_flight",
+    "HTTP requests being handled",
+    multiprocess_mode="livesum",
+)
+UPSTREAM_LATENCY = Histogram(
+    "meganno_upstream_request_duration_seconds",
+    "Seconds until the response headers of an auth service call",
+    ["name"],
+)
+UPSTREAM_ERRORS = Counter(
+    "meganno_upstream_request_errors", "Failed auth service calls", ["name"]
+)
+NEO4J_POOL_CONNECTIONS = Gauge(
+    "meganno_neo4j_pool_connections",
+    "Neo4j pool connections of the live workers, by state",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+NEO4J_POOL_SIZE = Gauge(
+    "meganno_neo4j_pool_max_connections",
+    "Max Neo4j pool connections of the live workers",
+    multiprocess_mode="livesum",
+)
+NEO4J_SESSIONS = Gauge(
+    "meganno_neo4j_sessions",
+    "Open Neo4j sessions of the live workers",
+    multiprocess_mode="livesum",
+)
+NEO4J_ACQUISITION_ERRORS = Counter(
+    "meganno_neo4j_acquisition_errors",
+    "Neo4j sessions that timed out waiting for a pool connection",
+)
+CACHE_LOOKUPS = Counter(
+    "meganno_cache_lookups", "Cache lookups, by result", ["cache", "result"]
+)
+
+
+def is_multiprocess():
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+def observe_upstream(name, seconds, error):
+    """HttpClient observer of the auth service calls."""
+    UPSTREAM_LATENCY.labels(name).observe(seconds)
+    if error:
+        UPSTREAM_ERRORS.labels(name).inc()
+
+
+class Metrics:
+    """
+    Prometheus metrics of the service.
+    Request metrics are recorded around every request; state metrics
+    (pools, caches) are refreshed from the stats of the worker by
+    'collect' at most every METRICS_REFRESH_INTERVAL seconds, at the end
+    of a request or of a scrape. Cumulative stats are exported as counters
+    by adding what changed since the last refresh.
+    Under gunicorn, PROMETHEUS_MULTIPROC_DIR must be set before this module
+    is imported, so metrics are written to files shared by the workers and
+    summed at scrape time (see gunicorn.conf.py).
+    """
+
+    def __init__(self, app=None, collect=None):
+        self.collect = collect
+        self.__reported = {}
+        self.__refreshed = 0
+        self.__lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # registered before the token verification, so rejected requests
+        # are measured too
+        app.before_request(self.__before_request)
+        app.after_request(self.__after_request)
+        app.teardown_request(self.__teardown_request)
+        app.add_url_rule(METRICS_PATH, "metrics", self.__metrics)
+
+    def count(self, key, value, counter, *labels):
+        """Add the increase of a cumulative stat since its last report."""
+        with self.__lock:
+            increase = value - self.__reported.get(key, 0)
+            self.__reported[key] = value
+        if len(labels) > 0:
+            counter = counter.labels(*labels)
+        # a stat reset (e.g. a cache replaced) restarts from its new value
+        counter.inc(increase if increase >= 0 else value)
+
+    def report_pool(self, stats):
+        """Neo4j pool metrics from Database.pool_stats."""
+        NEO4J_POOL_CONNECTIONS.labels("in_use").set(stats["in_use"])
+        NEO4J_POOL_CONNECTIONS.labels("idle").set(stats["idle"])
+        NEO4J_POOL_SIZE.set(stats["max_connection_pool_size"])
+        NEO4J_SESSIONS.set(stats["sessions"])
+        self.count(
+            "neo4j_acquisition_errors",
+            stats["acquisition_errors"],
+            NEO4J_ACQUISITION_ERRORS,
+        )
+
+    def count_cache(self, cache, stats):
+        """Cache lookup metrics from the hits and misses of a cache."""
+        self.count((cache, "hit"), stats["hits"], CACHE_LOOKUPS, cache, "hit")
+        self.count((cache, "miss"), stats["misses"], CACHE_LOOKUPS, cache, "miss")
+
+    def refresh(self, force=False):
+        if self.collect is None:
+            return
+        now = time.monotonic()
+        with self.__lock:
+            if not force and now - self.__refreshed < METRICS_REFRESH_INTERVAL:
+                return
+            self.__refreshed = now
+        try:
+            self.collect(self)
+        except Exception:
+            # metrics never fail a request
+            traceback.print_exc()
+
+    def __before_request(self):
+        g.metrics_start = time.perf_counter()
+        IN_FLIGHT.inc()
+
+    def __after_request(self, response):
+        if "metrics_start" in g:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUESTS.labels(request.method, route, response.status_code).inc()
+            REQUEST_LATENCY.labels(request.method, route).observe(
+                time.perf_counter() - g.metrics_start
+            )
+        return response
+
+    def __teardown_request(self, exception=None):
+        if g.pop("metrics_start", None) is not None:
+            IN_FLIGHT.dec()
+            self.refresh()
+
+    def __metrics(self):
+        self.refresh(force=True)
+        if is_multiprocess():
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
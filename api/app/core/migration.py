@@ -0,0 +1,171 @@
+from app.core.database import Database
+
+# Versioned index migrations. Each step is applied once, in order, and the
+# last applied version is stored on the (:Migration) node. Statements use
+# IF NOT EXISTS so re-running a step is harmless.
+# Append new steps instead of editing applied ones.
+MIGRATIONS = [
+    (
+        1,
+        [
+            # Record lookups by uuid (annotate, label, verify, views, search)
+            """CREATE INDEX index_record_uuid IF NOT EXISTS
+            FOR (n:Record) ON (n.uuid)""",
+            # MERGE on import
+            """CREATE INDEX index_record_id_dataset IF NOT EXISTS
+            FOR (n:Record) ON (n.record_id, n.dataset)""",
+            # MERGE in update_annotation_with_labels, verify
+            """CREATE INDEX index_annotation_record_annotator IF NOT EXISTS
+            FOR (n:Annotation) ON (n.record_uuid, n.annotator)""",
+            """CREATE INDEX index_annotation_annotator IF NOT EXISTS
+            FOR (n:Annotation) ON (n.annotator)""",
+            # persist_job
+            """CREATE INDEX index_annotation_uuid IF NOT EXISTS
+            FOR (n:Annotation) ON (n.uuid)""",
+            # MERGE in update_label, remove_label
+            """CREATE INDEX index_label_record_annotator_name IF NOT EXISTS
+            FOR (n:Label) ON (n.record_uuid, n.annotator, n.label_name)""",
+            """CREATE INDEX index_label_uuid IF NOT EXISTS
+            FOR (n:Label) ON (n.uuid)""",
+            # statistics
+            """CREATE INDEX index_label_name IF NOT EXISTS
+            FOR (n:Label) ON (n.label_name)""",
+            """CREATE INDEX index_metadata_name IF NOT EXISTS
+            FOR (n:Metadata) ON (n.name)""",
+            """CREATE INDEX index_record_meta_of_name IF NOT EXISTS
+            FOR ()-[r:RECORD_META_OF]-() ON (r.name)""",
+            """CREATE INDEX index_project_name IF NOT EXISTS
+            FOR (n:Project) ON (n.name)""",
+            """CREATE INDEX index_job_uuid IF NOT EXISTS
+            FOR (n:Job) ON (n.uuid)""",
+            """CREATE INDEX index_agent_uuid IF NOT EXISTS
+            FOR (n:Agent) ON (n.uuid)""",
+        ],
+    ),
+    (
+        2,
+        [
+            # keyword, phrase, prefix and regex prefilter search
+            """CREATE FULLTEXT INDEX index_record_content IF NOT EXISTS
+            FOR (n:Record) ON EACH [n.content]""",
+        ],
+    ),
+    (
+        3,
+        [
+            # record_id lookups, e.g. the MERGE of imported records, and ordering
+            """CREATE INDEX index_record_record_id IF NOT EXISTS
+            FOR (n:Record) ON (n.record_id)""",
+        ],
+    ),
+    (
+        4,
+        [
+            # progress updates of background imports
+            """CREATE INDEX index_import_job_uuid IF NOT EXISTS
+            FOR (n:ImportJob) ON (n.uuid)""",
+        ],
+    ),
+    (
+        5,
+        [
+            # resume scan of running imports
+            """CREATE INDEX index_import_job_status IF NOT EXISTS
+            FOR (n:ImportJob) ON (n.status)""",
+            # chunk claims and pending chunk lookups of background imports
+            """CREATE INDEX index_import_chunk_job_index IF NOT EXISTS
+            FOR (n:ImportChunk) ON (n.job_uuid, n.index)""",
+            """CREATE INDEX index_import_chunk_job_uuid IF NOT EXISTS
+            FOR (n:ImportChunk) ON (n.job_uuid)""",
+        ],
+    ),
+    (
+        6,
+        [
+            # MERGE of materialized label statistics counters
+            """CREATE CONSTRAINT constraint_label_statistic_uid IF NOT EXISTS
+            FOR (n:LabelStatistic) REQUIRE n.uid IS UNIQUE""",
+            """CREATE INDEX index_label_statistic_scope IF NOT EXISTS
+            FOR (n:LabelStatistic) ON (n.scope)""",
+        ],
+    ),
+    (
+        7,
+        [
+            # MERGE of cached embedding projections
+            """CREATE CONSTRAINT constraint_projection_uid IF NOT EXISTS
+            FOR (n:Projection) REQUIRE n.uid IS UNIQUE""",
+        ],
+    ),
+]
+DEFAULT_INDEX_WAIT_TIMEOUT = 300
+
+
+class Migration:
+    """
+    Index bootstrap for the graph database.
+    Applies pending MIGRATIONS and waits for the indexes to come online,
+    so queries are not planned against indexes that are still populating.
+    """
+
+    def __init__(self, database: Database, wait_timeout=DEFAULT_INDEX_WAIT_TIMEOUT):
+        self.database = database
+        self.wait_timeout = int(wait_timeout)
+
+    def get_version(self):
+        q = """
+            MATCH (m:Migration {name: 'index'})
+            RETURN m.version as version
+        """
+        result = self.database.read_db(q)
+        if len(result) == 0:
+            return 0
+        return result[0]["version"]
+
+    def __set_version(self, version):
+        q = """
+            MERGE (m:Migration {name: 'index'})
+            SET m.version = $version, m.updated_on = DateTime()
+        """
+        self.database.write_db(q, args={"version": version})
+
+    def migrate(self):
+        """
+        Apply pending migration steps, then wait for all indexes to be online.
+        :return: list of applied versions
+        """
+        current = self.get_version()
+        applied = []
+        for version, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            for statement in statements:
+                self.database.run_schema(statement)
+            self.wait()
+            self.__set_version(version)
+            applied.append(version)
+        self.wait()
+        return applied
+
+    def wait(self):
+        self.database.run_schema(
+            "CALL db.awaitIndexes($timeout)", args={"timeout": self.wait_timeout}
+        )
+
+    def status(self):
+        """
+        Report the applied migration version and the existing indexes.
+        """
+        result = self.database.run_schema(
+            """
+            SHOW INDEXES
+            YIELD name, type, entityType, labelsOrTypes, properties, state
+            RETURN name, type, entityType, labelsOrTypes, properties, state
+            ORDER BY name
+            """
+        )
+        return {
+            "version": self.get_version(),
+            "latest_version": MIGRATIONS[-1][0],
+            "indexes": [dict(item) for item in result],
+        }
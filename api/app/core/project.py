@@ -2,24 +2,51 @@ from typing import Optional
 
 import pydash
 from app.constants import (
+    ANNOTATION_BATCH_CHUNK_SIZE,
     DATABASE_503_RESPONSE,
     DEFAULT_QUERY_LIMIT,
+    EXPORT_PAGE_SIZE,
+    IMPORT_CHUNK_SIZE,
     VALID_SCHEMA_LEVELS,
 )
 from app.core.assignment import Assignment
 from app.core.database import Database
-from app.core.schema import Schema
-from app.core.statistic import Statistic
-from app.core.utils import ValueNotExistsError
+from app.core.embedding_index import EmbeddingIndexes
+from app.core.fulltext import (
+    RECORD_CONTENT_INDEX,
+    build_keyword_query,
+    build_regex_prefilter_query,
+)
+from app.core.projection import ProjectionCache
+from app.core.schema import ActiveSchemaCache, Schema
+from app.core.statistic import Statistic, refresh_label_statistics
+from app.core.utils import (
+    IndexNotOnlineError,
+    InvalidLabelError,
+    ValueNotExistsError,
+    decode_cursor,
+    encode_cursor,
+)
 from app.enums.import_type import ImportType
-from app.enums.search_mode import VerificationSearchMode, VerificationTypeSearchMode
+from app.enums.search_mode import (
+    SearchMode,
+    VerificationSearchMode,
+    VerificationTypeSearchMode,
+)
 
 
 class Project:
-
-    def __init__(self, database: Database, project_name, description=""):
+    def __init__(
+        self, database: Database, project_name, description="", validate_labels=False
+    ):
         self.database = database
         self.project_name = project_name
+        # check written labels against the active schema
+        self.validate_labels = validate_labels
+        self.__fulltext_online = False
+        self.embedding_indexes = EmbeddingIndexes(database)
+        self.projections = ProjectionCache(database)
+        self.active_schema = ActiveSchemaCache(self)
         name, found = create_or_get_project(
             database=database, project_name=project_name, description=description
         )
@@ -40,6 +67,59 @@ class Project:
             raise NotImplementedError(
                 f"Supported formats are: {', '.join([type.value for type in ImportType])}."
             )
+        q_main, args = self.__import_query(column_mapping)
+        q_main += "RETURN count(r)"
+
+        if file_type.upper() == "CSV":
+            """
+            Importing data from a url to a csv format data. requried columns are id and content.
+            also need to provide mapping from theses field to the column names in the csv file.
+            """
+            if url is None or len(url) == 0:
+                raise Exception("'url' can not be None or empty.")
+            if "id" not in column_mapping or "content" not in column_mapping:
+                raise Exception("'column_mapping' is missing either 'id' or 'content'.")
+            q_head = "LOAD CSV with HEADERS FROM $url as doc "
+            q = q_head + q_main
+            args.update({"url": url, "dataset": dataset})
+            return self.database.write_db(q, args=args)[0][0]
+        elif file_type.upper() == "DF":
+            # rows are written in chunks, each in its own transaction
+            return self.import_batches(
+                batches=(
+                    df_dict[start : start + IMPORT_CHUNK_SIZE]
+                    for start in range(0, len(df_dict), IMPORT_CHUNK_SIZE)
+                ),
+                column_mapping=column_mapping,
+                dataset=dataset,
+            )
+        else:
+            raise NotImplementedError(
+                f"{file_type.upper()} files are imported with import_batches."
+            )
+
+    def import_batches(self, batches, column_mapping, dataset=""):
+        """
+        Import batches of rows (iterable of lists of dicts, e.g. read from an
+        uploaded file), each batch in its own transaction.
+        :return: number of imported records
+        """
+        if "id" not in column_mapping or "content" not in column_mapping:
+            raise Exception("'column_mapping' is missing either 'id' or 'content'.")
+        count = 0
+        for rows in batches:
+            result = self.import_rows(
+                rows=rows, column_mapping=column_mapping, dataset=dataset
+            )
+            count += result["created"] + result["matched"]
+        return count
+
+    @staticmethod
+    def __import_query(column_mapping):
+        """
+        MERGE clauses importing one row 'doc' as a Record (and its record
+        metadata), after an UNWIND or LOAD CSV binding 'doc'.
+        """
         q_main = """
                 MERGE (r:Record {record_id:toInteger(doc[$column_mapping_id]), dataset:$dataset})
                 ON CREATE
@@ -55,45 +135,153 @@ class Project:
         }
         if "metadata" in column_mapping.keys():
             record_meta_name = column_mapping["metadata"]
+            # stamped with a bumped version, as by __write_metadata, so
+            # embedding indexes load the imported vectors
             q_meta = """         
+                    MERGE (v:MetadataVersion {name:$record_meta_name})
+                    SET v.version = coalesce(v.version, 0) + 1
                     MERGE (m:Metadata)- [:RECORD_META_OF {name:$record_meta_name}] -(r)
                     ON CREATE 
                     SET m.value = doc[$record_meta_name], m.uuid=randomUUID(), m.name=$record_meta_name
                     ON MATCH 
                     SET m.value = doc[$record_meta_name], m.name=$record_meta_name
+                    SET m.version = v.version
                     """
             q_main += q_meta
             args.update({"record_meta_name": record_meta_name})
-        q_main += "RETURN count(r)"
+        return q_main, args
 
-        if file_type.upper() == "CSV":
+    def import_rows(
+        self,
+        rows,
+        column_mapping,
+        dataset="",
+        job_query=None,
+        job_args={},
+        claim_query=None,
+    ):
+        """
+        Import a chunk of rows (list of dicts) in one transaction.
+        :param job_query: optional query run in the same transaction with
+            $created and $matched, e.g. to record the chunk on an import job
+        :param claim_query: optional query run first in the same transaction;
+            if it returns no row, nothing is imported
+        :return: {"created": # new records, "matched": # updated records},
+            or None if the claim_query returned no row
+        """
+        q_main, args = self.__import_query(column_mapping)
+        q = (
             """
-            Importing data from a url to a csv format data. requried columns are id and content.
-            also need to provide mapping from theses field to the column names in the csv file.
+            UNWIND $df as doc
+            OPTIONAL MATCH (existing:Record
+                {record_id:toInteger(doc[$column_mapping_id]), dataset:$dataset})
+            WITH doc, existing IS NOT NULL as matched
             """
-            if url is None or len(url) == 0:
-                raise Exception("'url' can not be None or empty.")
-            if "id" not in column_mapping or "content" not in column_mapping:
-                raise Exception("'column_mapping' is missing either 'id' or 'content'.")
-            q_head = "LOAD CSV with HEADERS FROM $url as doc "
-            q = q_head + q_main
-            args.update({"url": url, "dataset": dataset})
-            return self.database.write_db(q, args=args)[0][0]
-        elif file_type.upper() == "DF":
-            # error detection
-            q_head = "UNWIND $df as doc"
-            q = q_head + q_main
-            args.update({"df": df_dict, "dataset": dataset})
-            return self.database.write_db(q, args=args)[0][0]
+            + q_main
+            + """
+            RETURN count(CASE WHEN matched THEN null ELSE r END) as created,
+                count(CASE WHEN matched THEN r ELSE null END) as matched
+            """
+        )
+        args.update({"df": rows, "dataset": dataset})
+
+        def query_function(tx, query, args):
+            if claim_query is not None and tx.run(claim_query, job_args).peek() is None:
+                return None
+            record = tx.run(query, args).single()
+            result = {"created": record["created"], "matched": record["matched"]}
+            if job_query is not None:
+                tx.run(job_query, {**job_args, **result}).consume()
+            return result
+
+        return self.database.write_db_transction(
+            query_func=query_function, query=q, args=args
+        )
+
+    def import_csv_rows(
+        self,
+        url,
+        column_mapping,
+        dataset="",
+        skip=0,
+        batch_size=IMPORT_CHUNK_SIZE,
+        row_query=None,
+        job_args={},
+    ):
+        """
+        Import the rows of a csv file after the first 'skip' rows, committing
+        every 'batch_size' rows (CALL {} IN TRANSACTIONS).
+        :param row_query: optional query run for each row in the transaction
+            committing it, with 'matched' bound to whether the record existed
+        """
+        if "id" not in column_mapping or "content" not in column_mapping:
+            raise Exception("'column_mapping' is missing either 'id' or 'content'.")
+        q_main, args = self.__import_query(column_mapping)
+        q = (
+            """
+            LOAD CSV WITH HEADERS FROM $url AS doc
+            WITH doc SKIP $skip
+            CALL {
+                WITH doc
+                OPTIONAL MATCH (existing:Record
+                    {record_id:toInteger(doc[$column_mapping_id]), dataset:$dataset})
+                WITH doc, existing IS NOT NULL as matched
+            """
+            + q_main
+            + ("WITH r, matched " + row_query if row_query is not None else "")
+            + f"""
+            }} IN TRANSACTIONS OF {int(batch_size)} ROWS
+            """
+        )
+        args.update({**job_args, "url": url, "dataset": dataset, "skip": int(skip)})
+        self.database.write_db_auto_commit(q, args=args)
 
-    def export_data(self):
+    def export_data(self, page_size=EXPORT_PAGE_SIZE):
+        """
+        Iterate over all records of the project with their labels.
+        Records are read page by page with keyset pagination on uuid, an
+        index range seek, so memory stays flat regardless of project size.
+        Rows are ordered by record uuid.
+        Yields one row per label; records without labels yield a single row
+        with empty annotation fields.
+        Row fields: record_id, uuid, content, annotator, label_name,
+            label_value, label_level, start_idx, end_idx, label_metadata
+            [{name, value}], verifications [{verifier, verification_status,
+            label_value, last_timestamp}] of the label's annotation
+        """
         q = """
-            MATCH (r:Record)-[]-(n:Annotation)-[]-(l:Label) 
-            RETURN r.record_id, r.content, n.annotator, l.label_name, l.label_value
-            LIMIT 1000
+            MATCH (r:Record)
+            WHERE r.uuid > $last_uuid
+            WITH r ORDER BY r.uuid LIMIT $page_size
+            OPTIONAL MATCH (r)<-[:ANNOTATES]-(an:Annotation)
+            OPTIONAL MATCH (an)<-[:LABEL_OF]-(l:Label)
+            OPTIONAL MATCH (l)<-[:LABEL_META_OF]-(m:Metadata)
+            WITH r, an, l, COLLECT(m{.name, .value}) as label_metadata
+            OPTIONAL MATCH (an)<-[:VERIFIES]-(ver:Verification {label_name: l.label_name})
+                -[v_status:CONFIRMS|CORRECTS]-(vl:Label)
+            WITH r, an, l, label_metadata,
+                COLLECT({verifier: ver.verifier,
+                        verification_status: TYPE(v_status),
+                        label_value: vl.label_value,
+                        last_timestamp: datetime(ver.last_timestamp).epochMillis})
+                    as verifications
+            RETURN r.record_id as record_id, r.uuid as uuid, r.content as content,
+                an.annotator as annotator, l.label_name as label_name,
+                l.label_value as label_value, l.label_level as label_level,
+                l.start_idx as start_idx, l.end_idx as end_idx,
+                label_metadata,
+                [v IN verifications WHERE v.verifier IS NOT NULL] as verifications
+            ORDER BY r.uuid, an.annotator, l.label_name, l.start_idx
         """
-        args = {}
-        return self.database.read_db(q, args=args)
+        # every uuid sorts after the empty string
+        args = {"last_uuid": "", "page_size": page_size}
+        while True:
+            result = self.database.read_db(q, args=args)
+            if len(result) == 0:
+                return
+            for item in result:
+                yield dict(item)
+            args.update({"last_uuid": result[-1]["uuid"]})
 
     def __evaluator(self, node, var_name, val_name, config):
         ret = []
@@ -135,6 +323,10 @@ class Project:
         label_condition: Optional[dict] = None,
         label_metadata_condition: Optional[dict] = None,
         verification_condition: Optional[dict] = None,
+        search_mode: Optional[str] = None,
+        include_scores: bool = False,
+        cursor: Optional[str] = None,
+        with_cursor: bool = False,
     ):
         """
         Search for subset of records, based on conditions over the data records
@@ -152,9 +344,10 @@ class Project:
         uuid_list:list
             If set, the search is limited to the records specified in the list
         keyword: str
-            Keyword to match record content
+            Keyword to match record content, see search_mode
         regex: str
-            Regex to match record content
+            Regex to match record content. When the regex requires literal
+            words, candidates are first selected with the fulltext index.
         record_metadata_condition: dict
             {"name": # name of the record-level metadata to filter on
             "operator": "=="|"<"|">"|"<="|">="|"exists",
@@ -177,11 +370,41 @@ class Project:
             verification condition of the annotation.
             {"label_name": # name of the associated label
              "search_mode":"ALL"|"UNVERIFIED"|"VERIFIED"}
+        search_mode: str
+            How keyword is matched (default "CONTAINS"):
+            "CONTAINS": substring of the record content (scans all records)
+            "KEYWORD": all terms, using the fulltext index
+            "PHRASE": all terms in order, using the fulltext index
+            "PREFIX": all terms, the last one as a prefix, using the fulltext index
+            "REGEX": keyword is a regex, same as regex
+        include_scores: bool
+            If set, return the fulltext relevance score of each record
+            (None if no fulltext query was run), ordered by score.
+        cursor: str
+            Continuation cursor returned by the previous page, None for
+            the first page. Only used with with_cursor.
+        with_cursor: bool
+            If set, records are ordered by uuid and the page resumes after
+            the cursor with a range predicate instead of skipping rows;
+            skip is ignored.
         RETURN
         ---------
-        Object: {'record_uuid': # meganno record reference,
-                 "record_id": # record_id at import}
+        List of record uuids, or if include_scores is set
+        [{"record_uuid": # meganno record reference,
+          "score": # fulltext relevance score}]
+        If with_cursor is set: {"uuid_list": # list as above,
+                                "next_cursor": # cursor of the next page or None}
         """
+        if search_mode is None:
+            search_mode = SearchMode.CONTAINS.value
+        if not SearchMode.has(search_mode):
+            raise Exception(f"Unsupported search mode {search_mode}.")
+        if keyword is not None and search_mode == SearchMode.REGEX.value:
+            if regex is not None:
+                raise Exception("Both keyword and regex given in REGEX search mode.")
+            keyword, regex = None, keyword
+        if with_cursor and include_scores:
+            raise ValueError("'include_scores' can not be used with a cursor.")
 
         args = {
             "uuid_list": uuid_list,
@@ -192,19 +415,55 @@ class Project:
             "skip": int(skip),
         }
 
+        # fulltext index queries, combined into one index lookup
+        fulltext_queries = []
+        if keyword is not None and search_mode != SearchMode.CONTAINS.value:
+            if not self.has_fulltext_index():
+                # still populating after a migration, or failed
+                raise IndexNotOnlineError(RECORD_CONTENT_INDEX)
+            fulltext_queries.append(build_keyword_query(keyword, search_mode))
+        if regex is not None and self.has_fulltext_index():
+            fulltext_queries.append(build_regex_prefilter_query(regex))
+        fulltext_queries = [item for item in fulltext_queries if item is not None]
+
         q_list = [
             "MATCH (n:Record)",
         ]
+        # variables carried over WITH clauses
+        carried = "n"
+        if len(fulltext_queries) > 0:
+            args.update(
+                {
+                    "fulltext_index": RECORD_CONTENT_INDEX,
+                    "fulltext_query": (
+                        fulltext_queries[0]
+                        if len(fulltext_queries) == 1
+                        else " ".join([f"+({item})" for item in fulltext_queries])
+                    ),
+                }
+            )
+            q_list[0] = (
+                "CALL db.index.fulltext.queryNodes($fulltext_index, $fulltext_query) "
+                "YIELD node AS n, score"
+            )
+            carried = "n, score"
         # Record filters
         record_clauses = []
         if uuid_list is not None:
             record_clauses.append("n.uuid in $uuid_list")
-        if keyword is not None:
+        if with_cursor and cursor is not None:
+            (last_uuid,) = decode_cursor(cursor, 1)
+            record_clauses.append("n.uuid > $last_uuid")
+            args.update({"last_uuid": last_uuid})
+        if keyword is not None and search_mode == SearchMode.CONTAINS.value:
             record_clauses.append("n.content contains $keyword")
         if regex is not None:
             record_clauses.append("n.content =~ $regex")
         if record_metadata_condition is not None:
-            q_list[0] = "MATCH (n:Record)--(m_r:Metadata)"
+            if len(fulltext_queries) > 0:
+                q_list.append("MATCH (n)--(m_r:Metadata)")
+            else:
+                q_list[0] = "MATCH (n:Record)--(m_r:Metadata)"
             clause, arg = self.__evaluator(
                 "m_r", "name", "value", record_metadata_condition
             )
@@ -224,7 +483,7 @@ class Project:
         if label_condition is not None:
             q_match += "--(l:Label)"
             if label_condition["operator"].upper() == "CONFLICTS":
-                conflict_filter = """WITH n, apoc.convert.toSet(collect(apoc.convert.toJson(l.label_value))) 
+                conflict_filter = f"""WITH {carried}, apoc.convert.toSet(collect(apoc.convert.toJson(l.label_value))) 
                                     as candidates
                                     WHERE size(candidates)>1"""
 
@@ -282,12 +541,51 @@ class Project:
             q_list.append(q_match_label_meta)
             q_list.append(f"WHERE {' AND '.join(label_meta_clauses)}")
 
-        q_list.append("RETURN DISTINCT n.uuid as record_uuid")
-        q_list.append("SKIP $skip LIMIT $limit")
+        if with_cursor:
+            q_list.append("RETURN DISTINCT n.uuid as record_uuid")
+            q_list.append("ORDER BY record_uuid")
+            q_list.append("LIMIT $limit")
+        elif include_scores and len(fulltext_queries) > 0:
+            q_list.append("RETURN DISTINCT n.uuid as record_uuid, score")
+            q_list.append("ORDER BY score DESC")
+            q_list.append("SKIP $skip LIMIT $limit")
+        else:
+            q_list.append("RETURN DISTINCT n.uuid as record_uuid")
+            q_list.append("SKIP $skip LIMIT $limit")
 
         result = self.database.read_db(query="\n".join(q_list), args=args)
+        if with_cursor:
+            next_cursor = None
+            if len(result) == args["limit"]:
+                next_cursor = encode_cursor(result[-1]["record_uuid"])
+            return {
+                "uuid_list": [item["record_uuid"] for item in result],
+                "next_cursor": next_cursor,
+            }
+        if include_scores:
+            return [
+                {"record_uuid": item["record_uuid"], "score": item.get("score", None)}
+                for item in result
+            ]
         return [item["record_uuid"] for item in result]
 
+    def has_fulltext_index(self):
+        """
+        Check the record content fulltext index exists and is online.
+        Once found online, the check is not repeated.
+        """
+        if not self.__fulltext_online:
+            result = self.database.run_schema(
+                """
+                SHOW INDEXES YIELD name, state
+                WHERE name = $name AND state = 'ONLINE'
+                RETURN name
+                """,
+                args={"name": RECORD_CONTENT_INDEX},
+            )
+            self.__fulltext_online = len(result) > 0
+        return self.__fulltext_online
+
     def get_data_by_uuid(self, uuid):
         q = """
             MATCH (n:Record)
@@ -340,8 +638,14 @@ class Project:
                               {l:l, an:an}) yield value as rel
             RETURN DISTINCT an.uuid as an_uuid"""
 
-        return self.database.write_db(
-            q,
+        def query_function(tx, query, args):
+            result = list(tx.run(query, args))
+            refresh_label_statistics(tx, [record_uuid])
+            return result
+
+        return self.database.write_db_transction(
+            query_func=query_function,
+            query=q,
             args={
                 "new_labels": label_list,
                 "annotator": annotator,
@@ -408,7 +712,6 @@ class Project:
         query = "\n".join(q)
 
         def query_function(tx, query, args):
-
             result = tx.run(query, args)
             label_uuid = result.single()["label_uuid"]
 
@@ -444,6 +747,8 @@ class Project:
 
                 result = tx.run(q, args_inner)
 
+            # the label may already be part of an annotation
+            refresh_label_statistics(tx, [record_uuid])
             return label_uuid
 
         result = self.database.write_db_transction(
@@ -526,10 +831,29 @@ class Project:
             RETURN toInteger(count(class))
         """
         )
-        return self.database.write_db(query="\n".join(q), args=args)[0][0]
 
-    def annotate(self, record_uuid, labels, annotator):
+        def query_function(tx, query, args):
+            count = tx.run(query, args).single()[0]
+            refresh_label_statistics(tx, [record_uuid])
+            return count
+
+        return self.database.write_db_transction(
+            query_func=query_function, query="\n".join(q), args=args
+        )
 
+    def __check_labels(self, labels):
+        # rejected before any database write, from the active schema cache
+        if self.validate_labels:
+            self.get_schemas().check_labels(labels)
+
+    def annotate(self, record_uuid, labels, annotator):
+        self.__check_labels(
+            [
+                {**label, "label_level": level}
+                for level in VALID_SCHEMA_LEVELS
+                for label in labels.get(f"labels_{level}", None) or []
+            ]
+        )
         exist_uuid = self.get_data_by_uuid(uuid=record_uuid)
         if len(exist_uuid) == 0:
             raise ValueNotExistsError(record_uuid)
@@ -589,8 +913,15 @@ class Project:
         return annotation_uuid
 
     def annotate_batch(self, annotation_list, annotator):
-        """ "
+        """
         Annotate for a batch of data record.
+        Record existence is validated for the whole batch in one query, then
+        labels, label metadata and annotations are upserted with UNWIND, one
+        write transaction per ANNOTATION_BATCH_CHUNK_SIZE items (items of
+        the same record in separate transactions, in order). Label metadata
+        conflicts are checked in the transaction writing the item. If a chunk
+        fails to commit, its items are replayed one at a time so a bad item
+        does not fail the rest of the batch.
         Parameters
         -----------
         annotation_list: list of objects
@@ -604,30 +935,327 @@ class Project:
                 error: if set failed
         """
         ret = []
-        for item in annotation_list:
+        items = []
+        for idx, item in enumerate(annotation_list):
+            record_uuid = pydash.objects.get(item, "record_uuid", None)
+            ret.append({"uuid": record_uuid})
             try:
-                record_uuid = item["record_uuid"]
-                labels = item["labels"]
-                response = {"uuid": record_uuid}
-                annotation_uuid = self.annotate(
-                    record_uuid=record_uuid, labels=labels, annotator=annotator
+                parsed_item = self.__parse_batch_item(idx, item)
+                self.__check_labels(parsed_item["labels"])
+                items.append(parsed_item)
+            except KeyError as ex:
+                ret[idx].update({"error": f"Bad request: {ex} is missing."})
+            except InvalidLabelError as ex:
+                ret[idx].update({"error": str(ex)})
+        if len(items) == 0:
+            return ret
+
+        existing_uuids = self.__get_existing_record_uuids(
+            list(set([item["record_uuid"] for item in items]))
+        )
+        valid_items = []
+        for item in items:
+            if item["record_uuid"] not in existing_uuids:
+                ret[item["idx"]].update(
+                    {
+                        "error": f"ValueNotExistsError: {item['record_uuid']} does not exist in the database."
+                    }
                 )
-                response.update({"annotation_uuid": annotation_uuid})
+            else:
+                valid_items.append(item)
+
+        for chunk in self.__chunk_batch_items(valid_items):
+            try:
+                annotation_uuids, metadata_conflicts = self.__write_annotation_chunk(
+                    chunk, annotator
+                )
+                for idx, message in metadata_conflicts.items():
+                    ret[idx].update({"error": f"Internal DB error {message}"})
+            except Exception:
+                # replay the chunk item by item to isolate the failing item(s)
+                annotation_uuids = {}
+                for item in chunk:
+                    try:
+                        annotation_uuids[item["idx"]] = self.annotate(
+                            record_uuid=item["record_uuid"],
+                            labels=annotation_list[item["idx"]]["labels"],
+                            annotator=annotator,
+                        )
+                    except ValueNotExistsError:
+                        continue
+                    except Exception as ex:
+                        ret[item["idx"]].update({"error": f"Internal DB error {ex}"})
+            for item in chunk:
+                response = ret[item["idx"]]
+                if "error" in response:
+                    continue
+                if item["idx"] in annotation_uuids:
+                    response.update({"annotation_uuid": annotation_uuids[item["idx"]]})
+                else:
+                    response.update(
+                        {
+                            "error": f"ValueNotExistsError: {item['record_uuid']} does not exist in the database."
+                        }
+                    )
+        return ret
 
-            except ValueNotExistsError as ex:
-                response.update(
+    def __parse_batch_item(self, idx, item):
+        """
+        Flatten one item of annotate_batch into label rows for UNWIND.
+        Raises KeyError on missing required fields, same as annotate.
+        """
+        record_uuid = item["record_uuid"]
+        labels = item["labels"]
+        label_rows = []
+        if "span" in VALID_SCHEMA_LEVELS:
+            for label in labels.get("labels_span", None) or []:
+                label_rows.append(
                     {
-                        "error": f"ValueNotExistsError: {record_uuid} does not exist in the database."
+                        "record_uuid": record_uuid,
+                        "label_level": "span",
+                        "label_name": label["label_name"],
+                        "label_value": label["label_value"],
+                        "start_idx": label["start_idx"],
+                        "end_idx": label["end_idx"],
+                        # same rule as update_label: spans are keyed by offsets
+                        "span_offsets": pydash.is_integer(label["start_idx"])
+                        and pydash.is_integer(label["end_idx"]),
+                        "metadata_list": label.get("metadata_list", []),
                     }
                 )
-            except KeyError as ex:
-                response.update({"error": f"Bad request: {ex} is missing."})
-            except Exception as ex:
-                response.update({"error": f"Internal DB error {ex}"})
-            ret.append(response)
-        return ret
+        if "record" in VALID_SCHEMA_LEVELS:
+            for label in labels.get("labels_record", None) or []:
+                label_rows.append(
+                    {
+                        "record_uuid": record_uuid,
+                        "label_level": "record",
+                        "label_name": label["label_name"],
+                        "label_value": label["label_value"],
+                        "start_idx": None,
+                        "end_idx": None,
+                        "span_offsets": False,
+                        "metadata_list": label.get("metadata_list", []),
+                    }
+                )
+        return {"idx": idx, "record_uuid": record_uuid, "labels": label_rows}
+
+    def __get_existing_record_uuids(self, uuid_list):
+        q = """
+            MATCH (n:Record)
+            WHERE n.uuid IN $uuid_list
+            RETURN n.uuid as uuid
+        """
+        result = self.database.read_db(q, args={"uuid_list": uuid_list})
+        return set([item["uuid"] for item in result])
+
+    def __get_label_metadata_conflicts(self, tx, items, annotator):
+        """
+        Find items adding label metadata whose name already exists on the
+        (to be updated) label, mirroring the check in update_label.
+        The labels are locked until the transaction 'tx' commits, so the
+        metadata can not be added by another transaction in between.
+        :return: dict of item index to error message
+        """
+        rows = [
+            {
+                "idx": item["idx"],
+                "record_uuid": label["record_uuid"],
+                "label_level": label["label_level"],
+                "label_name": label["label_name"],
+                "start_idx": label["start_idx"],
+                "end_idx": label["end_idx"],
+                "span_offsets": label["span_offsets"],
+                "metadata_names": [
+                    metadata["metadata_name"] for metadata in label["metadata_list"]
+                ],
+            }
+            for item in items
+            for label in item["labels"]
+            if len(label["metadata_list"]) > 0
+        ]
+        if len(rows) == 0:
+            return {}
+        q = """
+            UNWIND $rows as row
+            MATCH (l:Label {record_uuid: row.record_uuid,
+                            annotator: $annotator,
+                            label_level: row.label_level,
+                            label_name: row.label_name})
+            WHERE NOT row.span_offsets
+                OR (l.start_idx = row.start_idx AND l.end_idx = row.end_idx)
+            CALL apoc.lock.nodes([l])
+            MATCH (l)-[r:LABEL_META_OF]-(m:Metadata)
+            WHERE r.name IN row.metadata_names
+            RETURN row.idx as idx, l.uuid as label_uuid, collect(r.name) as m_list
+        """
+        result = tx.run(q, {"rows": rows, "annotator": annotator})
+        return {
+            item[
+                "idx"
+            ]: f"Metadata {item['m_list']} already existed for label {item['label_uuid']}. No new metadata set for label. "
+            for item in result
+        }
+
+    @staticmethod
+    def __chunk_batch_items(items):
+        """
+        Split annotate_batch items in chunks of ANNOTATION_BATCH_CHUNK_SIZE
+        items, in order. Items of the same record go to separate chunks:
+        they upsert the same annotation, and in one chunk each would delete
+        the labels of the other; across chunks the last item wins, as with
+        one annotate call per item.
+        """
+        chunks = []
+        chunk, chunk_records = [], set()
+        for item in items:
+            if (
+                len(chunk) == ANNOTATION_BATCH_CHUNK_SIZE
+                or item["record_uuid"] in chunk_records
+            ):
+                chunks.append(chunk)
+                chunk, chunk_records = [], set()
+            chunk.append(item)
+            chunk_records.add(item["record_uuid"])
+        if len(chunk) > 0:
+            chunks.append(chunk)
+        return chunks
+
+    def __write_annotation_chunk(self, items, annotator):
+        """
+        Upsert labels, label metadata and annotations of a chunk of
+        annotate_batch items in a single write transaction.
+        Follows the rules of update_label and update_annotation_with_labels
+        (overwrite=True); items with label metadata conflicts are not written.
+        :return: (dict of item index to annotation uuid,
+            dict of item index to metadata conflict message)
+        """
+        q_label_set = """
+            ON MATCH
+                SET l.label_value = row.label_value // update labels
+            ON CREATE
+                SET l.uuid = randomUUID(),
+                    l.label_value = row.label_value
+            RETURN row.key as key, l.uuid as label_uuid
+        """
+        q_offset_labels = (
+            """
+            UNWIND $rows as row
+            MERGE (l:Label {record_uuid: row.record_uuid,
+                            annotator: $annotator,
+                            label_level: row.label_level,
+                            label_name: row.label_name,
+                            start_idx: row.start_idx,
+                            end_idx: row.end_idx})
+        """
+            + q_label_set
+        )
+        q_labels = (
+            """
+            UNWIND $rows as row
+            MERGE (l:Label {record_uuid: row.record_uuid,
+                            annotator: $annotator,
+                            label_level: row.label_level,
+                            label_name: row.label_name})
+        """
+            + q_label_set
+        )
+        q_metadata = """
+            UNWIND $rows as row
+            MATCH (n:Label {uuid: row.label_uuid})
+            CREATE (n)<-[:LABEL_META_OF {name: row.metadata_name}]-
+                        (m:Metadata {name: row.metadata_name,
+                            value: row.metadata_value,
+                            uuid: randomUUID()})
+            RETURN count(m) as count
+        """
+        q_annotations = """
+            UNWIND $rows as row
+            MATCH (r:Record {uuid: row.record_uuid})
+            MERGE (an:Annotation {record_uuid: row.record_uuid, annotator: $annotator})-[:ANNOTATES] -> (r)
+            ON CREATE
+                SET an.uuid = randomUUID(),
+                    an.created_on=DateTime(),
+                    an.annotator=$annotator,
+                    an.record_uuid=row.record_uuid
+            WITH an, row
+            // remove old labels that does not exisits in new labels
+            CALL {
+                WITH an, row
+                OPTIONAL MATCH (l:Label)-[:LABEL_OF]-(an)
+                WHERE NOT l.uuid IN row.label_uuids
+                DETACH DELETE l
+                RETURN count(l) as remove_count
+            }
+            // attach new labels to annotation node
+            CALL {
+                WITH an, row
+                UNWIND row.label_uuids as label_uuid
+                MATCH (l:Label {uuid: label_uuid})
+                MERGE (l)-[:LABEL_OF]->(an)
+                RETURN count(l) as attach_count
+            }
+            RETURN row.idx as idx, an.uuid as an_uuid
+        """
+
+        def query_function(tx, query, args):
+            metadata_conflicts = self.__get_label_metadata_conflicts(
+                tx, items, annotator
+            )
+            chunk = [item for item in items if item["idx"] not in metadata_conflicts]
+            offset_label_rows = []
+            label_rows = []
+            for item in chunk:
+                for n, label in enumerate(item["labels"]):
+                    row = {**label, "key": f"{item['idx']}:{n}"}
+                    if label["span_offsets"]:
+                        offset_label_rows.append(row)
+                    else:
+                        label_rows.append(row)
+            label_uuids = {}
+            for q, rows in [
+                (q_offset_labels, offset_label_rows),
+                (q_labels, label_rows),
+            ]:
+                if len(rows) > 0:
+                    for record in tx.run(q, {"rows": rows, "annotator": annotator}):
+                        label_uuids[record["key"]] = record["label_uuid"]
+            metadata_rows = [
+                {
+                    "label_uuid": label_uuids[row["key"]],
+                    "metadata_name": metadata["metadata_name"],
+                    "metadata_value": metadata["metadata_value"],
+                }
+                for row in offset_label_rows + label_rows
+                for metadata in row["metadata_list"]
+            ]
+            if len(metadata_rows) > 0:
+                tx.run(q_metadata, {"rows": metadata_rows}).consume()
+            annotation_rows = [
+                {
+                    "idx": item["idx"],
+                    "record_uuid": item["record_uuid"],
+                    "label_uuids": [
+                        label_uuids[f"{item['idx']}:{n}"]
+                        for n in range(len(item["labels"]))
+                    ],
+                }
+                for item in chunk
+            ]
+            result = tx.run(
+                q_annotations, {"rows": annotation_rows, "annotator": annotator}
+            )
+            annotation_uuids = {record["idx"]: record["an_uuid"] for record in result}
+            refresh_label_statistics(tx, [item["record_uuid"] for item in chunk])
+            return annotation_uuids, metadata_conflicts
+
+        return self.database.write_db_transction(
+            query_func=query_function, query=None, args={}
+        )
 
     def label(self, record_uuid, labels, annotator):
+        # removals are not checked, labels may have left the schema
+        if labels[0]["label_value"] is not None:
+            self.__check_labels(labels[:1])
         exist_uuid = self.get_data_by_uuid(uuid=record_uuid)
         if len(exist_uuid) == 0:
             raise ValueNotExistsError(record_uuid)
@@ -739,6 +1367,7 @@ class Project:
             raise Exception(
                 f"Unsupported label_level, expect: {', '.join(VALID_SCHEMA_LEVELS)}"
             )
+        self.__check_labels(labels)
         exist_uuid = self.get_data_by_uuid(uuid=record_uuid)
         if len(exist_uuid) == 0:
             raise ValueNotExistsError(record_uuid)
@@ -856,7 +1485,29 @@ class Project:
                 raise ValueError(
                     "Objects in 'metadata_list' must follow the format {'uuid':.., 'value':..}"
                 )
+        return self.__write_metadata(record_meta_name, metadata_list)
+
+    def bulk_update_metadata(self, record_meta_name, batches):
+        """
+        Record metadata for records from batches of objects in format
+        {'uuid':.., 'value':..} (e.g. vectors read from an uploaded file),
+        each batch in its own transaction.
+
+        :return: count of metadata items recorded.
+        """
+        count = 0
+        for metadata_list in batches:
+            count += self.__write_metadata(record_meta_name, metadata_list)
+        return count
+
+    def __write_metadata(self, record_meta_name, metadata_list):
+        # the version stamp lets embedding indexes reload only changed vectors;
+        # it is bumped by every transaction, so a reload between two batches
+        # does not miss the later one
         q = """
+            MERGE (v:MetadataVersion {name:$record_meta_name})
+            SET v.version = coalesce(v.version, 0) + 1
+            WITH v
             UNWIND $data as p
             MATCH (r:Record {uuid:p.uuid})
             MERGE (m:Metadata)- [:RECORD_META_OF {name:$record_meta_name}] -(r)
@@ -864,6 +1515,7 @@ class Project:
                 SET m.value = p.value, m.uuid=randomUUID(), m.name=$record_meta_name
             ON MATCH 
                 SET m.value = p.value, m.name=$record_meta_name
+            SET m.version = v.version
             RETURN count(m) as count"""
         args = {"data": metadata_list, "record_meta_name": record_meta_name}
         return self.database.write_db(q, args=args)[0][0]
@@ -876,31 +1528,6 @@ class Project:
             return False
 
 
-def create_constraints(database):
-    # dataset, id or uuid be the unique identifier,
-    # constraint on multiple properties is a enterprise-only function
-    # pass for now.
-    pass
-
-
-def create_index(database):
-    database.write_db(
-        """
-        CREATE INDEX index_data_uuid IF NOT EXISTS
-        FOR (n:Record)
-        ON (n.uuid);
-    """
-    )
-    database.write_db(
-        """
-        CREATE INDEX index_annotation_annotator IF NOT EXISTS 
-        FOR (a:Annotation) 
-        
-        on (a.annotator)
-    """
-    )
-
-
 def create_or_get_project(database, project_name, description=""):
     q = """
         MATCH (n:Project) with count(n) as cnt
@@ -920,9 +1547,5 @@ def create_or_get_project(database, project_name, description=""):
         q, args={"project_name": project_name, "description": description}
     )[0][0]
     project_name, found = result["name"], result["found"]
-    if found == "CREATED":
-        # create_index(database)
-        # skipping index creation to avoid neo4j caching error
-        # need to fix later for efficiency
-        create_constraints(database)
+    # indexes are created by app.core.migration before the project is loaded
     return project_name, found
@@ -0,0 +1,319 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from app.core.database import Database
+from app.enums.projection_method import ProjectionMethod
+from app.enums.projection_status import ProjectionStatus
+from sklearn.decomposition import PCA, TruncatedSVD
+from sklearn.manifold import TSNE
+
+# number of processes fitting projections, per worker process
+DEFAULT_PROJECTION_WORKERS = 1
+# seconds a projection may be fitting before another request starts it again
+DEFAULT_PROJECTION_TIMEOUT = 3600
+# max number of records a SAMPLE projection is fitted on
+PROJECTION_SAMPLE_SIZE = 10000
+# a SAMPLE projection is fitted again once the records grew to this factor
+# of the records it was fitted on
+PROJECTION_REFIT_GROWTH = 2
+
+
+def projection_uid(embedding_type, label_name, method=ProjectionMethod.TSNE.value):
+    return json.dumps([embedding_type, label_name, method])
+
+
+def fingerprint(uuids, embeddings):
+    """
+    Fingerprint of a set of records and their embedding values.
+    :param uuids: record uuids, sorted
+    :param embeddings: float64 matrix, one row per uuid
+    """
+    digest = hashlib.sha256(json.dumps(uuids).encode("utf-8"))
+    digest.update(str(embeddings.shape).encode("utf-8"))
+    digest.update(np.ascontiguousarray(embeddings).tobytes())
+    return digest.hexdigest()
+
+
+def fit_projection(method, embeddings):
+    """
+    Project embeddings to 2d, in a pool process.
+    :return: (projection_2d, model), model the (mean, components) of a
+        SAMPLE projection to place later records with, None otherwise
+    """
+    if method == ProjectionMethod.PCA.value:
+        return PCA(n_components=2, random_state=0).fit_transform(embeddings), None
+    if method == ProjectionMethod.SVD.value:
+        svd = TruncatedSVD(n_components=2, algorithm="randomized", random_state=0)
+        return svd.fit_transform(embeddings), None
+    if method == ProjectionMethod.SAMPLE.value:
+        sample = embeddings
+        if len(embeddings) > PROJECTION_SAMPLE_SIZE:
+            rows = np.random.default_rng(0).choice(
+                len(embeddings), PROJECTION_SAMPLE_SIZE, replace=False
+            )
+            sample = embeddings[rows]
+        pca = PCA(n_components=2, random_state=0).fit(sample)
+        model = (pca.mean_, pca.components_)
+        return transform(model, embeddings), model
+    tsne = TSNE(
+        n_components=2,
+        random_state=0,
+        perplexity=min(30, len(embeddings) - 1),
+    )
+    return tsne.fit_transform(embeddings), None
+
+
+def transform(model, embeddings):
+    """Place embeddings with a fitted SAMPLE projection."""
+    mean, components = model
+    return (embeddings - mean) @ components.T
+
+
+class ProjectionCache:
+    """
+    2-d projections of the labeled records of an embedding type, keyed by
+    the embedding type and a fingerprint of the records and their
+    embedding values.
+    The latest projection of each (embedding_type, label_name, method) is
+    stored on a (:Projection) node, shared by all worker processes. When the
+    fingerprint has changed, the first request claims a refresh on the node
+    and fits it on a process pool of its worker, while the previous
+    projection keeps being served. A pool broken by a dying process is
+    replaced, and its refresh released to be claimed again.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        max_workers=DEFAULT_PROJECTION_WORKERS,
+        timeout=DEFAULT_PROJECTION_TIMEOUT,
+    ):
+        self.database = database
+        self.max_workers = int(max_workers)
+        self.timeout = float(timeout)
+        self.__executor = None
+        self.__pid = None
+        self.__lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # process pools do not survive a fork, create one per worker process;
+        # pool processes are spawned, as forking a process running driver
+        # threads is unsafe
+        pid = os.getpid()
+        if self.__executor is None or self.__pid != pid:
+            with self.__lock:
+                if self.__executor is None or self.__pid != pid:
+                    self.__executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                    self.__pid = pid
+        return self.__executor
+
+    def __reset_executor(self, executor):
+        # replace a broken pool, unless it was replaced already
+        with self.__lock:
+            if self.__executor is executor:
+                self.__executor = None
+        executor.shutdown(wait=False)
+
+    def __submit(self, method, embeddings):
+        executor = self.executor
+        try:
+            future = executor.submit(fit_projection, method, embeddings)
+        except BrokenProcessPool:
+            self.__reset_executor(executor)
+            executor = self.executor
+            future = executor.submit(fit_projection, method, embeddings)
+        return executor, future
+
+    def get(
+        self,
+        embedding_type,
+        label_name,
+        uuids,
+        embeddings,
+        method=ProjectionMethod.TSNE.value,
+    ):
+        """
+        Get the projection of records, starting a refresh if the records or
+        their embeddings changed since the cached projection.
+        A SAMPLE projection that has been fitted places changed records
+        right away, without fitting again, until the records grow to
+        PROJECTION_REFIT_GROWTH times those it was fitted on.
+        :return: (status, {uuid: (x_axis, y_axis)}); while COMPUTING, the
+            previous projection if any
+        :raises ValueError: if fitting the current records failed
+        """
+        if not ProjectionMethod.has(method):
+            raise ValueError(f"Projection method '{method}' is not supported.")
+        order = np.argsort(uuids, kind="stable")
+        uuids = [uuids[index] for index in order]
+        embeddings = np.asarray(embeddings, dtype=np.float64)[order]
+        if len(uuids) < 2:
+            raise ValueError("At least 2 records are needed for a projection.")
+        uid = projection_uid(embedding_type, label_name, method)
+        key = fingerprint(uuids, embeddings)
+        q = """
+            MATCH (p:Projection {uid: $uid})
+            RETURN p{.fingerprint, .uuids, .x_axis, .y_axis, .error,
+                .error_fingerprint, .mean, .components, .fitted_records}
+                as projection
+        """
+        result = self.database.read_db(q, args={"uid": uid})
+        projection = result[0]["projection"] if len(result) > 0 else {}
+        coordinates = {
+            uuid: (x, y)
+            for uuid, x, y in zip(
+                projection.get("uuids") or [],
+                projection.get("x_axis") or [],
+                projection.get("y_axis") or [],
+            )
+        }
+        if projection.get("fingerprint") == key:
+            return ProjectionStatus.READY, coordinates
+        if projection.get("error_fingerprint") == key:
+            raise ValueError(projection["error"])
+        mean = projection.get("mean") or []
+        fitted_records = projection.get("fitted_records") or 0
+        if (
+            method == ProjectionMethod.SAMPLE.value
+            and len(mean) == len(embeddings[0])
+            and len(uuids) <= fitted_records * PROJECTION_REFIT_GROWTH
+        ):
+            model = (np.array(mean), np.array(projection["components"]).reshape(2, -1))
+            projection_2d = transform(model, embeddings)
+            self.__save(uid, key, uuids, projection_2d)
+            return ProjectionStatus.READY, {
+                uuid: (x, y) for uuid, (x, y) in zip(uuids, projection_2d.tolist())
+            }
+        claimed_on = self.__claim(uid, embedding_type, label_name, method, key)
+        if claimed_on is not None:
+            try:
+                executor, future = self.__submit(method, embeddings)
+            except Exception:
+                self.__release(uid, key)
+                raise
+            future.add_done_callback(
+                lambda done: self.__store(uid, key, uuids, done, executor, claimed_on)
+            )
+        return ProjectionStatus.COMPUTING, coordinates
+
+    def __claim(self, uid, embedding_type, label_name, method, key):
+        # a refresh is started once: the claim re-checks the pending
+        # fingerprint under the write lock
+        # :return: the time of the claim, or None if not claimed
+        q = """
+            MERGE (p:Projection {uid: $uid})
+            ON CREATE SET p.embedding_type = $embedding_type,
+                p.label_name = $label_name,
+                p.method = $method
+            WITH p
+            CALL apoc.lock.nodes([p])
+            WITH p
+            WHERE coalesce(p.fingerprint, '') <> $fingerprint
+                AND NOT (coalesce(p.pending_fingerprint, '') = $fingerprint
+                    AND p.pending_until > timestamp())
+            SET p.pending_fingerprint = $fingerprint,
+                p.pending_until = timestamp() + $timeout_ms
+            RETURN timestamp() as claimed_on
+        """
+        result = self.database.write_db(
+            q,
+            args={
+                "uid": uid,
+                "embedding_type": embedding_type,
+                "label_name": label_name,
+                "method": method,
+                "fingerprint": key,
+                "timeout_ms": int(self.timeout * 1000),
+            },
+        )
+        return result[0]["claimed_on"] if len(result) > 0 else None
+
+    def __release(self, uid, key):
+        # a refresh that was not fitted can be claimed again right away
+        q = """
+            MATCH (p:Projection {uid: $uid})
+            WHERE p.pending_fingerprint = $fingerprint
+            SET p.pending_fingerprint = null, p.pending_until = null
+        """
+        self.database.write_db(q, args={"uid": uid, "fingerprint": key})
+
+    def __save(self, uid, key, uuids, projection_2d, model=None, claimed_on=None):
+        # a fit is only saved if no fit claimed after it was saved already,
+        # so a fit finishing late does not overwrite a newer one; a SAMPLE
+        # transform (no claimed_on) is computed from the current records
+        q = """
+            MATCH (p:Projection {uid: $uid})
+            CALL apoc.lock.nodes([p])
+            WITH p
+            WHERE $claimed_on IS NULL OR coalesce(p.fitted_on, 0) <= $claimed_on
+            WITH p, coalesce(p.pending_fingerprint, '') = $fingerprint as done
+            SET p.fingerprint = $fingerprint,
+                p.uuids = $uuids,
+                p.x_axis = $x_axis,
+                p.y_axis = $y_axis,
+                p.mean = coalesce($mean, p.mean),
+                p.components = coalesce($components, p.components),
+                p.fitted_records = coalesce($fitted_records, p.fitted_records),
+                p.fitted_on = coalesce($claimed_on, p.fitted_on),
+                p.updated = timestamp(),
+                p.pending_fingerprint = CASE WHEN done
+                    THEN null ELSE p.pending_fingerprint END,
+                p.pending_until = CASE WHEN done
+                    THEN null ELSE p.pending_until END
+        """
+        mean, components = model if model is not None else (None, None)
+        self.database.write_db(
+            q,
+            args={
+                "uid": uid,
+                "fingerprint": key,
+                "uuids": uuids,
+                "x_axis": projection_2d[:, 0].tolist(),
+                "y_axis": projection_2d[:, 1].tolist(),
+                # node properties are flat lists
+                "mean": None if mean is None else mean.tolist(),
+                "components": (
+                    None if components is None else components.ravel().tolist()
+                ),
+                "fitted_records": None if model is None else len(uuids),
+                "claimed_on": claimed_on,
+            },
+        )
+
+    def __store(self, uid, key, uuids, future, executor, claimed_on):
+        try:
+            projection_2d, model = future.result()
+            self.__save(uid, key, uuids, projection_2d, model, claimed_on)
+        except BrokenProcessPool:
+            # a pool process died (e.g. out of memory), the records may fit
+            # on a new pool: the next request starts the refresh again
+            traceback.print_exc()
+            self.__reset_executor(executor)
+            self.__release(uid, key)
+        except Exception as ex:
+            traceback.print_exc()
+            # the error is reported until the records or embeddings change
+            q = """
+                MATCH (p:Projection {uid: $uid})
+                WITH p, coalesce(p.pending_fingerprint, '') = $fingerprint as done
+                SET p.error = $error,
+                    p.error_fingerprint = $fingerprint,
+                    p.pending_fingerprint = CASE WHEN done
+                        THEN null ELSE p.pending_fingerprint END,
+                    p.pending_until = CASE WHEN done
+                        THEN null ELSE p.pending_until END
+            """
+            self.database.write_db(
+                q, args={"uid": uid, "fingerprint": key, "error": str(ex)}
+            )
@@ -0,0 +1,148 @@
+import json
+import logging
+import random
+import re
+import threading
+
+# seconds a query may take before it is written to the slow query log
+DEFAULT_SLOW_QUERY_SECONDS = 1.0
+# share of read_db/write_db calls run with PROFILE (0 disables)
+DEFAULT_QUERY_PROFILE_RATE = 0.0
+# upper bounds (seconds) of the latency histogram buckets, the last one +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# summary counters of neo4j kept per query
+SUMMARY_COUNTERS = (
+    "nodes_created",
+    "nodes_deleted",
+    "relationships_created",
+    "relationships_deleted",
+    "properties_set",
+)
+# max characters of a query in the slow query log
+SLOW_QUERY_TEXT_LENGTH = 2000
+
+slow_query_logger = logging.getLogger("slow_query")
+
+
+def redact(args):
+    """Parameters of a query as their type (and size), never their values."""
+    if not isinstance(args, dict):
+        return None
+    redacted = {}
+    for key, value in args.items():
+        kind = type(value).__name__
+        if isinstance(value, (str, list, tuple, dict)):
+            kind = f"{kind}[{len(value)}]"
+        redacted[key] = kind
+    return redacted
+
+
+def db_hits(profile):
+    """Total db hits of a PROFILE plan, over all its operators."""
+    if not isinstance(profile, dict):
+        return 0
+    return int(profile.get("dbHits", 0) or 0) + sum(
+        db_hits(child) for child in profile.get("children", []) or []
+    )
+
+
+class QueryStats:
+    """
+    Per-query latency histograms, row counts and neo4j summary counters of
+    a worker process, keyed by query name (the calling module.function
+    unless given). Queries slower than slow_query_seconds are logged to
+    the 'slow_query' logger with their parameters redacted; a profile_rate
+    share of the single-query reads and writes are run with PROFILE to add
+    their db hits.
+    """
+
+    def __init__(
+        self,
+        slow_query_seconds=DEFAULT_SLOW_QUERY_SECONDS,
+        profile_rate=DEFAULT_QUERY_PROFILE_RATE,
+    ):
+        self.slow_query_seconds = float(slow_query_seconds)
+        self.profile_rate = float(profile_rate)
+        self.__queries = {}
+        self.__lock = threading.Lock()
+
+    def sample_profile(self, query):
+        # PROFILE can not prefix a query already explained/profiled or run
+        # with query options
+        if self.profile_rate <= 0 or not isinstance(query, str):
+            return False
+        if re.match(r"\s*(PROFILE|EXPLAIN|CYPHER|USING)\b", query, re.IGNORECASE):
+            return False
+        return random.random() < self.profile_rate
+
+    def record(self, name, query, args, seconds, rows=None, summaries=(), error=False):
+        counters = {counter: 0 for counter in SUMMARY_COUNTERS}
+        hits = None
+        for summary in summaries:
+            for counter in SUMMARY_COUNTERS:
+                counters[counter] += getattr(summary.counters, counter, 0)
+            if summary.profile is not None:
+                hits = (hits or 0) + db_hits(summary.profile)
+        bucket = next(
+            (index for index, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound),
+            len(LATENCY_BUCKETS),
+        )
+        with self.__lock:
+            stats = self.__queries.get(name)
+            if stats is None:
+                stats = self.__queries[name] = {
+                    "count": 0,
+                    "errors": 0,
+                    "rows": 0,
+                    "total_seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "slow": 0,
+                    "profiled": 0,
+                    "db_hits": 0,
+                    "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+                    **{counter: 0 for counter in SUMMARY_COUNTERS},
+                }
+            stats["count"] += 1
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["buckets"][bucket] += 1
+            if error:
+                stats["errors"] += 1
+            if rows is not None:
+                stats["rows"] += rows
+            for counter, value in counters.items():
+                stats[counter] += value
+            if hits is not None:
+                stats["profiled"] += 1
+                stats["db_hits"] += hits
+            if seconds >= self.slow_query_seconds:
+                stats["slow"] += 1
+        if seconds >= self.slow_query_seconds:
+            slow_query_logger.warning(
+                json.dumps(
+                    {
+                        "name": name,
+                        "seconds": round(seconds, 6),
+                        "rows": rows,
+                        "error": error,
+                        "db_hits": hits,
+                        "query": (
+                            " ".join(str(query).split())[:SLOW_QUERY_TEXT_LENGTH]
+                            if query is not None
+                            else None
+                        ),
+                        "parameters": redact(args),
+                    }
+                )
+            )
+
+    def stats(self):
+        with self.__lock:
+            return {
+                name: {
+                    **stats,
+                    "buckets": list(stats["buckets"]),
+                    "avg_seconds": round(stats["total_seconds"] / stats["count"], 6),
+                }
+                for name, stats in self.__queries.items()
+            }
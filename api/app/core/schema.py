@@ -1,15 +1,183 @@
+import hashlib
 import json
+import threading
+import time
 
-import pydash
 from app.constants import d7validate
-from deepdiff import DeepDiff
+from app.core.utils import InvalidLabelError
+
+# seconds the active schema is used by label validation before its version
+# is checked again
+DEFAULT_SCHEMA_CHECK_INTERVAL = 5
+
+
+def schema_hash(schemas):
+    """
+    Content hash of schemas, independent of the order of lists and keys
+    (as a DeepDiff with ignore_order).
+    """
+    return hashlib.sha256(
+        json.dumps(__canonical(schemas), sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def __canonical(value):
+    if isinstance(value, dict):
+        return {key: __canonical(item) for key, item in value.items()}
+    if isinstance(value, list):
+        items = [__canonical(item) for item in value]
+        return sorted(items, key=lambda item: json.dumps(item, sort_keys=True))
+    return value
+
+
+class LabelValidator:
+    """
+    Labels of the active schemas compiled to hash lookups of their level and
+    option values, to check labels before they are written.
+    Option values are compared as strings, as label values are strings.
+    """
+
+    def __init__(self, label_schema):
+        self.levels = {label["name"]: label["level"] for label in label_schema}
+        self.options = {
+            label["name"]: frozenset(
+                [str(option["value"]) for option in label["options"]]
+            )
+            for label in label_schema
+        }
+
+    def check(self, label_name, label_level=None, label_value=None):
+        """
+        Check a label; the level and values are not checked if None.
+        :return: error message, or None if the label is valid
+        """
+        if label_name not in self.levels:
+            return f"label_name '{label_name}' is not in the active schema."
+        if label_level is not None and label_level != self.levels[label_name]:
+            return (
+                f"label_level of '{label_name}' is '{self.levels[label_name]}', "
+                f"not '{label_level}'."
+            )
+        invalid = [
+            value
+            for value in label_value or []
+            if value not in self.options[label_name]
+        ]
+        if len(invalid) > 0:
+            return f"{invalid} are not options of '{label_name}'."
+        return None
+
+
+class ActiveSchemaCache:
+    """
+    Per-process cache of the active schemas of a project: the parsed
+    schemas, their label names and options, and their content hash.
+    set_values bumps a schema_version counter on the (:Project) node; the
+    cache is reloaded when the counter differs from the loaded version, so
+    all worker processes see schema updates.
+    """
+
+    def __init__(self, project):
+        self.project = project
+        self.version = -1
+        self.__entry = None
+        self.__checked = 0
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_database_version(self):
+        q = """
+            MATCH (p:Project {name: $project_name})
+            RETURN coalesce(p.schema_version, 0) as version
+        """
+        result = self.project.database.read_db(
+            q, args={"project_name": self.project.project_name}
+        )
+        if len(result) == 0:
+            return 0
+        return result[0]["version"]
+
+    def get(self, max_age=None):
+        """
+        :param max_age: seconds since the last version check within which
+            the loaded schemas are returned without checking the version
+        :return: {"rows": active schema rows as Schema.get_values, newest
+            first, "schema_list": the rows as Schema.get_list,
+            "schemas": parsed newest schemas, "hash": their content
+            hash, "labels": {label_name: {"level":.., "options": set of
+            option values}}, "validator": LabelValidator of the labels}
+        """
+        with self.__lock:
+            if (
+                max_age is not None
+                and self.__entry is not None
+                and time.monotonic() - self.__checked < max_age
+            ):
+                self.hits += 1
+                return self.__entry
+        # the version is read before the schemas, so a concurrent update
+        # is at worst loaded again on the next call
+        version = self.get_database_version()
+        checked = time.monotonic()
+        with self.__lock:
+            if self.__entry is not None and version == self.version:
+                self.__checked = checked
+                self.hits += 1
+                return self.__entry
+            self.misses += 1
+        rows = [
+            dict(row)
+            for row in Schema(self.project).get_values(active=True, cached=False)
+        ]
+        schema_list = [format_schema(row) for row in rows]
+        schemas = schema_list[0]["schemas"] if len(rows) > 0 else {}
+        entry = {
+            "rows": rows,
+            "schema_list": schema_list,
+            "schemas": schemas,
+            "hash": schema_hash(schemas),
+            "labels": {
+                label["name"]: {
+                    "level": label["level"],
+                    "options": {option["value"] for option in label["options"]},
+                }
+                for label in schemas.get("label_schema", [])
+            },
+            "validator": LabelValidator(schemas.get("label_schema", [])),
+        }
+        with self.__lock:
+            self.__entry = entry
+            self.version = version
+            self.__checked = checked
+        return entry
+
+    def invalidate(self):
+        with self.__lock:
+            self.__entry = None
+
+    def stats(self):
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups > 0 else 0,
+            }
 
 
 class Schema:
     def __init__(self, project):
         self.project = project
 
-    def get_values(self, active=True):
+    def get_values(self, active=True, cached=True):
+        """
+        Get schemas, newest first. Active schemas are served from the
+        active schema cache of the project.
+        """
+        if active is True and cached:
+            return [dict(row) for row in self.project.active_schema.get()["rows"]]
         q = []
         if active is not None:
             q.append("MATCH (s:Schema)-[r:SCHEMA_OF {active: $active}]")
@@ -28,6 +196,41 @@ class Schema:
             args={"project_name": self.project.project_name, "active": active},
         )
 
+    def get_list(self, active=True):
+        """
+        Get schemas with parsed schemas, newest first.
+        :return: list of {"uuid":.., "schemas":.., "active":.., "created_on":..}
+        """
+        if active is True:
+            return self.project.active_schema.get()["schema_list"]
+        return [format_schema(row) for row in self.get_values(active=active)]
+
+    def check_labels(self, labels, max_age=DEFAULT_SCHEMA_CHECK_INTERVAL):
+        """
+        Check labels against the active schemas, from the cache; the schema
+        version is checked at most every max_age seconds. Labels are not
+        checked if the project has no active schema.
+        :param labels: list of {"label_name":.., "label_level":..,
+            "label_value":..}, level and value optional
+        :raises InvalidLabelError: on the first invalid label
+        """
+        entry = self.project.active_schema.get(max_age=max_age)
+        if len(entry["rows"]) == 0:
+            return
+        for label in labels:
+            error = entry["validator"].check(
+                label["label_name"], label.get("label_level"), label.get("label_value")
+            )
+            if error is not None:
+                raise InvalidLabelError(error)
+
+    def get_labels(self):
+        """
+        Get the labels of the active schemas.
+        :return: {label_name: {"level":.., "options": set of option values}}
+        """
+        return self.project.active_schema.get()["labels"]
+
     def __set_all_schemas_to_inactive(self):
         q = """
             MATCH (s:Schema)-[r:SCHEMA_OF]-(p:Project {name: $project_name})
@@ -43,13 +246,9 @@ class Schema:
         """
         validation_errors = validate_schemas(schemas)
         if len(validation_errors) == 0:
-            existing_active_schema = self.get_values(active=True)
-            diff = DeepDiff(
-                json.loads(pydash.get(existing_active_schema, "0.obj_str", "{}")),
-                schemas,
-                ignore_order=True,
-            )
-            if diff:
+            active_schema = self.project.active_schema.get()
+            existing_active_schema = active_schema["rows"]
+            if schema_hash(schemas) != active_schema["hash"]:
                 self.__set_all_schemas_to_inactive()
                 args = {
                     "project_name": self.project.project_name,
@@ -61,9 +260,11 @@ class Schema:
                     SET s.uuid=randomUUID(), s.obj_str=$obj_str, s.created_on=DateTime() 
                     WITH s MATCH (p:Project {name: $project_name})
                     WITH s,p MERGE (s)-[rel:SCHEMA_OF {active: True}]-(p)
+                    SET p.schema_version = coalesce(p.schema_version, 0) + 1
                     RETURN s.uuid as uuid, s.obj_str as obj_str
                 """
                 result = self.project.database.write_db(q, args=args)
+                self.project.active_schema.invalidate()
                 if len(result) == 1:
                     return {
                         "uuid": result[0]["uuid"],
@@ -73,11 +274,20 @@ class Schema:
                     return False
             return {
                 "uuid": existing_active_schema[0]["uuid"],
-                "schemas": json.loads(existing_active_schema[0]["obj_str"]),
+                "schemas": active_schema["schemas"],
             }
         return validation_errors
 
 
+def format_schema(row):
+    return {
+        "uuid": row["uuid"],
+        "schemas": json.loads(row["obj_str"]),
+        "active": True if row["active"] else False,
+        "created_on": row["created_on"],
+    }
+
+
 def validate_schemas(schemas):
     errors = []
     label_schema = schemas["label_schema"]
@@ -3,13 +3,22 @@ import json
 from collections import Counter
 
 import numpy as np
-import pandas as pd
 import pydash
 from app.constants import (
     DEFAULT_STATISTIC_LABEL_DISTRIBUTION_AGGREGATION_FUNCTION,
+    STATISTIC_REBUILD_CHUNK_SIZE,
     SUPPORTED_AGGREGATION_FUNCTIONS,
 )
-from sklearn.manifold import TSNE
+from app.core.aggregation import aggregate_labels
+from app.core.agreement import (
+    MISSING_CODE,
+    factorize_labels,
+    fleiss_kappa,
+    krippendorff_alpha,
+    pairwise_cohen_kappa,
+)
+from app.enums.agreement_metric import AgreementMetric
+from app.enums.projection_method import ProjectionMethod
 
 
 def majority_vote(lst):
@@ -50,10 +59,209 @@ def cohen_kappa(ann1, ann2):
     return round((A - E) / (1 - E), 4)
 
 
+# scopes of (:LabelStatistic) counters
+PROGRESS_STATISTIC = "progress"
+DISTRIBUTION_STATISTIC = "distribution"
+CONTRIBUTION_STATISTIC = "contribution"
+# set once the counters have been built from the existing labels
+BUILT_STATISTIC = "built"
+
+
+def statistic_uid(scope, key, label_name=None):
+    return json.dumps([scope, label_name, key])
+
+
+def record_label_statistics(labels):
+    """
+    What one record contributes to the label statistics.
+    :param labels: annotation labels of the record, objects in format
+        {'annotator':.., 'label_name':.., 'label_value':..}
+    """
+    label_lists = {}
+    for label in labels:
+        label_lists.setdefault(label["label_name"], []).append(label["label_value"])
+    return {
+        "annotated": int(len(labels) > 0),
+        "aggregates": {
+            label_name: majority_vote(label_list)
+            for label_name, label_list in label_lists.items()
+        },
+        "contributions": dict(Counter([label["annotator"] for label in labels])),
+    }
+
+
+def __statistic_deltas(old, new):
+    deltas = Counter()
+    deltas[(PROGRESS_STATISTIC, None, "annotated")] += (
+        new["annotated"] - old["annotated"]
+    )
+    for stats, sign in [(old, -1), (new, 1)]:
+        for label_name, value in stats["aggregates"].items():
+            deltas[(DISTRIBUTION_STATISTIC, label_name, value)] += sign
+        for annotator, count in stats["contributions"].items():
+            deltas[(CONTRIBUTION_STATISTIC, None, annotator)] += sign * count
+    return deltas
+
+
+def refresh_label_statistics(tx, record_uuids):
+    """
+    Bring the materialized label statistics of records up to date, in the
+    transaction that changed their labels.
+    Each record keeps a snapshot of what it contributes to the
+    (:LabelStatistic) counters, which get the difference between the
+    snapshot and the current labels. Records are locked first, so concurrent
+    refreshes of a record are applied one after the other.
+    """
+    record_uuids = sorted(set(record_uuids))
+    if len(record_uuids) == 0:
+        return
+    q_lock = """
+        UNWIND $record_uuids as record_uuid
+        MATCH (r:Record {uuid: record_uuid})
+        CALL apoc.lock.nodes([r])
+        RETURN count(r)
+    """
+    tx.run(q_lock, {"record_uuids": record_uuids}).consume()
+    q_labels = """
+        UNWIND $record_uuids as record_uuid
+        MATCH (r:Record {uuid: record_uuid})
+        OPTIONAL MATCH (r)<-[:ANNOTATES]-(an:Annotation)<-[:LABEL_OF]-(l:Label)
+        RETURN r.uuid as record_uuid, r.label_statistics as snapshot,
+            collect(CASE WHEN l IS NULL THEN null ELSE {
+                annotator: an.annotator,
+                label_name: l.label_name,
+                label_value: l.label_value} END) as labels
+    """
+    empty = record_label_statistics([])
+    snapshots = []
+    deltas = Counter()
+    for record in tx.run(q_labels, {"record_uuids": record_uuids}):
+        old = json.loads(record["snapshot"]) if record["snapshot"] else empty
+        new = record_label_statistics(record["labels"])
+        if old == new:
+            continue
+        snapshots.append(
+            {"record_uuid": record["record_uuid"], "snapshot": json.dumps(new)}
+        )
+        deltas.update(__statistic_deltas(old, new))
+    if len(snapshots) == 0:
+        return
+    q_snapshots = """
+        UNWIND $rows as row
+        MATCH (r:Record {uuid: row.record_uuid})
+        SET r.label_statistics = row.snapshot
+    """
+    tx.run(q_snapshots, {"rows": snapshots}).consume()
+    rows = sorted(
+        [
+            {
+                "uid": statistic_uid(scope, key, label_name),
+                "scope": scope,
+                "label_name": label_name,
+                "key": key,
+                "delta": delta,
+            }
+            for (scope, label_name, key), delta in deltas.items()
+            if delta != 0
+        ],
+        key=lambda row: row["uid"],
+    )
+    # the uniqueness constraint on uid makes concurrent MERGEs safe
+    q_counters = """
+        UNWIND $rows as row
+        MERGE (c:LabelStatistic {uid: row.uid})
+        ON CREATE
+            SET c.scope = row.scope,
+                c.label_name = row.label_name,
+                c.key = row.key,
+                c.value = 0
+        SET c.value = c.value + row.delta
+    """
+    tx.run(q_counters, {"rows": rows}).consume()
+
+
 class Statistic:
     def __init__(self, project) -> None:
         self.project = project
 
+    def is_materialized(self):
+        """
+        Whether the label statistics counters have been built, see
+        rebuild_label_statistics.
+        """
+        q = """
+            MATCH (c:LabelStatistic {uid: $uid})
+            RETURN c.value as value
+        """
+        result = self.project.database.read_db(
+            q, args={"uid": statistic_uid(BUILT_STATISTIC, BUILT_STATISTIC)}
+        )
+        return len(result) > 0
+
+    def rebuild_label_statistics(self, chunk_size=STATISTIC_REBUILD_CHUNK_SIZE):
+        """
+        Rebuild the label statistics counters and record snapshots from the
+        existing labels. Run while no annotations are written, e.g. at
+        startup or with `flask --app main rebuild-statistics`.
+        :return: number of annotated records
+        """
+        q_reset = """
+            MATCH (c:LabelStatistic)
+            DETACH DELETE c
+        """
+        q_reset_snapshots = """
+            MATCH (r:Record)
+            WHERE r.label_statistics IS NOT NULL
+            REMOVE r.label_statistics
+        """
+
+        def reset_function(tx, query, args):
+            tx.run(q_reset).consume()
+            tx.run(q_reset_snapshots).consume()
+
+        self.project.database.write_db_transction(
+            query_func=reset_function, query=None, args={}
+        )
+        q = """
+            MATCH (r:Record)<-[:ANNOTATES]-(:Annotation)<-[:LABEL_OF]-(:Label)
+            RETURN DISTINCT r.uuid as uuid
+        """
+        record_uuids = [item["uuid"] for item in self.project.database.read_db(q)]
+
+        def refresh_function(tx, query, args):
+            refresh_label_statistics(tx, args["record_uuids"])
+
+        for start in range(0, len(record_uuids), chunk_size):
+            self.project.database.write_db_transction(
+                query_func=refresh_function,
+                query=None,
+                args={"record_uuids": record_uuids[start : start + chunk_size]},
+            )
+        q_built = """
+            MERGE (c:LabelStatistic {uid: $uid})
+            SET c.scope = $scope, c.key = $scope, c.value = 1
+        """
+        self.project.database.write_db(
+            q_built,
+            args={
+                "uid": statistic_uid(BUILT_STATISTIC, BUILT_STATISTIC),
+                "scope": BUILT_STATISTIC,
+            },
+        )
+        return len(record_uuids)
+
+    def __get_counters(self, scope, label_name=None):
+        q = """
+            MATCH (c:LabelStatistic {scope: $scope})
+            WHERE c.label_name = $label_name
+                OR ($label_name IS NULL AND c.label_name IS NULL)
+            RETURN c.key as key, c.value as value
+        """
+        result = self.project.database.read_db(
+            q, args={"scope": scope, "label_name": label_name}
+        )
+        return {item["key"]: item["value"] for item in result if item["value"] > 0}
+
     def get_record_count(self):
         q = """
             MATCH (corpus:Record) 
@@ -71,6 +279,15 @@ class Statistic:
                         from any annotator for any label_name
             total: total number of data records
         """
+        if self.is_materialized():
+            # count(n) of a label is served by the count store
+            q = """
+                MATCH (n:Record)
+                RETURN count(n) AS total
+            """
+            total = self.project.database.read_db(query=q)[0]["total"]
+            counters = self.__get_counters(PROGRESS_STATISTIC)
+            return {"total": total, "annotated": counters.get("annotated", 0)}
         q = """
             MATCH (corpus:Record) 
             OPTIONAL MATCH (l:Label)-[]-(an:Annotation)-[rel:ANNOTATES]->(r:Record)
@@ -86,31 +303,57 @@ class Statistic:
         annotator_list: list = [],
         aggregation: str = DEFAULT_STATISTIC_LABEL_DISTRIBUTION_AGGREGATION_FUNCTION,
         include_unlabeled: bool = False,
+        annotator_weights: dict = None,
     ):
+        """
+        Get the number of records per aggregated label.
+        Configurable parameters:
+            - label_name
+            - aggregation: one of SUPPORTED_AGGREGATION_FUNCTIONS
+            - annotator_weights: {annotator: weight} of weighted_majority_vote
+        """
         if include_unlabeled is True:
             raise NotImplementedError("'include_unlabeled' is not supported.")
         if len(annotator_list) > 0:
             raise NotImplementedError("'annotator_list' is not supported.")
-        q = """
-            MATCH (l:Label)-[]-(an:Annotation)-[]-(r:Record) 
-            WHERE l.label_name = $label_name 
-            RETURN r.uuid as uuid, collect(l.label_value) as label_list
-            """
-        result = self.project.database.read_db(query=q, args={"label_name": label_name})
-        # Aggregate over annotators
-
         if aggregation not in SUPPORTED_AGGREGATION_FUNCTIONS:
             raise NotImplementedError(
                 f"Supported functions are: {', '.join(SUPPORTED_AGGREGATION_FUNCTIONS)}."
             )
-        agg_labels = [majority_vote(item["label_list"]) for item in result]
-        return dict(Counter(agg_labels))
+        if (
+            aggregation == DEFAULT_STATISTIC_LABEL_DISTRIBUTION_AGGREGATION_FUNCTION
+            and self.is_materialized()
+        ):
+            return self.__get_counters(DISTRIBUTION_STATISTIC, label_name=label_name)
+        q = """
+            MATCH (r:Record)<-[:ANNOTATES]-(an:Annotation)<-[:LABEL_OF]-(l:Label)
+            WHERE l.label_name = $label_name
+            RETURN r.uuid as uuid, an.annotator as annotator,
+                l.label_value as label_value, false as verified
+            """
+        if aggregation == "verified_label":
+            q += """
+            UNION ALL
+            MATCH (r:Record)<-[:ANNOTATES]-(an:Annotation)<-[:VERIFIES]
+                -(:Verification {label_name: $label_name})
+                -[:CONFIRMS|CORRECTS]-(l:Label)
+            RETURN r.uuid as uuid, an.annotator as annotator,
+                l.label_value as label_value, true as verified
+            """
+        result = self.project.database.read_db(query=q, args={"label_name": label_name})
+        # Aggregate over annotators
+        agg_labels = aggregate_labels(
+            result, aggregation=aggregation, annotator_weights=annotator_weights
+        )
+        return dict(Counter(agg_labels.values()))
 
     def get_annotator_contributions(
         self, label_name: str = "", annotator_list: list = []
     ):
         if len(annotator_list) > 0:
             raise NotImplementedError("'annotator_list' is not supported.")
+        if self.is_materialized():
+            return self.__get_counters(CONTRIBUTION_STATISTIC)
         q = """
             Match (l:Label)-[]-(an:Annotation)
             RETURN an.annotator as annotator, count(l) as contribution
@@ -118,9 +361,26 @@ class Statistic:
         result = self.project.database.read_db(query=q)
         return dict(result)
 
-    def get_annotator_agreements(self, label_name: str = "", annotator_list: list = []):
+    def get_annotator_agreements(
+        self,
+        label_name: str = "",
+        annotator_list: list = [],
+        metric: str = AgreementMetric.COHEN_KAPPA.value,
+    ):
+        """
+        Get the agreement of annotators on a label.
+        Configurable parameters:
+            - label_name
+            - metric: cohen_kappa for every pair of annotators (a record
+              not labeled by an annotator counts as a NULL label),
+              fleiss_kappa or krippendorff_alpha over all annotators
+        :returns {'annotator1,annotator2': kappa, ...} for cohen_kappa,
+            {metric: value} otherwise
+        """
         if len(annotator_list) > 0:
             raise NotImplementedError("'annotator_list' is not supported.")
+        if not AgreementMetric.has(metric):
+            raise ValueError(f"Agreement metric '{metric}' is not supported.")
         q = """
             MATCH (l:Label)-[]-(an:Annotation)-[]-(r:Record) 
             WHERE l.label_name = $label_name 
@@ -131,28 +391,53 @@ class Statistic:
         if len(result) == 0:
             return {}
 
-        df = pd.DataFrame(result, columns=["uuid", "label_list", "annotator"])
         # convert label to a single string.
-        df["label_list"] = df.apply(lambda x: ",".join(x["label_list"]), axis=1)
-        df = df.pivot(index="uuid", columns="annotator", values="label_list")
-        # filling in empty cells
-        df = df.fillna("NULL")
-        annotator_list = df.columns.to_list()
-        return {
-            f"{an1},{an2}": cohen_kappa(df[an1].to_list(), df[an2].to_list())
-            for an1, an2 in itertools.product(annotator_list, annotator_list)
-        }
+        codes, annotator_list, categories = factorize_labels(
+            [
+                {
+                    "uuid": item["uuid"],
+                    "annotator": item["annotator"],
+                    "label": ",".join(item["label_list"]),
+                }
+                for item in result
+            ]
+        )
+        if metric == AgreementMetric.FLEISS_KAPPA.value:
+            value = fleiss_kappa(codes, len(categories))
+        elif metric == AgreementMetric.KRIPPENDORFF_ALPHA.value:
+            value = krippendorff_alpha(codes, len(categories))
+        else:
+            # empty cells are a category of their own
+            codes[codes == MISSING_CODE] = len(categories)
+            kappa = pairwise_cohen_kappa(codes, len(categories) + 1).round(4)
+            return {
+                f"{an1},{an2}": float(kappa[i, j])
+                for (i, an1), (j, an2) in itertools.product(
+                    enumerate(annotator_list), enumerate(annotator_list)
+                )
+            }
+        return {metric: None if value is None else round(value, 4)}
 
     def get_embedding_aggregated_label(
-        self, label_name: str = "", embedding_type: str = None
+        self,
+        label_name: str = "",
+        embedding_type: str = None,
+        method: str = ProjectionMethod.TSNE.value,
     ):
         """
         Get aggregated label along with embedding projected to 2d space.
         Aggregate using majority vote.
+        The projection is cached and refreshed in the background when the
+        labeled records or their embeddings change; labels are aggregated on
+        every call.
         Configurable parameters:
             - label_name
             - embedding_type
-        :returns list of object in format {'x_axis':.. , 'y_axis':.., 'agg_label':..}
+            - method: TSNE, PCA, SVD (randomized truncated SVD) or SAMPLE
+              (PCA fitted on a sample, placing later records without refitting)
+        :returns (status, list of object in format {'x_axis':.. , 'y_axis':.., 'agg_label':..}),
+            status COMPUTING while a refresh is being fitted, with the records
+            of the previous projection if any
         """
         if embedding_type is None or len(embedding_type) == 0:
             raise ValueError("'type' can not be None or empty.")
@@ -168,14 +453,31 @@ class Statistic:
         )
         if pydash.is_empty(result):
             raise ValueError(f'No "{embedding_name}" as metadata.')
-        df = pd.DataFrame(result, columns=["uuid", "embedding", "label_list"])
+        try:
+            embeddings = np.array([item["embedding"] for item in result], dtype=float)
+        except ValueError:
+            raise ValueError(f'"{embedding_name}" embeddings are not of equal size.')
+        status, coordinates = self.project.projections.get(
+            embedding_type=embedding_name,
+            label_name=label_name,
+            uuids=[item["uuid"] for item in result],
+            embeddings=embeddings,
+            method=method,
+        )
         # Use majority vote to aggregate labels
-        df["agg_label"] = df.apply(lambda x: majority_vote(x["label_list"]), axis=1)
-        # calculate 2d projection
-        tsne = TSNE(n_components=2, random_state=0, perplexity=30, n_iter=1000)
-        projection_2d = tsne.fit_transform(np.array(df["embedding"].to_list()))
-        df_2d = pd.DataFrame(projection_2d, columns=["x_axis", "y_axis"])
-        if len(df) != len(df_2d):
-            raise Exception("Projection and original embedding counts don't match.")
-        final_df = pd.concat([df, df_2d], axis=1)[["x_axis", "y_axis", "agg_label"]]
-        return json.loads(final_df.to_json(orient="records"))
+        agg_labels = aggregate_labels(
+            [
+                {"uuid": item["uuid"], "label_value": label_value}
+                for item in result
+                for label_value in item["label_list"]
+            ]
+        )
+        return status, [
+            {
+                "x_axis": coordinates[item["uuid"]][0],
+                "y_axis": coordinates[item["uuid"]][1],
+                "agg_label": agg_labels[item["uuid"]],
+            }
+            for item in result
+            if item["uuid"] in coordinates
+        ]
@@ -39,25 +39,14 @@ class Subset:
             "record_meta_names": record_meta_names,
             "data_u_list": self.data_uuids,
         }
-        return_clauses = ["n.uuid as uuid"]
         q = [
             """
                 MATCH (n: Record)
                 WHERE n.uuid in $data_u_list
-                OPTIONAL MATCH (r_meta:Metadata)-[:RECORD_META_OF]-(n) 
-            """
+            """,
+            self.__record_view_query(record_meta_names),
         ]
-        if record_id:
-            return_clauses.append("n.record_id as record_id")
-        if record_content:
-            return_clauses.append("n.content as record_content")
-        if record_meta_names is not None:
-            args.update({"record_meta_names": record_meta_names})
-            q.append("WHERE r_meta.name in $record_meta_names")
-
-        return_clauses.append("record_metadata as record_metadata")
-
-        q.append("WITH COLLECT(r_meta{.name, .value}) as record_metadata, n")
+        return_clauses = self.__record_view_return_clauses(record_id, record_content)
         q.append(f"RETURN {','.join(return_clauses)}")
         q.append("ORDER by n.record_id")
 
@@ -65,6 +54,24 @@ class Subset:
         result = [dict(item) for item in result]
         return result
 
+    @staticmethod
+    def __record_view_query(record_meta_names):
+        q = ["OPTIONAL MATCH (r_meta:Metadata)-[:RECORD_META_OF]-(n)"]
+        if record_meta_names is not None:
+            q.append("WHERE r_meta.name in $record_meta_names")
+        q.append("WITH COLLECT(r_meta{.name, .value}) as record_metadata, n")
+        return "\n".join(q)
+
+    @staticmethod
+    def __record_view_return_clauses(record_id, record_content):
+        return_clauses = ["n.uuid as uuid"]
+        if record_id:
+            return_clauses.append("n.record_id as record_id")
+        if record_content:
+            return_clauses.append("n.content as record_content")
+        return_clauses.append("record_metadata as record_metadata")
+        return return_clauses
+
     def get_view_annotation(
         self,
         annotator_list: Optional[list] = None,
@@ -102,12 +109,27 @@ class Subset:
             """
                 MATCH (n: Record)
                 WHERE n.uuid in $data_u_list
-                OPTIONAL MATCH (n)--(an:Annotation)
+            """,
+            self.__annotation_view_query(annotator_list, label_names, label_meta_names),
             """
+            RETURN n.uuid as uuid, annotation_list as annotation_list
+            ORDER by n.record_id
+            """,
         ]
+        result = self.project.database.read_db("\n".join(q), args=args)
+        return [dict(item) for item in result]
 
+    @staticmethod
+    def __annotation_view_query(
+        annotator_list, label_names, label_meta_names, carried="n"
+    ):
+        """
+        Clauses collecting the annotation_list of each record n.
+        'carried' lists the variables kept through the aggregations.
+        """
+        q = ["OPTIONAL MATCH (n)--(an:Annotation)"]
         if annotator_list is not None:
-            q.append(f"WHERE an.annotator in $annotator_list")
+            q.append("WHERE an.annotator in $annotator_list")
 
         label_filter1 = (
             "" if label_names is None else "WHERE l1.label_name in $label_names"
@@ -133,20 +155,66 @@ class Subset:
             {label_filter1}
             OPTIONAL MATCH (l_meta1:Metadata)-[:LABEL_META_OF]-(l1) 
             {label_meta_filter1}
-            WITH COLLECT(l_meta1{{.name, .value}}) as label_metadata_list1, n, an, l1
-            WITH COLLECT(l1{{.label_name, .label_value, .label_level, label_metadata_list:label_metadata_list1}}) as an_l1, n, an
+            WITH COLLECT(l_meta1{{.name, .value}}) as label_metadata_list1, {carried}, an, l1
+            WITH COLLECT(l1{{.label_name, .label_value, .label_level, label_metadata_list:label_metadata_list1}}) as an_l1, {carried}, an
             // l2 for span_level labels
             OPTIONAL MATCH (l2:Label {{label_level:'span'}})-[:LABEL_OF]-(an)
             {label_filter2}
             OPTIONAL MATCH (l_meta2:Metadata)-[:LABEL_META_OF]-(l2) 
             {label_meta_filter2}
-            WITH COLLECT(l_meta2{{.name, .value}}) as label_metadata_list2 ,l2 ,n, an_l1, an
-            WITH COLLECT(l2{{.label_name, .label_value, .label_level, .label_level, .start_idx, .end_idx, label_metadata_list:label_metadata_list2}}) as an_l2, n, an_l1, an
-            WITH COLLECT(an{{.annotator,labels_record:an_l1, labels_span:an_l2}}) as annotation_list, n
-            RETURN n.uuid as uuid, annotation_list as annotation_list
-            ORDER by n.record_id
+            WITH COLLECT(l_meta2{{.name, .value}}) as label_metadata_list2 ,l2 ,{carried}, an_l1, an
+            WITH COLLECT(l2{{.label_name, .label_value, .label_level, .label_level, .start_idx, .end_idx, label_metadata_list:label_metadata_list2}}) as an_l2, {carried}, an_l1, an
+            WITH COLLECT(an{{.annotator,labels_record:an_l1, labels_span:an_l2}}) as annotation_list, {carried}
         """
         )
+        return "\n".join(q)
+
+    def get_view_record_annotation(
+        self,
+        record_id: bool = False,
+        record_content: bool = True,
+        record_meta_names: Optional[list] = None,
+        annotator_list: Optional[list] = None,
+        label_names: Optional[list] = None,
+        label_meta_names: Optional[list] = None,
+    ):
+        """
+        Get the record view and the annotation view of the subset
+        in a single query. Same as merging get_view_record and
+        get_view_annotation with the same parameters.
+        Parameters
+        ----------
+        See get_view_record and get_view_annotation.
+        Return
+        ----------
+        Dictionary with the fields of both views:
+        'uuid', 'record_metadata', 'annotation_list'
+        and optional 'record_id', 'record_content' fields.
+        """
+        args = {
+            "record_meta_names": record_meta_names,
+            "annotator_list": annotator_list,
+            "label_names": label_names,
+            "label_meta_names": label_meta_names,
+            "data_u_list": self.data_uuids,
+        }
+        return_clauses = self.__record_view_return_clauses(record_id, record_content)
+        return_clauses.append("annotation_list as annotation_list")
+        q = [
+            """
+                MATCH (n: Record)
+                WHERE n.uuid in $data_u_list
+            """,
+            self.__record_view_query(record_meta_names),
+            self.__annotation_view_query(
+                annotator_list,
+                label_names,
+                label_meta_names,
+                carried="n, record_metadata",
+            ),
+            f"RETURN {','.join(return_clauses)}",
+            "ORDER by n.record_id",
+        ]
         result = self.project.database.read_db("\n".join(q), args=args)
         return [dict(item) for item in result]
 
@@ -244,30 +312,13 @@ class Subset:
     def suggest_similar(self, record_meta_name, limit=DEFAULT_QUERY_LIMIT):
         """
         Suggest similar data records. The most similar data points are defined as
-        ones with the shortest distance according to the record_meta_name.
+        ones with the highest cosine similarity of the record_meta_name vectors,
+        served from the project embedding index.
         Parameters
         ----------
         record_meta_name: name of the metadata used as distance measurement.
         limit: number of most similar record returned for each record in the subset.
         """
-        q = """
-            match (n:Record)-[:RECORD_META_OF {name:$record_meta_name}]-(m:Metadata) 
-            where n.uuid in $uuid_list
-            call {
-            with n, m
-            match (m2:Metadata) -[:RECORD_META_OF {name:$record_meta_name}]-(n2:Record)
-            where n2.uuid <>n.uuid
-            return  n2.uuid as uuid, n2.content as content
-            order by gds.alpha.similarity.cosine(m2.value,m.value) DESC limit $limit 
-            }
-            return uuid
-        """
-        result = self.project.database.read_db(
-            q,
-            args={
-                "uuid_list": self.data_uuids,
-                "record_meta_name": record_meta_name,
-                "limit": limit,
-            },
+        return self.project.embedding_indexes.get(record_meta_name).search(
+            self.data_uuids, limit
         )
-        return [item[0] for item in result]
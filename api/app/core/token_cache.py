@@ -0,0 +1,172 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TOKEN_CACHE_SIZE = 10000
+DEFAULT_TOKEN_CACHE_TTL = 60
+DEFAULT_TOKEN_REVOCATION_INTERVAL = 5
+
+
+def hash_identifier(identifier):
+    return hashlib.sha256(str.encode(str(identifier))).hexdigest()
+
+
+class TokenCache:
+    """
+    Bounded, TTL-based cache of verified tokens, so requests do not have to
+    call the auth service for every token verification.
+    Entries are keyed by a hash of the token (the token itself is never stored)
+    and expire at min(ttl, token expires_on). Revoked tokens are dropped when
+    the revocation feed of the auth service is synced.
+    """
+
+    def __init__(
+        self,
+        max_size=DEFAULT_TOKEN_CACHE_SIZE,
+        ttl=DEFAULT_TOKEN_CACHE_TTL,
+        revocation_interval=DEFAULT_TOKEN_REVOCATION_INTERVAL,
+        revocation_fetcher=None,
+    ):
+        """
+        Parameters
+        ----------
+        max_size : int
+            max number of cached tokens; least recently used ones are evicted
+        ttl : int
+            seconds a verification is trusted; if 0, caching is disabled
+        revocation_interval : int
+            min seconds between two syncs of the revocation feed
+        revocation_fetcher : callable
+            revocation_fetcher(after, disabled_digest) returns the auth service
+            revocation feed: {"last_id":.., "disabled_digest":..,
+            "sessions": [session hashes], "users": [user_id hashes]}
+        """
+        self.max_size = int(max_size)
+        self.ttl = int(ttl)
+        self.revocation_interval = int(revocation_interval)
+        self.revocation_fetcher = revocation_fetcher
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__last_revocation_id = 0
+        self.__last_revocation_sync = 0
+        self.__disabled_digest = ""
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_size > 0
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(str.encode(token)).hexdigest()
+
+    def get(self, token):
+        """
+        Get the cached user of a verified token, or None.
+        """
+        if not self.enabled:
+            return None
+        self.sync_revocations()
+        key = self.key(token)
+        now = time.time()
+        with self.__lock:
+            entry = self.__entries.get(key, None)
+            if entry is not None and entry["expires_at"] <= now:
+                del self.__entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry["user"])
+
+    def set(self, token, user):
+        """
+        Cache the user returned by the auth service for a verified token.
+        'expires_on' (epoch seconds) and 'session_hash' are used for expiry and
+        revocation and are not part of the cached user.
+        """
+        user = dict(user)
+        expires_on = user.pop("expires_on", None)
+        session_hash = user.pop("session_hash", None)
+        if not self.enabled:
+            return user
+        expires_at = time.time() + self.ttl
+        if expires_on is not None:
+            expires_at = min(expires_at, float(expires_on))
+        with self.__lock:
+            self.__entries[self.key(token)] = {
+                "user": user,
+                "expires_at": expires_at,
+                "session_hash": session_hash,
+                "user_hash": hash_identifier(user.get("user_id", "")),
+            }
+            self.__entries.move_to_end(self.key(token))
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+        return user
+
+    def invalidate(self, session_hashes=[], user_hashes=[]):
+        session_hashes = set(session_hashes)
+        user_hashes = set(user_hashes)
+        with self.__lock:
+            for key in [
+                key
+                for key, entry in self.__entries.items()
+                if entry["session_hash"] in session_hashes
+                or entry["user_hash"] in user_hashes
+            ]:
+                del self.__entries[key]
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def sync_revocations(self):
+        """
+        Pull new revocations from the auth service at most once per
+        revocation_interval. If the feed can not be read, the cache is
+        cleared, so a revoked token is never served from cache.
+        """
+        if self.revocation_fetcher is None:
+            return
+        now = time.time()
+        with self.__lock:
+            if now - self.__last_revocation_sync < self.revocation_interval:
+                return
+            self.__last_revocation_sync = now
+            after = self.__last_revocation_id
+            disabled_digest = self.__disabled_digest
+        try:
+            # disabled users are only sent again when they changed
+            feed = self.revocation_fetcher(after, disabled_digest)
+        except Exception:
+            self.clear()
+            return
+        self.invalidate(
+            session_hashes=feed.get("sessions", []), user_hashes=feed.get("users", [])
+        )
+        with self.__lock:
+            self.__last_revocation_id = max(
+                self.__last_revocation_id, int(feed.get("last_id", after))
+            )
+            self.__disabled_digest = feed.get("disabled_digest", "")
+
+    def stats(self):
+        with self.__lock:
+            size = len(self.__entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups > 0 else 0,
+        }
@@ -1,5 +1,45 @@
+import base64
+import json
+
+
 class ValueNotExistsError(Exception):
     def __init__(self, val):
         super().__init__(
             f"ValueNotExistsError: Value {val} does not exist in the database/"
         )
+
+
+class InvalidLabelError(ValueError):
+    def __init__(self, message):
+        super().__init__(f"InvalidLabelError: {message}")
+
+
+class IndexNotOnlineError(Exception):
+    def __init__(self, index):
+        super().__init__(f"IndexNotOnlineError: Index {index} is not online.")
+
+
+class InvalidCursorError(ValueError):
+    def __init__(self, cursor):
+        super().__init__(f"InvalidCursorError: Cursor {cursor} is not valid.")
+
+
+def encode_cursor(*key):
+    """
+    Encode the ordering key of the last returned row into an opaque
+    continuation cursor.
+    """
+    return base64.urlsafe_b64encode(str.encode(json.dumps(list(key)))).decode()
+
+
+def decode_cursor(cursor, size):
+    """
+    Decode a continuation cursor into its ordering key of 'size' values.
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(str.encode(cursor)))
+    except (ValueError, TypeError):
+        raise InvalidCursorError(cursor)
+    if not isinstance(key, list) or len(key) != size:
+        raise InvalidCursorError(cursor)
+    return key
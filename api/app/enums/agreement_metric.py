@@ -0,0 +1,13 @@
+from enum import Enum
+
+
+class AgreementMetric(Enum):
+    # pairwise, for every pair of annotators
+    COHEN_KAPPA = "cohen_kappa"
+    # aggregate over all annotators
+    FLEISS_KAPPA = "fleiss_kappa"
+    KRIPPENDORFF_ALPHA = "krippendorff_alpha"
+
+    @classmethod
+    def has(cls, value):
+        return value in cls._value2member_map_
@@ -0,0 +1,11 @@
+from enum import Enum
+
+
+class ExportFormat(Enum):
+    JSON = "JSON"
+    NDJSON = "NDJSON"
+    CSV = "CSV"
+
+    @classmethod
+    def has(cls, value):
+        return value in cls._value2member_map_
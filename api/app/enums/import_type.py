@@ -2,8 +2,14 @@ from enum import Enum
 
 
 class ImportType(Enum):
+    # loaded by neo4j from a url
     CSV = "CSV"
+    # json representation of a dataframe in the request body
     DF = "DF"
+    # uploaded files, read in record batches (POST /data/upload)
+    PARQUET = "PARQUET"
+    ARROW = "ARROW"
+    NDJSON = "NDJSON"
 
     @classmethod
     def has(cls, value):
@@ -0,0 +1,15 @@
+from enum import Enum
+
+
+class ProjectionMethod(Enum):
+    TSNE = "TSNE"
+    PCA = "PCA"
+    # randomized truncated SVD, without centering
+    SVD = "SVD"
+    # PCA fitted on a sample of the records, which transforms all records;
+    # records embedded later are placed without fitting again
+    SAMPLE = "SAMPLE"
+
+    @classmethod
+    def has(cls, value):
+        return value in cls._value2member_map_
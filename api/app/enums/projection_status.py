@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class ProjectionStatus(Enum):
+    # the projection matches the current records and embeddings
+    READY = "READY"
+    # a projection of the current records is being fitted
+    COMPUTING = "COMPUTING"
@@ -2,9 +2,22 @@ from enum import Enum
 
 
 class SearchMode(Enum):
+    # substring match on record content (full scan)
+    CONTAINS = "CONTAINS"
+    # fulltext index: all terms must match
     KEYWORD = "KEYWORD"
+    # fulltext index: terms must match in order
+    PHRASE = "PHRASE"
+    # fulltext index: all terms must match, the last one as a prefix
+    PREFIX = "PREFIX"
+    # regular expression over record content, prefiltered with the fulltext
+    # index when the pattern contains literal words
     REGEX = "REGEX"
 
+    @classmethod
+    def has(cls, value):
+        return value in cls._value2member_map_
+
 
 class VerificationSearchMode(Enum):
     ALL = "ALL"
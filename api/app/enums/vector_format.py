@@ -0,0 +1,13 @@
+from enum import Enum
+
+
+class VectorFormat(Enum):
+    # 2-d float array, rows in the order of a separate uuid list
+    NPY = "NPY"
+    # uuid column and vector column (list of floats)
+    ARROW = "ARROW"
+    PARQUET = "PARQUET"
+
+    @classmethod
+    def has(cls, value):
+        return value in cls._value2member_map_
@@ -1,20 +1,58 @@
 import json
 import logging
 
-import requests
 from dotenv import find_dotenv, load_dotenv
 
 load_dotenv(find_dotenv())
 import datetime
 import logging.handlers as handlers
 import os
+import threading
 
 import boto3
 import pydash
-from app.constants import DATABASE_503_RESPONSE, InvalidRequestJson, bcolors
+from app.constants import (
+    DATABASE_503_RESPONSE,
+    IMPORT_CHUNK_SIZE,
+    InvalidRequestJson,
+    bcolors,
+)
 from app.core.agent_manager import AgentManager
-from app.core.database import Database
+from app.core.database import (
+    DEFAULT_NEO4J_ACQUISITION_TIMEOUT,
+    DEFAULT_NEO4J_MAX_CONNECTION_LIFETIME,
+    DEFAULT_NEO4J_POOL_SIZE,
+    Database,
+)
+from app.core.http_client import (
+    DEFAULT_HTTP_CONNECT_TIMEOUT,
+    DEFAULT_HTTP_POOL_SIZE,
+    DEFAULT_HTTP_READ_TIMEOUT,
+    DEFAULT_HTTP_RETRIES,
+    HttpClient,
+    StreamingBody,
+    stream_response_content,
+)
+from app.core.import_manager import (
+    DEFAULT_IMPORT_LEASE_SECONDS,
+    DEFAULT_IMPORT_RESUME_INTERVAL,
+    DEFAULT_IMPORT_WORKERS,
+    ImportManager,
+)
+from app.core.metrics import METRICS_PATH, Metrics, observe_upstream
+from app.core.migration import DEFAULT_INDEX_WAIT_TIMEOUT, Migration
 from app.core.project import Project
+from app.core.query_stats import (
+    DEFAULT_QUERY_PROFILE_RATE,
+    DEFAULT_SLOW_QUERY_SECONDS,
+    slow_query_logger,
+)
+from app.core.token_cache import (
+    DEFAULT_TOKEN_CACHE_SIZE,
+    DEFAULT_TOKEN_CACHE_TTL,
+    DEFAULT_TOKEN_REVOCATION_INTERVAL,
+    TokenCache,
+)
 from app.prefixMiddleware import PrefixMiddleware
 from flask import Flask, Response, abort, jsonify, make_response, request
 from flask_cors import CORS
@@ -50,15 +88,69 @@ if MEGANNO_LOGGING:
     errorLogHandler.setFormatter(formatter)
     traffic_logger.addHandler(trafficLogHandler)
     error_logger.addHandler(errorLogHandler)
+    SLOW_QUERY_LOG_FILE = "./logs/slow_query.log"
+    slowQueryLogHandler = handlers.TimedRotatingFileHandler(
+        SLOW_QUERY_LOG_FILE, when="midnight", interval=1, backupCount=7, utc=True
+    )
+    slowQueryLogHandler.setFormatter(formatter)
+    slow_query_logger.addHandler(slowQueryLogHandler)
 MEGANNO_NEO4J_HOST = os.getenv("MEGANNO_NEO4J_HOST", None)
 MEGANNO_NEO4J_PORT = os.getenv("MEGANNO_NEO4J_PORT", 7687)
 MEGANNO_AUTH_HOST = os.getenv("MEGANNO_AUTH_HOST", None)
 MEGANNO_AUTH_PORT = os.getenv("MEGANNO_AUTH_PORT", None)
+MEGANNO_INDEX_MIGRATION = os.getenv("MEGANNO_INDEX_MIGRATION", "True").lower() == "true"
+MEGANNO_LABEL_VALIDATION = (
+    os.getenv("MEGANNO_LABEL_VALIDATION", "False").lower() == "true"
+)
+MEGANNO_INDEX_WAIT_TIMEOUT = os.getenv(
+    "MEGANNO_INDEX_WAIT_TIMEOUT", DEFAULT_INDEX_WAIT_TIMEOUT
+)
 if pydash.is_empty(MEGANNO_AUTH_HOST):
     raise Exception("Missing required envrionment variable: MEGANNO_AUTH_HOST.")
 if pydash.is_empty(MEGANNO_AUTH_PORT):
     raise Exception("Missing required envrionment variable: MEGANNO_AUTH_PORT.")
 AUTH_PATH = f"{MEGANNO_AUTH_HOST}:{MEGANNO_AUTH_PORT}"
+auth_client = HttpClient(
+    pool_size=os.getenv("MEGANNO_AUTH_POOL_SIZE", DEFAULT_HTTP_POOL_SIZE),
+    connect_timeout=os.getenv(
+        "MEGANNO_AUTH_CONNECT_TIMEOUT", DEFAULT_HTTP_CONNECT_TIMEOUT
+    ),
+    read_timeout=os.getenv("MEGANNO_AUTH_READ_TIMEOUT", DEFAULT_HTTP_READ_TIMEOUT),
+    retries=os.getenv("MEGANNO_AUTH_RETRIES", DEFAULT_HTTP_RETRIES),
+    observer=observe_upstream,
+)
+MEGANNO_TOKEN_CACHE_SIZE = os.getenv(
+    "MEGANNO_TOKEN_CACHE_SIZE", DEFAULT_TOKEN_CACHE_SIZE
+)
+# seconds; 0 disables token verification caching
+MEGANNO_TOKEN_CACHE_TTL = os.getenv("MEGANNO_TOKEN_CACHE_TTL", DEFAULT_TOKEN_CACHE_TTL)
+# reads the auth service revocation feed; revoked tokens are only dropped
+# from the cache through the feed, so tokens are not cached without it
+MEGANNO_SERVICE_TOKEN = os.getenv("MEGANNO_SERVICE_TOKEN", "")
+if pydash.is_empty(MEGANNO_SERVICE_TOKEN):
+    MEGANNO_TOKEN_CACHE_TTL = 0
+MEGANNO_TOKEN_REVOCATION_INTERVAL = os.getenv(
+    "MEGANNO_TOKEN_REVOCATION_INTERVAL", DEFAULT_TOKEN_REVOCATION_INTERVAL
+)
+
+
+def fetch_token_revocations(after, disabled_digest):
+    response = auth_client.get(
+        "revocations",
+        f"{AUTH_PATH}/auth/tokens/revocations",
+        params={"after": after, "disabled_digest": disabled_digest},
+        headers={"Authorization": f"Bearer {MEGANNO_SERVICE_TOKEN}"},
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+token_cache = TokenCache(
+    max_size=MEGANNO_TOKEN_CACHE_SIZE,
+    ttl=MEGANNO_TOKEN_CACHE_TTL,
+    revocation_interval=MEGANNO_TOKEN_REVOCATION_INTERVAL,
+    revocation_fetcher=fetch_token_revocations,
+)
 app.config["ENV"] = APP_ENVIRONMENT
 CORS(app)
 database_username = "neo4j"
@@ -68,6 +160,7 @@ database = None
 project_name = os.getenv("MEGANNO_PROJECT_NAME", None)
 ecs = None
 health_check = {}
+health_check_lock = threading.Lock()
 try:
     if pydash.is_empty(pydash.trim(project_name)):
         raise Exception("Missing required envrionment variable: MEGANNO_PROJECT_NAME.")
@@ -104,11 +197,64 @@ try:
         uri=f"{database_host}:{MEGANNO_NEO4J_PORT}",
         username=database_username,
         password=database_password,
+        max_connection_pool_size=os.getenv(
+            "MEGANNO_NEO4J_POOL_SIZE", DEFAULT_NEO4J_POOL_SIZE
+        ),
+        connection_acquisition_timeout=os.getenv(
+            "MEGANNO_NEO4J_ACQUISITION_TIMEOUT", DEFAULT_NEO4J_ACQUISITION_TIMEOUT
+        ),
+        max_connection_lifetime=os.getenv(
+            "MEGANNO_NEO4J_MAX_CONNECTION_LIFETIME",
+            DEFAULT_NEO4J_MAX_CONNECTION_LIFETIME,
+        ),
+        query_timeout=os.getenv("MEGANNO_NEO4J_QUERY_TIMEOUT", None),
+        slow_query_seconds=os.getenv(
+            "MEGANNO_SLOW_QUERY_SECONDS", DEFAULT_SLOW_QUERY_SECONDS
+        ),
+        profile_rate=os.getenv(
+            "MEGANNO_QUERY_PROFILE_RATE", DEFAULT_QUERY_PROFILE_RATE
+        ),
     )
 except Exception as ex:
     raise Exception("Failed to initialize database connection", ex)
-project = Project(database=database, project_name=project_name)
+migration = Migration(database=database, wait_timeout=MEGANNO_INDEX_WAIT_TIMEOUT)
+if MEGANNO_INDEX_MIGRATION:
+    # with preload_app, this runs once in the gunicorn master before forking
+    applied_versions = migration.migrate()
+    print(
+        f"index migration version: {migration.get_version()}"
+        + (f" (applied {applied_versions})" if len(applied_versions) > 0 else "")
+    )
+project = Project(
+    database=database,
+    project_name=project_name,
+    validate_labels=MEGANNO_LABEL_VALIDATION,
+)
+if MEGANNO_INDEX_MIGRATION and not project.get_statistics().is_materialized():
+    # label statistics counters are maintained on write once built
+    annotated = project.get_statistics().rebuild_label_statistics()
+    print(f"label statistics rebuilt ({annotated} annotated records)")
 agent_manager = AgentManager(project=project)
+import_manager = ImportManager(
+    project=project,
+    max_workers=os.getenv("MEGANNO_IMPORT_WORKERS", DEFAULT_IMPORT_WORKERS),
+    chunk_size=os.getenv("MEGANNO_IMPORT_CHUNK_SIZE", IMPORT_CHUNK_SIZE),
+    lease_seconds=os.getenv(
+        "MEGANNO_IMPORT_LEASE_SECONDS", DEFAULT_IMPORT_LEASE_SECONDS
+    ),
+    resume_interval=os.getenv(
+        "MEGANNO_IMPORT_RESUME_INTERVAL", DEFAULT_IMPORT_RESUME_INTERVAL
+    ),
+)
+
+
+def collect_metrics(metrics):
+    metrics.report_pool(database.pool_stats())
+    metrics.count_cache("token", token_cache.stats())
+    metrics.count_cache("schema", project.active_schema.stats())
+
+
+metrics = Metrics(app, collect=collect_metrics)
 
 
 @app.errorhandler(404)
@@ -150,10 +296,13 @@ def invalid_api_usage(error):
 
 @app.before_request
 def token_verification():
+    if request.path == METRICS_PATH:
+        return
     # redirect all /auth requests
     if request.path.startswith("/auth"):
         try:
-            res = requests.request(
+            res = auth_client.request(
+                "proxy",
                 method=request.method,
                 url=request.url.replace(request.host_url, f"{AUTH_PATH}/").replace(
                     f"/{project_name}", ""
@@ -161,9 +310,15 @@ def token_verification():
                 headers={
                     k: v for k, v in request.headers if k.lower() != "host"
                 },  # exclude 'host' header
-                data=request.get_data(),
+                # stream the request body instead of buffering it
+                data=(
+                    StreamingBody(request.stream, request.content_length)
+                    if request.content_length
+                    else request.get_data()
+                ),
                 cookies=request.cookies,
                 allow_redirects=False,
+                stream=True,
             )
             # region exlcude some keys in :res response
             excluded_headers = [
@@ -178,51 +333,74 @@ def token_verification():
                 if k.lower() not in excluded_headers
             ]
             # END region exlcude some keys in :res response
-            return Response(res.content, res.status_code, headers)
+            return Response(stream_response_content(res), res.status_code, headers)
         except Exception as ex:
             abort(500, ex)
         # END edirect all /auth requests
     if int(request.args.get("url_check", 0)) == True:
-        datetime_now = datetime.datetime.now()
-        last_database_check = pydash.objects.get(
-            health_check, "database.last_updated", datetime_now
-        )
-        delta = datetime_now - last_database_check
-        if (
-            delta.total_seconds() >= 60
-            or pydash.objects.has(health_check, "database.last_updated") is False
-        ):
-            pydash.objects.set_(
-                health_check, "database.last_updated", datetime.datetime.now()
-            )
-            pydash.objects.set_(
-                health_check, "database.status", project.database_check()
+        # threads of a worker share health_check: one of them checks the
+        # database, the others wait for its status
+        with health_check_lock:
+            datetime_now = datetime.datetime.now()
+            last_database_check = pydash.objects.get(
+                health_check, "database.last_updated", datetime_now
             )
-        if pydash.objects.get(health_check, "database.status", False) is False:
+            delta = datetime_now - last_database_check
+            if (
+                delta.total_seconds() >= 60
+                or pydash.objects.has(health_check, "database.last_updated") is False
+            ):
+                pydash.objects.set_(
+                    health_check, "database.last_updated", datetime.datetime.now()
+                )
+                pydash.objects.set_(
+                    health_check, "database.status", project.database_check()
+                )
+            database_status = pydash.objects.get(health_check, "database.status", False)
+        if database_status is False:
             return DATABASE_503_RESPONSE
         return make_response(
             {
                 "version": version,
                 "environment": APP_ENVIRONMENT,
                 "message": "MEGAnno Service is up and running",
+                "token_cache": token_cache.stats(),
+                "auth_latency": auth_client.stats(),
+                "database_pool": database.pool_stats(),
+                "database_queries": database.query_stats.stats(),
             },
             200,
         )
-    if not pydash.objects.has(request.json, "token"):
+    if request.is_json:
+        credentials = request.json
+    else:
+        # file uploads send the token as a form field or a bearer token, never
+        # as a query argument: urls are logged by gunicorn and proxies
+        credentials = request.form.to_dict()
+        authorization = request.headers.get("Authorization", "")
+        if authorization.startswith("Bearer "):
+            credentials["token"] = authorization[len("Bearer ") :]
+    if not pydash.objects.has(credentials, "token"):
         abort(401, "Token is missing.")
     # authenticate token
-    response = requests.post(
-        f"{AUTH_PATH}/auth/users/authenticate",
-        json={"token": str(request.json.get("token", ""))},
-    )
-    if response.status_code == 401:
-        abort(401, "Invalid token.")
-    request.user = response.json()
+    token = str(credentials.get("token", ""))
+    request.user = token_cache.get(token)
+    if request.user is None:
+        response = auth_client.post(
+            "authenticate",
+            f"{AUTH_PATH}/auth/users/authenticate",
+            json={"token": token},
+        )
+        if response.status_code == 401:
+            abort(401, "Invalid token.")
+        if response.status_code != 200:
+            abort(500, response.text)
+        request.user = token_cache.set(token, response.json())
     user_id = pydash.objects.get(request.user, "user_id", "-")
     username = pydash.objects.get(request.user, "username", "-")
     if MEGANNO_LOGGING:
-        payload = request.json
-        del payload["token"]
+        payload = request.json if request.is_json else request.values.to_dict()
+        payload.pop("token", None)
         traffic_logger.info(
             f"""{request.method} {request.path} - {username}({user_id})\npayload: {json.dumps(payload)}"""
         )
@@ -234,6 +412,8 @@ def logging(response):
         traffic_logger.info(f"{response.status} ({response.status_code})")
     return response
 
+
+from app import commands
 from app.routes import (
     agents,
     annotations,
@@ -1,10 +1,36 @@
-from app.constants import DATABASE_503_RESPONSE, d7validate
+from app.constants import DATABASE_503_RESPONSE, d7compile, d7validate
+from app.core.utils import InvalidLabelError
 from app.decorators import require_role
 from app.flask_app import agent_manager, app
 from app.routes.json_validation.base import BaseValidation
 from flask import jsonify, make_response, request
 
 
+GET_AGENT_LIST_VALIDATION = d7compile(
+    {
+        "properties": {
+            "created_by_filter": {
+                **BaseValidation.string,
+                "type": ["array", "null"],
+                "items": BaseValidation.string,
+            },
+            "provider_filter": {
+                **BaseValidation.string,
+                "type": ["string", "null"],
+            },
+            "api_filter": {
+                **BaseValidation.string,
+                "type": ["string", "null"],
+            },
+            "show_job_list": {
+                **BaseValidation.boolean,
+                "type": ["boolean", "null"],
+            },
+        }
+    }
+)
+
+
 @app.route("/agents", methods=["GET"])
 @require_role(["administrator", "contributor"])
 def get_agent_list():
@@ -14,30 +40,7 @@ def get_agent_list():
         "api_filter": request.json.get("api_filter", None),
         "show_job_list": request.json.get("show_job_list", False),
     }
-    d7validate(
-        {
-            "properties": {
-                "created_by_filter": {
-                    **BaseValidation.string,
-                    "type": ["array", "null"],
-                    "items": BaseValidation.string,
-                },
-                "provider_filter": {
-                    **BaseValidation.string,
-                    "type": ["string", "null"],
-                },
-                "api_filter": {
-                    **BaseValidation.string,
-                    "type": ["string", "null"],
-                },
-                "show_job_list": {
-                    **BaseValidation.boolean,
-                    "type": ["boolean", "null"],
-                },
-            }
-        },
-        payload,
-    )
+    d7validate(GET_AGENT_LIST_VALIDATION, payload)
 
     result = agent_manager.list_agents(
         created_by_filter=payload["created_by_filter"],
@@ -49,11 +52,16 @@ def get_agent_list():
     return make_response(jsonify(result), 200)
 
 
+GET_AGENT_JOBS_VALIDATION = d7compile(
+    {"properties": {"details": BaseValidation.boolean}}
+)
+
+
 @app.route("/agents/<string:agent_uuid>/jobs", methods=["GET"])
 @require_role(["administrator", "contributor"])
 def get_agent_jobs(agent_uuid):
     payload = {"details": request.json.get("details", False)}
-    d7validate({"properties": {"details": BaseValidation.boolean}}, payload)
+    d7validate(GET_AGENT_JOBS_VALIDATION, payload)
     try:
         result = agent_manager.list_jobs(
             filter_by="agent_uuid",
@@ -65,6 +73,17 @@ def get_agent_jobs(agent_uuid):
     return make_response(jsonify(result), 200)
 
 
+GET_JOBS_BY_AGENTS_VALIDATION = d7compile(
+    {
+        "properties": {
+            "details": BaseValidation.boolean,
+            "filter_by": BaseValidation.filter_by,
+            "filter_values": BaseValidation.uuid_list,
+        }
+    }
+)
+
+
 @app.route("/agents/jobs", methods=["GET"])
 @require_role(["administrator", "contributor"])
 def get_jobs_by_agents():
@@ -73,16 +92,7 @@ def get_jobs_by_agents():
         "filter_by": request.json.get("filter_by", None),
         "filter_values": request.json.get("filter_values", []),
     }
-    d7validate(
-        {
-            "properties": {
-                "details": BaseValidation.boolean,
-                "filter_by": BaseValidation.filter_by,
-                "filter_values": BaseValidation.uuid_list,
-            }
-        },
-        payload,
-    )
+    d7validate(GET_JOBS_BY_AGENTS_VALIDATION, payload)
     try:
         result = agent_manager.list_jobs(
             filter_by=payload["filter_by"],
@@ -94,6 +104,17 @@ def get_jobs_by_agents():
     return make_response(jsonify(result), 200)
 
 
+REGISTER_AGENT_VALIDATION = d7compile(
+    {
+        "properties": {
+            "model_config": BaseValidation.model_config,
+            "prompt_template": BaseValidation.string,
+            "provider_api": BaseValidation.string,
+        }
+    }
+)
+
+
 @app.route("/agents", methods=["POST"])
 @require_role(["administrator", "contributor"])
 def register_agent():
@@ -102,16 +123,7 @@ def register_agent():
         "prompt_template": request.json.get("prompt_template", ""),
         "provider_api": request.json.get("provider_api", ""),
     }
-    d7validate(
-        {
-            "properties": {
-                "model_config": BaseValidation.model_config,
-                "prompt_template": BaseValidation.string,
-                "provider_api": BaseValidation.string,
-            }
-        },
-        payload,
-    )
+    d7validate(REGISTER_AGENT_VALIDATION, payload)
     agent = agent_manager.register_agent(
         created_by=request.user["user_id"],
         model_config=payload["model_config"],
@@ -121,6 +133,18 @@ def register_agent():
     return make_response(jsonify(agent), 200)
 
 
+PERSIST_JOB_VALIDATION = d7compile(
+    {
+        "properties": {
+            "label_name": BaseValidation.string,
+            "annotation_uuid_list": BaseValidation.uuid_list,
+            "job_uuid": BaseValidation.uuid,
+            "agent_uuid": BaseValidation.uuid,
+        }
+    }
+)
+
+
 @app.route("/agents/<string:agent_uuid>/jobs/<string:job_uuid>", methods=["POST"])
 @require_role(["administrator", "contributor", "job"])
 def persist_job(agent_uuid, job_uuid):
@@ -130,24 +154,17 @@ def persist_job(agent_uuid, job_uuid):
         "agent_uuid": agent_uuid,
         "job_uuid": job_uuid,
     }
-    d7validate(
-        {
-            "properties": {
-                "label_name": BaseValidation.string,
-                "annotation_uuid_list": BaseValidation.uuid_list,
-                "job_uuid": BaseValidation.uuid,
-                "agent_uuid": BaseValidation.uuid,
-            }
-        },
-        payload,
-    )
-    job = agent_manager.persist_job(
-        job_uuid=job_uuid,
-        agent_uuid=agent_uuid,
-        label_name=payload["label_name"],
-        issued_by=request.user["user_id"],
-        annotation_uuid_list=payload["annotation_uuid_list"],
-    )
+    d7validate(PERSIST_JOB_VALIDATION, payload)
+    try:
+        job = agent_manager.persist_job(
+            job_uuid=job_uuid,
+            agent_uuid=agent_uuid,
+            label_name=payload["label_name"],
+            issued_by=request.user["user_id"],
+            annotation_uuid_list=payload["annotation_uuid_list"],
+        )
+    except InvalidLabelError as ex:
+        return make_response(str(ex), 400)
     if job is False:
         return DATABASE_503_RESPONSE
     return make_response(jsonify(job), 200)
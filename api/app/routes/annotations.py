@@ -5,15 +5,39 @@ from app.constants import (
     DATABASE_503_RESPONSE,
     DEFAULT_QUERY_LIMIT,
     VALID_SCHEMA_LEVELS,
+    d7compile,
     d7validate,
 )
-from app.core.utils import ValueNotExistsError
+from app.core.utils import InvalidLabelError, ValueNotExistsError
 from app.decorators import require_role
 from app.flask_app import app, project
 from app.routes.json_validation.base import BaseValidation
 from flask import abort, jsonify, make_response, request
 
 
+SET_ANNOTATION_BY_UUID_VALIDATION = d7compile(
+    {
+        "properties": {
+            "labels": {
+                "type": "object",
+                "properties": {
+                    "labels_span": {
+                        "type": "array",
+                        "items": BaseValidation.label,
+                    },
+                    "labels_record": {
+                        "type": "array",
+                        "items": BaseValidation.label,
+                    },
+                },
+                "additionalProperties": True,
+            },
+            "record_uuid": BaseValidation.uuid,
+        }
+    }
+)
+
+
 @app.route("/annotations/<string:record_uuid>", methods=["POST"])
 @require_role(["administrator", "contributor", "job"])
 def set_annotation_by_uuid(record_uuid):
@@ -24,28 +48,7 @@ def set_annotation_by_uuid(record_uuid):
             "record_uuid": record_uuid,
         }
 
-        d7validate(
-            {
-                "properties": {
-                    "labels": {
-                        "type": "object",
-                        "properties": {
-                            "labels_span": {
-                                "type": "array",
-                                "items": BaseValidation.label,
-                            },
-                            "labels_record": {
-                                "type": "array",
-                                "items": BaseValidation.label,
-                            },
-                        },
-                        "additionalProperties": True,
-                    },
-                    "record_uuid": BaseValidation.uuid,
-                }
-            },
-            payload,
-        )
+        d7validate(SET_ANNOTATION_BY_UUID_VALIDATION, payload)
 
         annotation_uuid = project.annotate(
             record_uuid=record_uuid, labels=payload["labels"], annotator=user_id
@@ -64,49 +67,53 @@ def set_annotation_by_uuid(record_uuid):
         )
     except KeyError as ex:
         return make_response(f"Bad request: {ex} is missing.", 400)
+    except InvalidLabelError as ex:
+        return make_response(str(ex), 400)
     except Exception as ex:
         abort(500, ex)
 
 
-@app.route("/annotations/batch", methods=["POST"])
-@require_role(["administrator", "contributor", "job"])
-def set_annotation_by_batch_uuid():
-    try:
-        user_id = request.user["user_id"]
-        payload = {
-            "annotation_list": request.json.get("annotation_list", None),
-        }
-        d7validate(
-            {
-                "properties": {
-                    "annotation_list": {
-                        "type": ["array", "null"],
-                        "items": {
+SET_ANNOTATION_BY_BATCH_UUID_VALIDATION = d7compile(
+    {
+        "properties": {
+            "annotation_list": {
+                "type": ["array", "null"],
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "labels": {
                             "type": "object",
                             "properties": {
-                                "labels": {
-                                    "type": "object",
-                                    "properties": {
-                                        "labels_span": {
-                                            "type": ["array", "null"],
-                                            "items": BaseValidation.label,
-                                        },
-                                        "labels_record": {
-                                            "type": ["array", "null"],
-                                            "items": BaseValidation.label,
-                                        },
-                                    },
-                                    "additionalProperties": True,
+                                "labels_span": {
+                                    "type": ["array", "null"],
+                                    "items": BaseValidation.label,
+                                },
+                                "labels_record": {
+                                    "type": ["array", "null"],
+                                    "items": BaseValidation.label,
                                 },
-                                "record_uuid": BaseValidation.uuid,
                             },
                             "additionalProperties": True,
                         },
+                        "record_uuid": BaseValidation.uuid,
                     },
-                }
+                    "additionalProperties": True,
+                },
             },
-            payload,
-        )
+        }
+    }
+)
+
+
+@app.route("/annotations/batch", methods=["POST"])
+@require_role(["administrator", "contributor", "job"])
+def set_annotation_by_batch_uuid():
+    try:
+        user_id = request.user["user_id"]
+        payload = {
+            "annotation_list": request.json.get("annotation_list", None),
+        }
+        d7validate(SET_ANNOTATION_BY_BATCH_UUID_VALIDATION, payload)
         response = project.annotate_batch(
             annotation_list=payload["annotation_list"], annotator=user_id
         )
@@ -120,6 +127,17 @@ def set_annotation_by_batch_uuid():
         abort(500, ex)
 
 
+SET_ANNOTATION_LABELS_BY_UUID_VALIDATION = d7compile(
+    {
+        "properties": {
+            "labels": {"type": "array", "items": BaseValidation.label},
+            "record_uuid": BaseValidation.uuid,
+            "annotator": BaseValidation.string,
+        }
+    }
+)
+
+
 @app.route("/annotations/<string:record_uuid>/labels", methods=["POST"])
 @require_role(["administrator", "contributor"])
 def set_annotation_labels_by_uuid(record_uuid):
@@ -132,16 +150,7 @@ def set_annotation_labels_by_uuid(record_uuid):
         }
         if payload["annotator"] is None or payload["annotator"] != "reconciliation":
             payload["annotator"] = user_id
-        d7validate(
-            {
-                "properties": {
-                    "labels": {"type": "array", "items": BaseValidation.label},
-                    "record_uuid": BaseValidation.uuid,
-                    "annotator": BaseValidation.string,
-                }
-            },
-            payload,
-        )
+        d7validate(SET_ANNOTATION_LABELS_BY_UUID_VALIDATION, payload)
         response = project.label(
             record_uuid=record_uuid,
             labels=payload["labels"],
@@ -154,10 +163,22 @@ def set_annotation_labels_by_uuid(record_uuid):
         )
     except KeyError as ex:
         return make_response(f"Bad request: {ex} is missing.", 400)
+    except InvalidLabelError as ex:
+        return make_response(str(ex), 400)
     except Exception as ex:
         abort(500, ex)
 
 
+ADD_METADATA_TO_LABEL_VALIDATION = d7compile(
+    {
+        "properties": {
+            "label_uuid": BaseValidation.label_uuid,
+            "metadata_list": BaseValidation.label_metadata_list,
+        }
+    }
+)
+
+
 @app.route("/annotations/label_metadata", methods=["POST"])
 @require_role(["administrator", "contributor", "job"])
 def add_metadata_to_label():
@@ -165,15 +186,7 @@ def add_metadata_to_label():
         "label_uuid": str(request.json.get("label_uuid", "")),
         "metadata_list": request.json.get("metadata_list", []),
     }
-    d7validate(
-        {
-            "properties": {
-                "label_uuid": BaseValidation.label_uuid,
-                "metadata_list": BaseValidation.label_metadata_list,
-            }
-        },
-        payload,
-    )
+    d7validate(ADD_METADATA_TO_LABEL_VALIDATION, payload)
     try:
         ret = project.add_metadata_to_label(
             payload["label_uuid"], payload["metadata_list"]
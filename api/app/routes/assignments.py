@@ -1,10 +1,20 @@
-from app.constants import DATABASE_503_RESPONSE, d7validate
+from app.constants import DATABASE_503_RESPONSE, d7compile, d7validate
 from app.decorators import require_role
 from app.flask_app import app, project
 from app.routes.json_validation.base import BaseValidation
 from flask import jsonify, make_response, request
 
 
+GET_ASSIGNMENT_VALIDATION = d7compile(
+    {
+        "properties": {
+            "annotator": BaseValidation.string,
+            "latest_only": BaseValidation.boolean,
+        }
+    }
+)
+
+
 @app.route("/assignments", methods=["GET"])
 @require_role(["administrator", "contributor"])
 def get_assignment():
@@ -15,15 +25,7 @@ def get_assignment():
     # default to token owner if no annotator ID provided
     if payload["annotator"] is None:
         payload["annotator"] = request.user["user_id"]
-    d7validate(
-        {
-            "properties": {
-                "annotator": BaseValidation.string,
-                "latest_only": BaseValidation.boolean,
-            }
-        },
-        payload,
-    )
+    d7validate(GET_ASSIGNMENT_VALIDATION, payload)
     result = project.get_assignment_obj().get_assignment(
         payload["annotator"], payload["latest_only"]
     )
@@ -38,6 +40,16 @@ def get_assignment():
     return make_response(jsonify(assignment_list), 200)
 
 
+SET_ASSIGNMENT_VALIDATION = d7compile(
+    {
+        "properties": {
+            "annotator": BaseValidation.string,
+            "subset": BaseValidation.uuid_list,
+        }
+    }
+)
+
+
 @app.route("/assignments", methods=["POST"])
 @require_role("administrator")
 def set_assignment():
@@ -45,15 +57,7 @@ def set_assignment():
         "annotator": request.json.get("annotator", request.user["user_id"]),
         "subset": list(request.json.get("subset_uuid_list", [])),
     }
-    d7validate(
-        {
-            "properties": {
-                "annotator": BaseValidation.string,
-                "subset": BaseValidation.uuid_list,
-            }
-        },
-        payload,
-    )
+    d7validate(SET_ASSIGNMENT_VALIDATION, payload)
     result = project.get_assignment_obj().set_assignment(
         subset=payload["subset"],
         annotator=payload["annotator"],
@@ -1,27 +1,102 @@
+import csv
+import io
+import itertools
+import json
+
 from app.constants import (
     DATABASE_503_RESPONSE,
     DEFAULT_QUERY_LIMIT,
     MAX_QUERY_LIMIT,
+    d7compile,
     d7validate,
 )
+from app.core.import_readers import read_batches, read_vector_batches
 from app.core.subset import Subset
+from app.core.utils import IndexNotOnlineError
 from app.decorators import require_role
+from app.enums.export_format import ExportFormat
 from app.enums.search_mode import VerificationSearchMode
-from app.flask_app import app, project
+from app.flask_app import app, import_manager, project
 from app.routes.json_validation.base import BaseValidation
-from flask import abort, jsonify, make_response, request
+from flask import (
+    Response,
+    abort,
+    jsonify,
+    make_response,
+    request,
+    stream_with_context,
+)
 from neo4j.exceptions import CypherSyntaxError
 
 
+SEARCH_PAGINATION_VALIDATION = d7compile(
+    {
+        "properties": {
+            "limit": {"type": ["integer", "null"]},
+            "skip": {"type": ["integer", "null"]},
+        }
+    }
+)
+
+
+SEARCH_VALIDATION = d7compile(
+    {
+        "properties": {
+            "limit": BaseValidation.limit,
+            "skip": BaseValidation.skip,
+            "uuid_list": {**BaseValidation.uuid_list, "type": ["array", "null"]},
+            "keyword": {**BaseValidation.string, "type": ["string", "null"]},
+            "regex": {**BaseValidation.string, "type": ["string", "null"]},
+            "record_metadata_condition": {
+                "type": ["object", "null"],
+                "properties": {
+                    "name": BaseValidation.string,
+                    "operator": BaseValidation.operator,
+                    "value": {"type": ["string", "number", "null"]},
+                },
+            },
+            "annotator_list": {
+                "type": ["array", "null"],
+                "items": BaseValidation.string,
+            },
+            "label_condition": {
+                "type": ["object", "null"],
+                "properties": {
+                    "name": BaseValidation.string,
+                    "operator": BaseValidation.label_operator,
+                    "value": {
+                        "type": ["array", "string", "number", "null"],
+                    },
+                },
+            },
+            "label_metadata_condition": {
+                "type": ["object", "null"],
+                "properties": {
+                    "label_name": BaseValidation.string,
+                    "name": BaseValidation.string,
+                    "operator": BaseValidation.operator,
+                    "value": {"type": ["string", "number", "null"]},
+                },
+            },
+            "verification_condition": {
+                "type": ["object", "null"],
+                "properties": {
+                    "label_name": BaseValidation.string,
+                    "search_mode": BaseValidation.verified_status,
+                },
+            },
+            "search_mode": BaseValidation.search_mode,
+            "include_scores": BaseValidation.boolean,
+            "cursor": BaseValidation.string_or_none,
+        }
+    }
+)
+
+
 @app.route("/data/search", methods=["GET"])
 def search():
     d7validate(
-        {
-            "properties": {
-                "limit": {"type": ["integer", "null"]},
-                "skip": {"type": ["integer", "null"]},
-            }
-        },
+        SEARCH_PAGINATION_VALIDATION,
         {
             "limit": request.json.get("limit"),
             "skip": request.json.get("skip"),
@@ -41,57 +116,11 @@ def search():
         "label_condition": request.json.get("label_condition", None),
         "label_metadata_condition": request.json.get("label_metadata_condition", None),
         "verification_condition": request.json.get("verification_condition", None),
+        "search_mode": request.json.get("search_mode", None),
+        "include_scores": request.json.get("include_scores", False),
+        "cursor": request.json.get("cursor", None),
     }
-    d7validate(
-        {
-            "properties": {
-                "limit": BaseValidation.limit,
-                "skip": BaseValidation.skip,
-                "uuid_list": {**BaseValidation.uuid_list, "type": ["array", "null"]},
-                "keyword": {**BaseValidation.string, "type": ["string", "null"]},
-                "regex": {**BaseValidation.string, "type": ["string", "null"]},
-                "record_metadata_condition": {
-                    "type": ["object", "null"],
-                    "properties": {
-                        "name": BaseValidation.string,
-                        "operator": BaseValidation.operator,
-                        "value": {"type": ["string", "number", "null"]},
-                    },
-                },
-                "annotator_list": {
-                    "type": ["array", "null"],
-                    "items": BaseValidation.string,
-                },
-                "label_condition": {
-                    "type": ["object", "null"],
-                    "properties": {
-                        "name": BaseValidation.string,
-                        "operator": BaseValidation.label_operator,
-                        "value": {
-                            "type": ["array", "string", "number", "null"],
-                        },
-                    },
-                },
-                "label_metadata_condition": {
-                    "type": ["object", "null"],
-                    "properties": {
-                        "label_name": BaseValidation.string,
-                        "name": BaseValidation.string,
-                        "operator": BaseValidation.operator,
-                        "value": {"type": ["string", "number", "null"]},
-                    },
-                },
-                "verification_condition": {
-                    "type": ["object", "null"],
-                    "properties": {
-                        "label_name": BaseValidation.string,
-                        "search_mode": BaseValidation.verified_status,
-                    },
-                },
-            }
-        },
-        payload,
-    )
+    d7validate(SEARCH_VALIDATION, payload)
     try:
         subset_uuids_list = project.search(
             limit=payload["limit"],
@@ -104,15 +133,36 @@ def search():
             label_condition=payload["label_condition"],
             label_metadata_condition=payload["label_metadata_condition"],
             verification_condition=payload["verification_condition"],
+            search_mode=payload["search_mode"],
+            include_scores=payload["include_scores"],
+            # sending a cursor (null for the first page) enables cursor pagination
+            cursor=payload["cursor"],
+            with_cursor="cursor" in request.json,
         )
         return make_response(jsonify(subset_uuids_list), 200)
-    except KeyError as ex:
-
+    except (KeyError, ValueError) as ex:
         abort(400, ex)
+    except IndexNotOnlineError as ex:
+        # the search works again once the index is online, retry later
+        return make_response(str(ex), 503)
     except Exception as ex:
         abort(500, ex)
 
 
+IMPORT_DATA_VALIDATION = d7compile(
+    {
+        "properties": {
+            "url": {**BaseValidation.string_or_none},
+            "file_type": BaseValidation.file_type,
+            "df_dict": {**BaseValidation.array_or_none},
+            "column_mapping": BaseValidation.column_mapping,
+            "metadata": {"type": ["string", "null"]},
+            "background": BaseValidation.boolean,
+        }
+    }
+)
+
+
 @app.route("/data", methods=["POST"])
 @require_role("administrator")
 def import_data():
@@ -122,25 +172,30 @@ def import_data():
         # json representation of dataframe
         "df_dict": request.json.get("df_dict", None),
         "column_mapping": request.json.get("column_mapping", {}),
+        # run as an import job, see GET /data/imports/<job_uuid>
+        "background": request.json.get("background", False),
     }
     if payload["file_type"] is not None:
         payload["file_type"] = payload["file_type"].upper()
     errors = verify_import_payload(url=payload["url"], file_type=payload["file_type"])
     if len(errors) != 0:
         return make_response("\n".join(errors), 400)
-    d7validate(
-        {
-            "properties": {
-                "url": {**BaseValidation.string_or_none},
-                "file_type": BaseValidation.file_type,
-                "df_dict": {**BaseValidation.array_or_none},
-                "column_mapping": BaseValidation.column_mapping,
-                "metadata": {"type": ["string", "null"]},
-            }
-        },
-        payload,
-    )
+    d7validate(IMPORT_DATA_VALIDATION, payload)
     try:
+        if payload["background"]:
+            if payload["file_type"] == "CSV":
+                job_uuid = import_manager.submit_csv(
+                    url=payload["url"],
+                    column_mapping=payload["column_mapping"],
+                    created_by=request.user["user_id"],
+                )
+            else:
+                job_uuid = import_manager.submit_rows(
+                    rows=payload["df_dict"],
+                    column_mapping=payload["column_mapping"],
+                    created_by=request.user["user_id"],
+                )
+            return make_response(jsonify({"job_uuid": job_uuid}), 202)
         count = 0
         if payload["file_type"].upper() == "CSV":
             count = project.import_data(
@@ -163,18 +218,184 @@ def import_data():
         abort(500, ex)
 
 
+UPLOAD_DATA_VALIDATION = d7compile(
+    {
+        "properties": {
+            "file_type": BaseValidation.upload_file_type,
+            "column_mapping": BaseValidation.column_mapping,
+            "background": BaseValidation.boolean,
+        }
+    }
+)
+
+
+@app.route("/data/upload", methods=["POST"])
+@require_role("administrator")
+def upload_data():
+    # parameters are form fields or query arguments; the file is a multipart
+    # 'file' field or the request body itself
+    try:
+        payload = {
+            "file_type": request.values.get("file_type", "").upper(),
+            "column_mapping": json.loads(request.values.get("column_mapping", "{}")),
+            # run as an import job, see GET /data/imports/<job_uuid>
+            "background": request.values.get("background", "false").lower() == "true",
+        }
+    except ValueError as ex:
+        return make_response(f"'column_mapping' is not valid JSON: {ex}", 400)
+    d7validate(UPLOAD_DATA_VALIDATION, payload)
+    upload = request.files.get("file")
+    stream = upload.stream if upload is not None else request.stream
+    try:
+        batches = read_batches(
+            stream=stream,
+            file_type=payload["file_type"],
+            column_mapping=payload["column_mapping"],
+            batch_size=import_manager.chunk_size,
+        )
+        if payload["background"]:
+            job_uuid = import_manager.submit_batches(
+                batches=batches,
+                column_mapping=payload["column_mapping"],
+                created_by=request.user["user_id"],
+                file_type=payload["file_type"],
+            )
+            return make_response(jsonify({"job_uuid": job_uuid}), 202)
+        count = project.import_batches(
+            batches=batches, column_mapping=payload["column_mapping"]
+        )
+        return make_response(
+            f"{count} data record{'s are' if count > 1 else ' is'} imported into database.",
+            200,
+        )
+    except ValueError as ex:
+        return make_response(str(ex), 400)
+    except Exception as ex:
+        abort(500, ex)
+
+
+@app.route("/data/imports/<string:job_uuid>", methods=["GET"])
+@require_role("administrator")
+def get_import_job(job_uuid):
+    try:
+        job = import_manager.get_job(job_uuid)
+    except Exception as ex:
+        abort(500, ex)
+    if job is None:
+        return make_response(f"Import job {job_uuid} does not exist.", 404)
+    return make_response(jsonify(job), 200)
+
+
+@app.route("/data/imports/<string:job_uuid>/retry", methods=["POST"])
+@require_role("administrator")
+def retry_import_job(job_uuid):
+    try:
+        job = import_manager.retry(job_uuid)
+    except ValueError as ex:
+        return make_response(str(ex), 400)
+    except Exception as ex:
+        abort(500, ex)
+    if job is None:
+        return make_response(f"Import job {job_uuid} does not exist.", 404)
+    return make_response(jsonify(job), 202)
+
+
+EXPORT_DATA_VALIDATION = d7compile(
+    {"properties": {"format": BaseValidation.export_format}}
+)
+
+
 @app.route("/data/export", methods=["GET"])
 @require_role(["administrator", "contributor"])
 def export_data():
+    payload = {"format": str(request.json.get("format", "json")).upper()}
+    d7validate(EXPORT_DATA_VALIDATION, payload)
+    serializers = {
+        ExportFormat.JSON.value: (export_json, "application/json"),
+        ExportFormat.NDJSON.value: (export_ndjson, "application/x-ndjson"),
+        ExportFormat.CSV.value: (export_csv, "text/csv"),
+    }
+    serializer, mimetype = serializers[payload["format"]]
     try:
-        ret = project.export_data()
-        return make_response(jsonify(ret), 200)
+        rows = project.export_data()
+        # read the first page before streaming, so database errors
+        # are still reported with a proper status code
+        first_row = next(rows, None)
+        if first_row is not None:
+            rows = itertools.chain([first_row], rows)
+        return Response(stream_with_context(serializer(rows)), mimetype=mimetype)
     except CypherSyntaxError:
         return DATABASE_503_RESPONSE
     except Exception as ex:
         abort(500, ex)
 
 
+def export_json(rows):
+    """
+    JSON array of [record_id, content, annotator, label_name, label_value]
+    rows for labeled records, the shape returned before streaming export.
+    """
+    yield "["
+    separator = ""
+    for row in rows:
+        if row["label_name"] is None:
+            continue
+        yield separator + json.dumps(
+            [
+                row["record_id"],
+                row["content"],
+                row["annotator"],
+                row["label_name"],
+                row["label_value"],
+            ]
+        )
+        separator = ","
+    yield "]"
+
+
+def export_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = None
+    for row in rows:
+        if header is None:
+            header = list(row.keys())
+            writer.writerow(header)
+        writer.writerow(
+            [
+                json.dumps(row[key]) if isinstance(row[key], (list, dict)) else row[key]
+                for key in header
+            ]
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+
+BATCH_UPDATE_METADATA_VALIDATION = d7compile(
+    {
+        "properties": {
+            "record_meta_name": BaseValidation.string,
+            "metadata_list": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "uuid": BaseValidation.uuid,
+                        "value": {"type": ["string", "array", "integer", "float"]},
+                    },
+                },
+            },
+        }
+    }
+)
+
+
 @app.route("/data/metadata", methods=["POST"])
 @require_role("administrator")
 def batch_update_metadata():
@@ -182,24 +403,7 @@ def batch_update_metadata():
         "record_meta_name": str(request.json.get("record_meta_name", "")),
         "metadata_list": request.json.get("metadata_list", []),
     }
-    d7validate(
-        {
-            "properties": {
-                "record_meta_name": BaseValidation.string,
-                "metadata_list": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "uuid": BaseValidation.uuid,
-                            "value": {"type": ["string", "array", "integer", "float"]},
-                        },
-                    },
-                },
-            }
-        },
-        payload,
-    )
+    d7validate(BATCH_UPDATE_METADATA_VALIDATION, payload)
     try:
         ret = project.batch_update_metadata(
             payload["record_meta_name"], payload["metadata_list"]
@@ -209,6 +413,65 @@ def batch_update_metadata():
         abort(500, ex)
 
 
+UPLOAD_METADATA_VALIDATION = d7compile(
+    {
+        "properties": {
+            "record_meta_name": BaseValidation.string,
+            "file_type": BaseValidation.vector_format,
+            "uuid_list": BaseValidation.array_or_none,
+            "uuid_column": BaseValidation.string,
+            "value_column": BaseValidation.string,
+        }
+    }
+)
+
+
+@app.route("/data/metadata/upload", methods=["POST"])
+@require_role("administrator")
+def upload_metadata():
+    # binary vectors (e.g. embeddings) are not parsed as JSON nor validated
+    # per element; parameters are form fields or query arguments
+    try:
+        uuid_list = request.values.get("uuid_list", None)
+        payload = {
+            "record_meta_name": request.values.get("record_meta_name", ""),
+            "file_type": request.values.get("file_type", "").upper(),
+            "uuid_list": json.loads(uuid_list) if uuid_list is not None else None,
+            "uuid_column": request.values.get("uuid_column", "uuid"),
+            "value_column": request.values.get("value_column", "value"),
+        }
+    except ValueError as ex:
+        return make_response(f"'uuid_list' is not valid JSON: {ex}", 400)
+    d7validate(UPLOAD_METADATA_VALIDATION, payload)
+    upload = request.files.get("file")
+    stream = upload.stream if upload is not None else request.stream
+    try:
+        batches = read_vector_batches(
+            stream=stream,
+            file_type=payload["file_type"],
+            uuid_list=payload["uuid_list"],
+            uuid_column=payload["uuid_column"],
+            value_column=payload["value_column"],
+        )
+        ret = project.bulk_update_metadata(payload["record_meta_name"], batches)
+        return make_response(jsonify(ret), 200)
+    except ValueError as ex:
+        return make_response(str(ex), 400)
+    except Exception as ex:
+        abort(500, ex)
+
+
+SUGGEST_SIMILAR_VALIDATION = d7compile(
+    {
+        "properties": {
+            "subset_uuids_list": BaseValidation.uuid_list,
+            "limit": BaseValidation.limit,
+            "record_meta_name": BaseValidation.string,
+        }
+    }
+)
+
+
 @app.route("/data/suggest_similar", methods=["GET"])
 @require_role(["administrator", "contributor"])
 def suggest_similar():
@@ -218,16 +481,7 @@ def suggest_similar():
         "record_meta_name": request.json.get("record_meta_name", None),
         "limit": int(request.json.get("limit", DEFAULT_QUERY_LIMIT)),
     }
-    d7validate(
-        {
-            "properties": {
-                "subset_uuids_list": BaseValidation.uuid_list,
-                "limit": BaseValidation.limit,
-                "record_meta_name": BaseValidation.string,
-            }
-        },
-        payload,
-    )
+    d7validate(SUGGEST_SIMILAR_VALIDATION, payload)
     try:
         result = Subset(
             project=project, data_uuids=payload["subset_uuids_list"]
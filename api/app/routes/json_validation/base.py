@@ -1,6 +1,14 @@
 from app.constants import MAX_QUERY_LIMIT, VALID_SCHEMA_LEVELS
+from app.enums.agreement_metric import AgreementMetric
+from app.enums.export_format import ExportFormat
 from app.enums.import_type import ImportType
-from app.enums.search_mode import VerificationSearchMode, VerificationTypeSearchMode
+from app.enums.projection_method import ProjectionMethod
+from app.enums.search_mode import (
+    SearchMode,
+    VerificationSearchMode,
+    VerificationTypeSearchMode,
+)
+from app.enums.vector_format import VectorFormat
 
 
 class BaseValidation:
@@ -44,6 +52,10 @@ class BaseValidation:
         "required": ["label_level", "label_name", "label_value"],
     }
 
+    search_mode = {
+        "type": ["string", "null"],
+        "enum": [e.value for e in SearchMode] + [None],
+    }
     verified_status = {
         "type": "string",
         "enum": [e.value for e in VerificationSearchMode],
@@ -53,7 +65,22 @@ class BaseValidation:
         "enum": [e.value for e in VerificationTypeSearchMode] + [None],
     }
 
-    file_type = {"type": ["string"], "enum": [e.value for e in ImportType]}
+    file_type = {
+        "type": ["string"],
+        "enum": [ImportType.CSV.value, ImportType.DF.value],
+    }
+    upload_file_type = {
+        "type": "string",
+        "enum": [
+            ImportType.PARQUET.value,
+            ImportType.ARROW.value,
+            ImportType.NDJSON.value,
+        ],
+    }
+    export_format = {"type": "string", "enum": [e.value for e in ExportFormat]}
+    vector_format = {"type": "string", "enum": [e.value for e in VectorFormat]}
+    agreement_metric = {"type": "string", "enum": [e.value for e in AgreementMetric]}
+    projection_method = {"type": "string", "enum": [e.value for e in ProjectionMethod]}
     column_mapping = {
         "type": "object",
         "properties": {"id": {"type": "string"}, "content": {"type": "string"}},
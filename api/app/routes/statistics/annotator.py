@@ -1,10 +1,24 @@
-from app.constants import d7validate
+from app.constants import d7compile, d7validate
 from app.decorators import require_role
+from app.enums.agreement_metric import AgreementMetric
 from app.flask_app import app, project
 from app.routes.json_validation.base import BaseValidation
 from flask import jsonify, make_response, request
 
 
+GET_ANNOTATOR_CONTRIBUTION_VALIDATION = d7compile(
+    {
+        "properties": {
+            "label_name": BaseValidation.string,
+            "annotator_list": {
+                **BaseValidation.array_or_none,
+                "items": BaseValidation.string,
+            },
+        }
+    }
+)
+
+
 @app.get("/statistics/annotator/contributions")
 @require_role("administrator")
 def get_annotator_contribution():
@@ -12,44 +26,39 @@ def get_annotator_contribution():
         "label_name": request.json.get("label_name", ""),
         "annotator_list": request.json.get("annotator_list", []),
     }
-    d7validate(
-        {
-            "properties": {
-                "label_name": BaseValidation.string,
-                "annotator_list": {
-                    **BaseValidation.array_or_none,
-                    "items": BaseValidation.string,
-                },
-            }
-        },
-        payload,
-    )
+    d7validate(GET_ANNOTATOR_CONTRIBUTION_VALIDATION, payload)
     result = project.get_statistics().get_annotator_contributions(
         label_name=payload["label_name"], annotator_list=payload["annotator_list"]
     )
     return make_response(jsonify(result), 200)
 
 
+GET_ANNOTATOR_AGREEMENT_VALIDATION = d7compile(
+    {
+        "properties": {
+            "label_name": BaseValidation.string,
+            "annotator_list": {
+                **BaseValidation.array_or_none,
+                "items": BaseValidation.string,
+            },
+            "metric": BaseValidation.agreement_metric,
+        }
+    }
+)
+
+
 @app.get("/statistics/annotator/agreements")
 @require_role("administrator")
 def get_annotator_agreement():
     payload = {
         "label_name": request.json.get("label_name", ""),
         "annotator_list": request.json.get("annotator_list", []),
+        "metric": request.json.get("metric", AgreementMetric.COHEN_KAPPA.value),
     }
-    d7validate(
-        {
-            "properties": {
-                "label_name": BaseValidation.string,
-                "annotator_list": {
-                    **BaseValidation.array_or_none,
-                    "items": BaseValidation.string,
-                },
-            }
-        },
-        payload,
-    )
+    d7validate(GET_ANNOTATOR_AGREEMENT_VALIDATION, payload)
     result = project.get_statistics().get_annotator_agreements(
-        label_name=payload["label_name"], annotator_list=payload["annotator_list"]
+        label_name=payload["label_name"],
+        annotator_list=payload["annotator_list"],
+        metric=payload["metric"],
     )
     return make_response(jsonify(result), 200)
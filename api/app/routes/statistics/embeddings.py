@@ -1,30 +1,43 @@
-from app.constants import d7validate
+from app.constants import d7compile, d7validate
 from app.decorators import require_role
+from app.enums.projection_method import ProjectionMethod
+from app.enums.projection_status import ProjectionStatus
 from app.flask_app import app, project
 from app.routes.json_validation.base import BaseValidation
 from flask import abort, jsonify, make_response, request
 
 
+GET_EMBEDDINGS_VALIDATION = d7compile(
+    {
+        "properties": {
+            "embed_type": {"type": "string", "minLength": 1},
+            "label_name": {**BaseValidation.string, "minLength": 1},
+            "method": BaseValidation.projection_method,
+        }
+    }
+)
+
+
 @app.get("/statistics/embeddings/<embed_type>")
 @require_role("administrator")
 def get_embeddings(embed_type: str = None):
     payload = {
         "embed_type": embed_type,
         "label_name": request.json.get("label_name", None),
+        "method": request.json.get("method", ProjectionMethod.TSNE.value),
     }
-    d7validate(
-        {
-            "properties": {
-                "embed_type": {"type": "string", "minLength": 1},
-                "label_name": {**BaseValidation.string, "minLength": 1},
-            }
-        },
-        payload,
-    )
+    d7validate(GET_EMBEDDINGS_VALIDATION, payload)
     try:
-        result = project.get_statistics().get_embedding_aggregated_label(
-            label_name=payload["label_name"], embedding_type=payload["embed_type"]
+        status, result = project.get_statistics().get_embedding_aggregated_label(
+            label_name=payload["label_name"],
+            embedding_type=payload["embed_type"],
+            method=payload["method"],
         )
+        if status == ProjectionStatus.COMPUTING:
+            # served from the previous projection, if any, while refreshing
+            return make_response(
+                jsonify({"status": status.value, "result": result}), 202
+            )
         return make_response(jsonify(result), 200)
     except ValueError as ex:
         return make_response(str(ex), 400)
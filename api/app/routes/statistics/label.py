@@ -1,6 +1,7 @@
 from app.constants import (
     DEFAULT_STATISTIC_LABEL_DISTRIBUTION_AGGREGATION_FUNCTION,
     SUPPORTED_AGGREGATION_FUNCTIONS,
+    d7compile,
     d7validate,
 )
 from app.decorators import require_role
@@ -16,6 +17,28 @@ def get_label_progress():
     return make_response(jsonify(result), 200)
 
 
+GET_LABEL_DISTRIBUTIONS_VALIDATION = d7compile(
+    {
+        "properties": {
+            "label_name": {**BaseValidation.string, "minLength": 1},
+            "annotator_list": {
+                **BaseValidation.array_or_none,
+                "items": BaseValidation.string,
+            },
+            "aggregation": {
+                "type": "string",
+                "enum": SUPPORTED_AGGREGATION_FUNCTIONS,
+            },
+            "include_unlabeled": {"type": "boolean"},
+            "annotator_weights": {
+                "type": ["object", "null"],
+                "additionalProperties": {"type": "number", "minimum": 0},
+            },
+        }
+    }
+)
+
+
 @app.get("/statistics/label/distributions")
 @require_role("administrator")
 def get_label_distributions():
@@ -26,28 +49,14 @@ def get_label_distributions():
             "aggregation", DEFAULT_STATISTIC_LABEL_DISTRIBUTION_AGGREGATION_FUNCTION
         ),
         "include_unlabeled": request.json.get("include_unlabeled", False),
+        "annotator_weights": request.json.get("annotator_weights", None),
     }
-    d7validate(
-        {
-            "properties": {
-                "label_name": {**BaseValidation.string, "minLength": 1},
-                "annotator_list": {
-                    **BaseValidation.array_or_none,
-                    "items": BaseValidation.string,
-                },
-                "aggregation": {
-                    "type": "string",
-                    "enum": SUPPORTED_AGGREGATION_FUNCTIONS,
-                },
-                "include_unlabeled": {"type": "boolean"},
-            }
-        },
-        payload,
-    )
+    d7validate(GET_LABEL_DISTRIBUTIONS_VALIDATION, payload)
     result = project.get_statistics().get_label_distributions(
         label_name=payload["label_name"],
         annotator_list=payload["annotator_list"],
         aggregation=payload["aggregation"],
         include_unlabeled=payload["include_unlabeled"],
+        annotator_weights=payload["annotator_weights"],
     )
     return make_response(jsonify(result), 200)
@@ -1,13 +1,25 @@
 import pydash
-from app.constants import d7validate
+from app.constants import d7compile, d7validate
 from app.core.subset import Subset
-from app.core.utils import ValueNotExistsError
+from app.core.utils import InvalidLabelError, ValueNotExistsError
 from app.decorators import require_role
 from app.flask_app import app, project
 from app.routes.json_validation.base import BaseValidation
 from flask import abort, jsonify, make_response, request
 
 
+SET_VERIFICATION_DATA_VALIDATION = d7compile(
+    {
+        "properties": {
+            "labels": {"type": "array", "items": BaseValidation.label},
+            "label_name": BaseValidation.string,
+            "label_level": BaseValidation.label_level,
+            "annotator_id": BaseValidation.string,
+        }
+    }
+)
+
+
 @app.route("/verifications/<string:record_uuid>/labels", methods=["POST"])
 @require_role(["administrator", "contributor"])
 def set_verification_data(record_uuid):
@@ -22,17 +34,7 @@ def set_verification_data(record_uuid):
             return make_response(
                 "Bad request: only supporting 'label_level=record'.", 400
             )
-        d7validate(
-            {
-                "properties": {
-                    "labels": {"type": "array", "items": BaseValidation.label},
-                    "label_name": BaseValidation.string,
-                    "label_level": BaseValidation.label_level,
-                    "annotator_id": BaseValidation.string,
-                }
-            },
-            payload,
-        )
+        d7validate(SET_VERIFICATION_DATA_VALIDATION, payload)
         if any([pydash.is_none(l["label_value"]) for l in payload["labels"]]):
             return make_response("Bad request: 'label_value' is missing.", 400)
 
@@ -54,5 +56,7 @@ def set_verification_data(record_uuid):
         )
     except KeyError as ex:
         return make_response(f"Bad request: {ex} is missing.", 400)
+    except InvalidLabelError as ex:
+        return make_response(str(ex), 400)
     except Exception as ex:
         abort(500, ex)
@@ -1,4 +1,4 @@
-from app.constants import d7validate
+from app.constants import d7compile, d7validate
 from app.core.subset import Subset
 from app.decorators import require_role
 from app.flask_app import app, project
@@ -6,25 +6,31 @@ from app.routes.json_validation.base import BaseValidation
 from flask import abort, jsonify, make_response, request
 
 
-def merge_views(view1, view2):
-    """
-    Utility function to merge two views of the same
-    subset.
-    Parameters
-    -------------
-    view1: list of object
-    view2: list of object
-        both views are list of objects where there's
-        a mandatory field 'uuid' representing record_uuid
-        The order of records should match.
-    Return: a single list of objects, each item being one record
-        and its views.
-    """
-    result = []
-    for i, j in zip(view1, view2):
-        assert i["uuid"] == j["uuid"]
-        result.append({**i, **j})
-    return result
+GET_ANNOTATION_LIST_VALIDATION = d7compile(
+    {
+        "properties": {
+            "record_id": BaseValidation.boolean,
+            "record_content": BaseValidation.boolean,
+            "record_meta_names": {
+                "type": ["array", "null"],
+                "items": {"type": BaseValidation.string},
+            },
+            "uuid_list": {**BaseValidation.uuid_list, "type": ["array", "null"]},
+            "annotator_list": {
+                "type": ["array", "null"],
+                "items": BaseValidation.string,
+            },
+            "label_names": {
+                "type": ["array", "null"],
+                "items": BaseValidation.string,
+            },
+            "label_meta_names": {
+                "type": ["array", "null"],
+                "items": BaseValidation.string,
+            },
+        }
+    }
+)
 
 
 @app.route("/annotations", methods=["GET"])
@@ -40,49 +46,35 @@ def get_annotation_list():
         "label_meta_names": request.json.get("label_meta_names", None),
     }
 
-    d7validate(
-        {
-            "properties": {
-                "record_id": BaseValidation.boolean,
-                "record_content": BaseValidation.boolean,
-                "record_meta_names": {
-                    "type": ["array", "null"],
-                    "items": {"type": BaseValidation.string},
-                },
-                "uuid_list": {**BaseValidation.uuid_list, "type": ["array", "null"]},
-                "annotator_list": {
-                    "type": ["array", "null"],
-                    "items": BaseValidation.string,
-                },
-                "label_names": {
-                    "type": ["array", "null"],
-                    "items": BaseValidation.string,
-                },
-                "label_meta_names": {
-                    "type": ["array", "null"],
-                    "items": BaseValidation.string,
-                },
-            }
-        },
-        payload,
-    )
+    d7validate(GET_ANNOTATION_LIST_VALIDATION, payload)
     subset = Subset(project=project, data_uuids=payload["uuid_list"])
-    view1 = subset.get_view_record(
+    result = subset.get_view_record_annotation(
         record_id=payload["record_id"],
         record_content=payload["record_content"],
         record_meta_names=payload["record_meta_names"],
-    )
-
-    view2 = subset.get_view_annotation(
         annotator_list=payload["annotator_list"],
         label_names=payload["label_names"],
         label_meta_names=payload["label_meta_names"],
     )
-    result = merge_views(view1, view2)
 
     return make_response(jsonify(result), 200)
 
 
+GET_VIEW_RECORD_VALIDATION = d7compile(
+    {
+        "properties": {
+            "record_id": BaseValidation.boolean,
+            "record_content": BaseValidation.boolean,
+            "record_meta_names": {
+                "type": ["array", "null"],
+                "items": {"type": BaseValidation.string},
+            },
+            "uuid_list": {**BaseValidation.uuid_list, "type": ["array", "null"]},
+        }
+    }
+)
+
+
 @app.route("/view/record", methods=["GET"])
 @require_role(["administrator", "contributor", "job"])
 def get_view_record():
@@ -93,20 +85,7 @@ def get_view_record():
         "uuid_list": request.json.get("uuid_list", None),
     }
 
-    d7validate(
-        {
-            "properties": {
-                "record_id": BaseValidation.boolean,
-                "record_content": BaseValidation.boolean,
-                "record_meta_names": {
-                    "type": ["array", "null"],
-                    "items": {"type": BaseValidation.string},
-                },
-                "uuid_list": {**BaseValidation.uuid_list, "type": ["array", "null"]},
-            }
-        },
-        payload,
-    )
+    d7validate(GET_VIEW_RECORD_VALIDATION, payload)
 
     result = Subset(project=project, data_uuids=payload["uuid_list"]).get_view_record(
         record_id=payload["record_id"],
@@ -116,6 +95,27 @@ def get_view_record():
     return make_response(jsonify(result), 200)
 
 
+GET_VIEW_ANNOTATION_VALIDATION = d7compile(
+    {
+        "properties": {
+            "annotator_list": {
+                "type": ["array", "null"],
+                "items": BaseValidation.string,
+            },
+            "label_names": {
+                "type": ["array", "null"],
+                "items": BaseValidation.string,
+            },
+            "label_meta_names": {
+                "type": ["array", "null"],
+                "items": BaseValidation.string,
+            },
+            "uuid_list": {**BaseValidation.uuid_list, "type": ["array", "null"]},
+        }
+    }
+)
+
+
 @app.route("/view/annotation", methods=["GET"])
 @require_role(["administrator", "contributor", "job"])
 def get_view_annotation():
@@ -126,26 +126,7 @@ def get_view_annotation():
         "uuid_list": request.json.get("uuid_list", None),
     }
 
-    d7validate(
-        {
-            "properties": {
-                "annotator_list": {
-                    "type": ["array", "null"],
-                    "items": BaseValidation.string,
-                },
-                "label_names": {
-                    "type": ["array", "null"],
-                    "items": BaseValidation.string,
-                },
-                "label_meta_names": {
-                    "type": ["array", "null"],
-                    "items": BaseValidation.string,
-                },
-                "uuid_list": {**BaseValidation.uuid_list, "type": ["array", "null"]},
-            }
-        },
-        payload,
-    )
+    d7validate(GET_VIEW_ANNOTATION_VALIDATION, payload)
 
     result = Subset(
         project=project, data_uuids=payload["uuid_list"]
@@ -157,6 +138,26 @@ def get_view_annotation():
     return make_response(jsonify(result), 200)
 
 
+GET_VIEW_VERIFICATIONS_VALIDATION = d7compile(
+    {
+        "properties": {
+            "label_name": BaseValidation.string,
+            "label_level": BaseValidation.string,
+            "annotator": BaseValidation.string,
+            "verifier_filter": {
+                "type": ["array", "null"],
+                "items": BaseValidation.string,
+            },
+            "status_filter": {
+                **BaseValidation.verified_type,
+                "type": ["string", "null"],
+            },
+            "uuid_list": {**BaseValidation.uuid_list, "type": ["array", "null"]},
+        }
+    }
+)
+
+
 @app.route("/view/verifications", methods=["GET"])
 @require_role(["administrator", "contributor", "job"])
 def get_view_verifications():
@@ -169,25 +170,7 @@ def get_view_verifications():
         "uuid_list": request.json.get("uuid_list", None),
     }
 
-    d7validate(
-        {
-            "properties": {
-                "label_name": BaseValidation.string,
-                "label_level": BaseValidation.string,
-                "annotator": BaseValidation.string,
-                "verifier_filter": {
-                    "type": ["array", "null"],
-                    "items": BaseValidation.string,
-                },
-                "status_filter": {
-                    **BaseValidation.verified_type,
-                    "type": ["string", "null"]
-                },
-                "uuid_list": {**BaseValidation.uuid_list, "type": ["array", "null"]},
-            }
-        },
-        payload,
-    )
+    d7validate(GET_VIEW_VERIFICATIONS_VALIDATION, payload)
 
     try:
         result = Subset(
@@ -204,17 +187,20 @@ def get_view_verifications():
         abort(500, ex)
 
 
+GET_RECONCILIATION_DATA_VALIDATION = d7compile(
+    {"properties": {"uuid_list": BaseValidation.uuid_list}}
+)
+
+
 @app.route("/reconciliations", methods=["GET"])
 @require_role(["administrator", "contributor"])
 def get_reconciliation_data():
     payload = {"uuid_list": request.json.get("uuid_list", None)}
-    d7validate({"properties": {"uuid_list": BaseValidation.uuid_list}}, payload)
+    d7validate(GET_RECONCILIATION_DATA_VALIDATION, payload)
 
     subset = Subset(project=project, data_uuids=payload["uuid_list"])
 
-    view1 = subset.get_view_record()
-    view2 = subset.get_view_annotation()
-    result = merge_views(view1, view2)
+    result = subset.get_view_record_annotation()
     return make_response(jsonify(result), 200)
 
 
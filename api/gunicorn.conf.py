@@ -1,5 +1,6 @@
 import multiprocessing
 import os
+import shutil
 
 capture_output = True
 accesslog = "-"
@@ -7,6 +8,30 @@ access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"
 errorlog = "-"
 # min 2 cores, cpu_count() = # of cores * 2
 workers = min(multiprocessing.cpu_count(), 4) + 1
+# requests mostly wait on the auth service and Neo4j: each worker serves
+# them on a pool of threads sharing its connection pools and caches
+# (MEGANNO_WORKER_THREADS=1 for synchronous workers)
+threads = int(os.getenv("MEGANNO_WORKER_THREADS", 4))
+worker_class = "gthread" if threads > 1 else "sync"
 MEGANNO_SERVICE_PORT = os.getenv("MEGANNO_SERVICE_PORT", 5001)
 bind = [f"0.0.0.0:{MEGANNO_SERVICE_PORT}", "0.0.0.0:43258"]
 preload_app = True
+# metrics of all workers are written to files of this directory and summed
+# on scrape; it is set before the app is loaded and emptied on each start
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/meganno_api_metrics")
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def post_fork(server, worker):
+    # background threads do not survive the fork of a preloaded app
+    from app.flask_app import import_manager
+
+    import_manager.start()
+
+
+def child_exit(server, worker):
+    # gauges of dead workers are left out of the live sums
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,12 +1,13 @@
 import os
 
-from app.flask_app import app
+from app.flask_app import app, import_manager
 
 MEGANNO_FLASK_HOST = os.getenv("MEGANNO_FLASK_HOST", None)
 MEGANNO_SERVICE_PORT = os.getenv("MEGANNO_SERVICE_PORT", 5000)
 APP_ENVIRONMENT = os.getenv("MEGANNO_FLASK_ENV", "production")
 debug = APP_ENVIRONMENT != "production"
 if __name__ == "__main__":
+    import_manager.start()
     if MEGANNO_FLASK_HOST is None:
         app.run(debug=debug, port=MEGANNO_SERVICE_PORT)
     else:
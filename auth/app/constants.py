@@ -24,19 +24,155 @@ class InvalidRequestJson(Exception):
             self.status_code = status_code
 
 
+# the validation compiler below is the same in api/app/constants.py
+# (the services are built separately), tests/core_test/test_validation.py
+# checks both copies against Draft7Validator
+__JSON_TYPE_CHECKS = {
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: (isinstance(value, int) and not isinstance(value, bool))
+    or (isinstance(value, float) and value.is_integer()),
+    "number": lambda value: isinstance(value, (int, float))
+    and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None,
+    "array": lambda value: isinstance(value, list),
+    "object": lambda value: isinstance(value, dict),
+}
+# draft 7 keywords evaluated by compiled checks; 'format' is not asserted
+# by Draft7Validator without a format checker
+__COMPILED_KEYWORDS = [
+    "type",
+    "enum",
+    "properties",
+    "additionalProperties",
+    "items",
+    "required",
+    "minimum",
+    "maximum",
+    "minLength",
+    "maxLength",
+    "format",
+]
+
+
+def __bound_check(applies, measure, operator, bound):
+    if operator == ">=":
+        return lambda value: not applies(value) or measure(value) >= bound
+    return lambda value: not applies(value) or measure(value) <= bound
+
+
+def compile_schema(schema):
+    """
+    Compile a JSON schema into a predicate equivalent to
+    Draft7Validator(schema).is_valid, without building validation errors.
+    Sub-schemas using other keywords fall back to Draft7Validator.
+    """
+    fallback = Draft7Validator(schema).is_valid
+    if not isinstance(schema, dict):
+        return fallback
+    for keyword in schema:
+        if keyword in Draft7Validator.VALIDATORS and keyword not in __COMPILED_KEYWORDS:
+            return fallback
+    checks = []
+    if "type" in schema:
+        types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        if any([item not in __JSON_TYPE_CHECKS for item in types]):
+            return fallback
+        type_checks = [__JSON_TYPE_CHECKS[item] for item in types]
+        checks.append(lambda value: any(check(value) for check in type_checks))
+    if "enum" in schema:
+        if not all([item is None or isinstance(item, str) for item in schema["enum"]]):
+            return fallback
+        enum = set(schema["enum"])
+        checks.append(
+            lambda value: (value is None or isinstance(value, str)) and value in enum
+        )
+    if "properties" in schema or "additionalProperties" in schema:
+        properties = {
+            name: compile_schema(item)
+            for name, item in schema.get("properties", {}).items()
+        }
+        additional = schema.get("additionalProperties", True)
+        if isinstance(additional, dict):
+            additional = compile_schema(additional)
+
+        def check_properties(value):
+            if not isinstance(value, dict):
+                return True
+            for name, item in value.items():
+                if name in properties:
+                    if not properties[name](item):
+                        return False
+                elif additional is False:
+                    return False
+                elif additional is not True and not additional(item):
+                    return False
+            return True
+
+        checks.append(check_properties)
+    if "items" in schema:
+        if not isinstance(schema["items"], dict):
+            return fallback
+        items = compile_schema(schema["items"])
+        checks.append(
+            lambda value: not isinstance(value, list)
+            or all(items(item) for item in value)
+        )
+    if "required" in schema:
+        required = list(schema["required"])
+        checks.append(
+            lambda value: not isinstance(value, dict)
+            or all(name in value for name in required)
+        )
+    is_number = __JSON_TYPE_CHECKS["number"]
+    is_string = __JSON_TYPE_CHECKS["string"]
+    if "minimum" in schema:
+        checks.append(__bound_check(is_number, lambda v: v, ">=", schema["minimum"]))
+    if "maximum" in schema:
+        checks.append(__bound_check(is_number, lambda v: v, "<=", schema["maximum"]))
+    if "minLength" in schema:
+        checks.append(__bound_check(is_string, len, ">=", schema["minLength"]))
+    if "maxLength" in schema:
+        checks.append(__bound_check(is_string, len, "<=", schema["maxLength"]))
+    return lambda value: all(check(value) for check in checks)
+
+
+class CompiledValidation:
+    """
+    Request payload validation compiled once, e.g. at route declaration.
+    Valid payloads only go through the compiled checks; errors are
+    collected with Draft7Validator when the payload is invalid.
+    """
+
+    def __init__(self, validations):
+        self.schema = {"type": "object", "additionalProperties": False, **validations}
+        self.validator = Draft7Validator(self.schema)
+        self.is_valid = compile_schema(self.schema)
+
+    def validate(self, payload):
+        if self.is_valid(payload):
+            return
+        errors = {}
+        for error in sorted(self.validator.iter_errors(payload), key=str):
+            abs_path = list(error.absolute_path)
+            if len(abs_path) == 0:
+                abs_path = [""]
+            messages = pydash.objects.get(errors, abs_path, [])
+            messages.append(error.message)
+            pydash.objects.set_(errors, abs_path, messages)
+        if len(errors) > 0:
+            raise InvalidRequestJson(errors)
+
+
+def d7compile(validations):
+    return CompiledValidation(validations)
+
+
 def d7validate(validations, payload):
-    errors = {}
-    for error in sorted(
-        Draft7Validator(
-            {"type": "object", "additionalProperties": False, **validations}
-        ).iter_errors(payload),
-        key=str,
-    ):
-        abs_path = list(error.absolute_path)
-        if len(abs_path) == 0:
-            abs_path = [""]
-        messages = pydash.objects.get(errors, abs_path, [])
-        messages.append(error.message)
-        pydash.objects.set_(errors, abs_path, messages)
-    if len(errors) > 0:
-        raise InvalidRequestJson(errors)
+    """
+    Validate a request payload against a CompiledValidation
+    (see d7compile), or a validations dict compiled on the fly.
+    """
+    if not isinstance(validations, CompiledValidation):
+        validations = d7compile(validations)
+    validations.validate(payload)
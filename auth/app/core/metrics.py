@@ -0,0 +1,81 @@
+import os
+import time
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# path of the metrics endpoint, exempt from token verification
+METRICS_PATH = "/metrics"
+
+REQUESTS = Counter(
+    "meganno_http_requests", "HTTP requests", ["method", "route", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "meganno_http_request_duration_seconds",
+    "Seconds until the response of an HTTP request is returned",
+    ["method", "route"],
+)
+IN_FLIGHT = Gauge(
+    "meganno_http_requests_in_flight",
+    "HTTP requests being handled",
+    multiprocess_mode="livesum",
+)
+
+
+def is_multiprocess():
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+class Metrics:
+    """
+    Prometheus metrics of the requests to the service.
+    Under gunicorn, PROMETHEUS_MULTIPROC_DIR must be set before this module
+    is imported, so metrics are written to files shared by the workers and
+    summed at scrape time (see gunicorn.conf.py).
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # registered before the token verification, so rejected requests
+        # are measured too
+        app.before_request(self.__before_request)
+        app.after_request(self.__after_request)
+        app.teardown_request(self.__teardown_request)
+        app.add_url_rule(METRICS_PATH, "metrics", self.__metrics)
+
+    def __before_request(self):
+        g.metrics_start = time.perf_counter()
+        IN_FLIGHT.inc()
+
+    def __after_request(self, response):
+        if "metrics_start" in g:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUESTS.labels(request.method, route, response.status_code).inc()
+            REQUEST_LATENCY.labels(request.method, route).observe(
+                time.perf_counter() - g.metrics_start
+            )
+        return response
+
+    def __teardown_request(self, exception=None):
+        if g.pop("metrics_start", None) is not None:
+            IN_FLIGHT.dec()
+
+    def __metrics(self):
+        if is_multiprocess():
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -1,3 +1,5 @@
+import hashlib
+import hmac
 import os
 import secrets
 import uuid
@@ -13,6 +15,9 @@ MEGANNO_ENCRYPTION_KEY = os.getenv("MEGANNO_ENCRYPTION_KEY", None)
 if pydash.is_empty(MEGANNO_ENCRYPTION_KEY):
     raise Exception("Missing required envrionment variable: MEGANNO_ENCRYPTION_KEY.")
 f = Fernet(MEGANNO_ENCRYPTION_KEY)
+# shared secret of the services reading the revocation feed; if not set,
+# the feed is not served
+MEGANNO_SERVICE_TOKEN = os.getenv("MEGANNO_SERVICE_TOKEN", "")
 
 
 def encrypt(string):
@@ -21,6 +26,22 @@ def encrypt(string):
     return f.encrypt(string)
 
 
+def hash_identifier(identifier: str):
+    """
+    one-way hash of a user_id/session_id shared with services caching verified tokens
+    """
+    return hashlib.sha256(str.encode(identifier)).hexdigest()
+
+
+def verify_service_token(token: str):
+    """
+    check a token against MEGANNO_SERVICE_TOKEN (in constant time)
+    """
+    if pydash.is_empty(MEGANNO_SERVICE_TOKEN) or pydash.is_empty(token):
+        return False
+    return hmac.compare_digest(str.encode(token), str.encode(MEGANNO_SERVICE_TOKEN))
+
+
 def decrypt(string):
     if type(string) is not bytes:
         string = str.encode(string)
@@ -114,6 +135,11 @@ def verify_token(token: str):
             if token.expires_on.replace(tzinfo=timezone.utc) > datetime.now(
                 timezone.utc
             ) and bcrypt.checkpw(str.encode(decrypted_payload), str.encode(token.hash)):
-                return {"user_id": token.user_id, "id_token": token.id_token}
+                return {
+                    "user_id": token.user_id,
+                    "id_token": token.id_token,
+                    "session_id": token.session_id,
+                    "expires_on": token.expires_on.replace(tzinfo=timezone.utc),
+                }
     except Exception:
         return None
@@ -13,6 +13,7 @@ from app.constants import bcolors
 from app.database.sqlite.dao.roleDao import RoleDao
 from app.database.sqlite.dao.userDao import UserDao
 from app.database.sqlite.dto.invitationDto import InvitationDto
+from app.database.sqlite.dto.revocationDto import RevocationDto
 from app.database.sqlite.dto.roleDto import RoleDto
 from app.database.sqlite.dto.tokenDto import TokenDto
 from app.database.sqlite.dto.userDto import UserDto
@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+
+from app.database.sqlite import database
+from app.database.sqlite.dto.revocationDto import RevocationDto
+
+
+class RevocationDao:
+    def add(user_id: str, session_id: str = None):
+        """
+        record a revocation, so services caching verified tokens can drop them
+        Parameters
+        ----------
+        user_id : str
+        session_id : str
+            session of the revoked token; if None, all tokens of the user are revoked
+        """
+        revocation = RevocationDto(
+            user_id=user_id,
+            session_id=session_id,
+            created_on=datetime.now(timezone.utc),
+        )
+        database.session.add(revocation)
+        database.session.commit()
+        return revocation
+
+    def list_revocations(after: int):
+        """
+        get revocations recorded after a given id, oldest first
+        Parameters
+        ----------
+        after : int
+            id (primary key) of the last revocation already seen
+        """
+        return (
+            RevocationDto.query.filter(RevocationDto.id > after)
+            .order_by(RevocationDto.id.asc())
+            .all()
+        )
@@ -62,3 +62,12 @@ class UserDao:
         return UserDto.query.filter(
             UserDto.user_id == user_id,
         ).one_or_none()
+
+    def list_disabled_user_ids():
+        """
+        get user_ids of all disabled accounts
+        """
+        return [
+            user.user_id
+            for user in UserDto.query.filter(UserDto.enabled == False).all()
+        ]
@@ -0,0 +1,10 @@
+from app.database.sqlite import database
+from sqlalchemy import Column, DateTime, Integer, String
+
+
+class RevocationDto(database.Model):
+    __tablename__ = "revocations"
+    id = Column("id", Integer, primary_key=True)
+    user_id = Column(String(36))
+    session_id = Column(String(36))
+    created_on = Column(DateTime(timezone=True))
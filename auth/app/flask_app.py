@@ -42,12 +42,15 @@ if MEGANNO_LOGGING:
     errorLogHandler.setFormatter(formatter)
     traffic_logger.addHandler(trafficLogHandler)
     error_logger.addHandler(errorLogHandler)
-from app.core.tokens import verify_token
+from app.core.metrics import METRICS_PATH, Metrics
+from app.core.tokens import hash_identifier, verify_token
 from app.database.sqlite.dao.roleDao import RoleDao
 from app.database.sqlite.dao.userDao import UserDao
 from app.database.sqlite.dto.roleDto import RoleDto
 from app.database.sqlite.dto.userDto import UserDto
 
+metrics = Metrics(app)
+
 
 @app.errorhandler(404)
 def not_found_error(error):
@@ -96,19 +99,30 @@ def token_verification():
             },
             200,
         )
-    IGNORE_PATH = ["/users/signin", "/users/register"]
+    IGNORE_PATH = [
+        "/users/signin",
+        "/users/register",
+        "/tokens/revocations",
+        METRICS_PATH,
+    ]
     log = f"{request.method} {request.path}"
     if request.path not in IGNORE_PATH:
         # verify token
         token = verify_token(str(request.json.get("token", "")))
         if pydash.is_none(token):
             abort(401, "Invalid token.")
+        # let services caching this verification expire and revoke it in time
+        token_cache_fields = {
+            "expires_on": int(token["expires_on"].timestamp()),
+            "session_hash": hash_identifier(token["session_id"]),
+        }
         if str(token["user_id"]).startswith("job_"):
             request.user = {
                 "username": token["user_id"],
                 "user_id": token["user_id"],
                 "id_token": token["id_token"],
                 "role_code": "job",
+                **token_cache_fields,
             }
         else:
             user: UserDto = UserDao.get_user_by_user_id(token["user_id"])
@@ -128,6 +142,7 @@ def token_verification():
                     "user_id": token["user_id"],
                     "id_token": token["id_token"],
                     "role_code": pydash.objects.get(role, "code", None),
+                    **token_cache_fields,
                 }
             except Exception as ex:
                 abort(500, ex)
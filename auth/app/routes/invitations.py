@@ -3,7 +3,7 @@ from datetime import datetime, timedelta, timezone
 from secrets import token_urlsafe
 
 import pydash
-from app.constants import d7validate
+from app.constants import d7compile, d7validate
 from app.database.sqlite.dao.invitationDao import InvitationDao
 from app.database.sqlite.dao.roleDao import RoleDao
 from app.database.sqlite.dto.invitationDto import InvitationDto
@@ -14,11 +14,16 @@ from app.json_validation.base import BaseValidation
 from flask import jsonify, make_response, request
 
 
+GET_INVITATIONS_VALIDATION = d7compile(
+    {"properties": {"active": BaseValidation.boolean_or_none}}
+)
+
+
 @app.get("/invitations")
 @require_role("administrator")
 def get_invitations():
     payload = {"active": request.json.get("active", None)}
-    d7validate({"properties": {"active": BaseValidation.boolean_or_none}}, payload)
+    d7validate(GET_INVITATIONS_VALIDATION, payload)
     invitations: list[InvitationDto] = InvitationDao.get_invitations(
         active=payload["active"]
     )
@@ -46,11 +51,16 @@ def get_invitations():
     return make_response(jsonify(result))
 
 
+GET_INVITATION_BY_INVITATION_CODE_VALIDATION = d7compile(
+    {"properties": {"invitation_code": BaseValidation.string}}
+)
+
+
 @app.get("/invitations/<invitation_code>")
 @require_role("administrator")
 def get_invitation_by_invitation_code(invitation_code):
     payload = {"invitation_code": invitation_code}
-    d7validate({"properties": {"invitation_code": BaseValidation.string}}, payload)
+    d7validate(GET_INVITATION_BY_INVITATION_CODE_VALIDATION, payload)
     invitation: InvitationDto = InvitationDao.get_invitation_by_invitation_code(
         payload["invitation_code"]
     )
@@ -74,6 +84,18 @@ def get_invitation_by_invitation_code(invitation_code):
     )
 
 
+CREATE_INVITATION_VALIDATION = d7compile(
+    {
+        "properties": {
+            "code": BaseValidation.string_or_none,
+            "single_use": BaseValidation.boolean,
+            "note": BaseValidation.string,
+            "role_code": BaseValidation.string,
+        }
+    }
+)
+
+
 @app.post("/invitations")
 @require_role("administrator")
 def create_invitation():
@@ -83,17 +105,7 @@ def create_invitation():
         "note": request.json.get("note", ""),
         "role_code": request.json.get("role_code", ""),
     }
-    d7validate(
-        {
-            "properties": {
-                "code": BaseValidation.string_or_none,
-                "single_use": BaseValidation.boolean,
-                "note": BaseValidation.string,
-                "role_code": BaseValidation.string,
-            }
-        },
-        payload,
-    )
+    d7validate(CREATE_INVITATION_VALIDATION, payload)
     try:
         prefix = str(int(time.time())) + "."
         # 10 characters (12 chars minus "==")
@@ -137,15 +149,15 @@ def create_invitation():
         return make_response(str(ex), 400)
 
 
+RENEW_INVITATION_VALIDATION = d7compile({"properties": {"id": BaseValidation.string}})
+
+
 @app.put("/invitations")
 @require_role("administrator")
 def renew_invitation():
     # extend the expiration time by 1 week
     payload = {"id": request.json.get("id", "")}
-    d7validate(
-        {"properties": {"id": BaseValidation.string}},
-        payload,
-    )
+    d7validate(RENEW_INVITATION_VALIDATION, payload)
     if not pydash.is_empty(payload["id"]):
         InvitationDao.update_invitation_by_id(
             id=payload["id"],
@@ -154,16 +166,18 @@ def renew_invitation():
     return make_response(jsonify({}), 200)
 
 
+INVALIDATE_INVITATION_VALIDATION = d7compile(
+    {"properties": {"id": BaseValidation.string}}
+)
+
+
 @app.delete("/invitations")
 @require_role("administrator")
 def invalidate_invitation():
     # does not allow update of invitation once created
     # only allow invalidation by marking it as expired
     payload = {"id": request.json.get("id", "")}
-    d7validate(
-        {"properties": {"id": BaseValidation.string}},
-        payload,
-    )
+    d7validate(INVALIDATE_INVITATION_VALIDATION, payload)
     if not pydash.is_empty(payload["id"]):
         InvitationDao.update_invitation_by_id(
             id=payload["id"], fields={"expires_on": datetime.now(timezone.utc)}
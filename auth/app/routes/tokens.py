@@ -1,7 +1,12 @@
+import hashlib
+
 import pydash
-from app.constants import d7validate
-from app.core.tokens import create_token
+from app.constants import d7compile, d7validate
+from app.core.tokens import create_token, hash_identifier, verify_service_token
+from app.database.sqlite.dao.revocationDao import RevocationDao
 from app.database.sqlite.dao.tokenDao import TokenDao
+from app.database.sqlite.dao.userDao import UserDao
+from app.database.sqlite.dto.revocationDto import RevocationDto
 from app.database.sqlite.dto.tokenDto import TokenDto
 from app.decorators import require_id_token, require_role
 from app.flask_app import app
@@ -9,15 +14,15 @@ from app.json_validation.base import BaseValidation
 from flask import abort, jsonify, make_response, request
 
 
+GET_TOKENS_VALIDATION = d7compile({"properties": {"job": BaseValidation.boolean}})
+
+
 @app.get("/tokens")
 @require_id_token()
 @require_role(["administrator", "contributor"])
 def get_tokens():
     payload = {"job": request.json.get("job", False)}
-    d7validate(
-        {"properties": {"job": BaseValidation.boolean}},
-        payload,
-    )
+    d7validate(GET_TOKENS_VALIDATION, payload)
     # retrieve all (job) tokens
     tokens: list[TokenDto] = TokenDao.list_tokens(
         request.user["user_id"], payload["job"], []
@@ -41,6 +46,17 @@ def get_tokens():
     )
 
 
+GENERATE_TOKEN_VALIDATION = d7compile(
+    {
+        "properties": {
+            "expiration_duration": BaseValidation.integer,
+            "note": BaseValidation.string,
+            "job": BaseValidation.boolean,
+        }
+    }
+)
+
+
 @app.post("/tokens")
 @require_role(["administrator", "contributor"])
 def generate_token():
@@ -49,16 +65,7 @@ def generate_token():
         "note": request.json.get("note", ""),
         "job": request.json.get("job", False),
     }
-    d7validate(
-        {
-            "properties": {
-                "expiration_duration": BaseValidation.integer,
-                "note": BaseValidation.string,
-                "job": BaseValidation.boolean,
-            }
-        },
-        payload,
-    )
+    d7validate(GENERATE_TOKEN_VALIDATION, payload)
     #  non id_token if job is True
     if request.user["id_token"] or payload["job"]:
         token = create_token(
@@ -72,19 +79,83 @@ def generate_token():
     abort(401, "Invalid token.")
 
 
+DELETE_TOKENS_VALIDATION = d7compile(
+    {"properties": {"ids": {"type": "array", "items": BaseValidation.string}}}
+)
+
+
 @app.delete("/tokens")
 @require_id_token()
 @require_role(["administrator", "contributor"])
 def delete_tokens():
     payload = {"ids": request.json.get("ids", [])}
-    d7validate(
-        {"properties": {"ids": {"type": "array", "items": BaseValidation.string}}},
-        payload,
-    )
+    d7validate(DELETE_TOKENS_VALIDATION, payload)
     if not pydash.is_empty(payload["ids"]):
         tokens: list[TokenDto] = TokenDao.list_tokens(
             request.user["user_id"], False, payload["ids"]
         )
         for token in tokens:
             TokenDao.delete_token_by(token.id)
+            RevocationDao.add(user_id=token.user_id, session_id=token.session_id)
     return make_response(jsonify(payload["ids"]), 200)
+
+
+GET_REVOCATIONS_VALIDATION = d7compile(
+    {
+        "properties": {
+            "after": BaseValidation.integer,
+            "disabled_digest": BaseValidation.string,
+        }
+    }
+)
+
+
+@app.get("/tokens/revocations")
+def get_revocations():
+    """
+    Feed of revoked tokens for services caching token verification, read
+    with the MEGANNO_SERVICE_TOKEN as a Bearer token (not a user token).
+    Revocations are returned after the 'after' id; the disabled users are
+    only returned when they changed since 'disabled_digest'.
+    """
+    authorization = request.headers.get("Authorization", "")
+    if not authorization.startswith("Bearer ") or not verify_service_token(
+        authorization[len("Bearer ") :]
+    ):
+        abort(401, "Invalid service token.")
+    payload = {
+        "after": request.args.get("after", 0, type=int),
+        "disabled_digest": request.args.get("disabled_digest", ""),
+    }
+    d7validate(GET_REVOCATIONS_VALIDATION, payload)
+    revocations: list[RevocationDto] = RevocationDao.list_revocations(
+        after=payload["after"]
+    )
+    disabled_users = sorted(
+        hash_identifier(user_id) for user_id in UserDao.list_disabled_user_ids()
+    )
+    disabled_digest = hashlib.sha256(str.encode(",".join(disabled_users))).hexdigest()
+    if disabled_digest == payload["disabled_digest"]:
+        disabled_users = []
+    return make_response(
+        jsonify(
+            {
+                "last_id": (
+                    revocations[-1].id if len(revocations) > 0 else payload["after"]
+                ),
+                "disabled_digest": disabled_digest,
+                "sessions": [
+                    hash_identifier(revocation.session_id)
+                    for revocation in revocations
+                    if not pydash.is_none(revocation.session_id)
+                ],
+                "users": [
+                    hash_identifier(revocation.user_id)
+                    for revocation in revocations
+                    if pydash.is_none(revocation.session_id)
+                ]
+                + disabled_users,
+            }
+        ),
+        200,
+    )
@@ -3,7 +3,7 @@ from datetime import datetime, timezone
 
 import bcrypt
 import pydash
-from app.constants import d7validate
+from app.constants import d7compile, d7validate
 from app.core.tokens import create_token
 from app.database.sqlite.dao.invitationDao import InvitationDao
 from app.database.sqlite.dao.userDao import UserDao
@@ -15,20 +15,22 @@ from flask import abort, jsonify, make_response, request
 from zxcvbn import zxcvbn
 
 
+GET_USERS_BY_UIDS_VALIDATION = d7compile(
+    {
+        "properties": {
+            "uids": {
+                "type": "array",
+                "items": BaseValidation.string,
+            }
+        }
+    }
+)
+
+
 @app.get("/users/uids")
 def get_users_by_uids():
     payload = {"uids": request.json.get("uids", [])}
-    d7validate(
-        {
-            "properties": {
-                "uids": {
-                    "type": "array",
-                    "items": BaseValidation.string,
-                }
-            }
-        },
-        payload,
-    )
+    d7validate(GET_USERS_BY_UIDS_VALIDATION, payload)
     users = {}
     for uid in payload["uids"]:
         user = UserDao.get_user_by_user_id(uid)
@@ -36,6 +38,17 @@ def get_users_by_uids():
     return make_response(jsonify(users), 200)
 
 
+REGISTER_VALIDATION = d7compile(
+    {
+        "properties": {
+            "invitation_code": BaseValidation.string,
+            "username": BaseValidation.string,
+            "password": BaseValidation.string,
+        }
+    }
+)
+
+
 @app.post("/users/register")
 def register():
     errors = {}
@@ -44,16 +57,7 @@ def register():
         "username": request.json.get("username", ""),
         "password": request.json.get("password", ""),
     }
-    d7validate(
-        {
-            "properties": {
-                "invitation_code": BaseValidation.string,
-                "username": BaseValidation.string,
-                "password": BaseValidation.string,
-            }
-        },
-        payload,
-    )
+    d7validate(REGISTER_VALIDATION, payload)
     # validate invitation_code
     invitation: InvitationDto = InvitationDao.get_invitation_by_invitation_code(
         invitation_code=payload["invitation_code"]
@@ -120,21 +124,23 @@ def authenticate():
     return make_response(jsonify(request.user), 200)
 
 
+SIGNIN_VALIDATION = d7compile(
+    {
+        "properties": {
+            "username": BaseValidation.string,
+            "password": BaseValidation.string,
+        }
+    }
+)
+
+
 @app.post("/users/signin")
 def signin():
     payload = {
         "username": request.json.get("username", ""),
         "password": request.json.get("password", ""),
     }
-    d7validate(
-        {
-            "properties": {
-                "username": BaseValidation.string,
-                "password": BaseValidation.string,
-            }
-        },
-        payload,
-    )
+    d7validate(SIGNIN_VALIDATION, payload)
     # retrieve user
     user: UserDto = UserDao.get_user_by_username(username=payload["username"])
     if not pydash.is_none(user) and not pydash.objects.get(user, "enabled", False):
@@ -1,5 +1,6 @@
 import multiprocessing
 import os
+import shutil
 
 capture_output = True
 accesslog = "-"
@@ -10,3 +11,15 @@ workers = min(multiprocessing.cpu_count(), 4) + 1
 MEGANNO_AUTH_PORT = os.getenv("MEGANNO_AUTH_PORT", 5001)
 bind = [f"0.0.0.0:{MEGANNO_AUTH_PORT}", "0.0.0.0:43259"]
 preload_app = True
+# metrics of all workers are written to files of this directory and summed
+# on scrape; it is set before the app is loaded and emptied on each start
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/meganno_auth_metrics")
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def child_exit(server, worker):
+    # gauges of dead workers are left out of the live sums
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
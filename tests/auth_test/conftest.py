@@ -0,0 +1,14 @@
+import os
+import secrets
+import sys
+
+from cryptography.fernet import Fernet
+
+# the auth service stores users in sqlite, no container is needed
+os.environ.setdefault("MEGANNO_ENCRYPTION_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("MEGANNO_ADMIN_PASSWORD", secrets.token_hex(16))
+os.environ.setdefault("MEGANNO_SERVICE_TOKEN", secrets.token_hex(16))
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../auth"))
+)
+from app.flask_app import app
@@ -0,0 +1,24 @@
+import pydash
+from conftest import app
+
+
+class TestMetricsService:
+    service = app.test_client()
+
+    def test_metrics_without_token(self):
+        response = self.service.get("/auth/metrics")
+        assert pydash.is_equal(response.status_code, 200)
+        assert response.content_type.startswith("text/plain")
+
+    def test_metrics_series(self):
+        response = self.service.post(
+            "/auth/users/authenticate", json={"token": "invalid"}
+        )
+        assert pydash.is_equal(response.status_code, 401)
+        body = self.service.get("/auth/metrics").get_data(True)
+        for series in [
+            'meganno_http_requests_total{method="POST",route="/users/authenticate",status="401"}',
+            "meganno_http_request_duration_seconds_bucket",
+            "meganno_http_requests_in_flight",
+        ]:
+            assert series in body, series
@@ -0,0 +1,31 @@
+import os
+
+import pydash
+from conftest import app
+
+
+class TestRevocationsService:
+    service = app.test_client()
+    headers = {"Authorization": f"Bearer {os.environ['MEGANNO_SERVICE_TOKEN']}"}
+
+    def test_revocations_without_service_token(self):
+        response = self.service.get("/auth/tokens/revocations")
+        assert pydash.is_equal(response.status_code, 401)
+        response = self.service.get(
+            "/auth/tokens/revocations", headers={"Authorization": "Bearer invalid"}
+        )
+        assert pydash.is_equal(response.status_code, 401)
+
+    def test_revocations_disabled_digest(self):
+        response = self.service.get("/auth/tokens/revocations", headers=self.headers)
+        assert pydash.is_equal(response.status_code, 200)
+        feed = response.get_json()
+        assert pydash.is_equal(feed["last_id"], 0)
+        # unchanged disabled users are not sent again
+        response = self.service.get(
+            "/auth/tokens/revocations",
+            headers=self.headers,
+            query_string={"disabled_digest": feed["disabled_digest"]},
+        )
+        assert pydash.is_equal(response.status_code, 200)
+        assert pydash.is_equal(response.get_json()["users"], [])
@@ -0,0 +1,93 @@
+"""
+Benchmark of inter-annotator agreement on synthetic labels.
+Compares Cohen's kappa of every pair of annotators with the per-pair
+python loop (previous get_annotator_agreements) against the vectorized
+engine, and times Fleiss' kappa and Krippendorff's alpha.
+The loop is timed on a subset of the records and extrapolated, as it takes
+minutes on the full data.
+
+    cd tests/
+    python benchmark/bench_agreement.py
+"""
+
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../api"))
+)
+from app.core.agreement import (
+    MISSING_CODE,
+    fleiss_kappa,
+    krippendorff_alpha,
+    pairwise_cohen_kappa,
+)
+from app.core.statistic import cohen_kappa
+
+ANNOTATORS = 50
+RECORDS = 100_000
+CATEGORIES = 5
+# share of records labeled by each annotator
+COVERAGE = 0.8
+# records of the subset the python loop is timed on
+LOOP_RECORDS = 2_000
+
+
+def make_codes(records, annotators, seed=0):
+    rng = np.random.default_rng(seed)
+    truth = rng.integers(0, CATEGORIES, size=(records, 1))
+    noise = rng.integers(0, CATEGORIES, size=(records, annotators))
+    codes = np.where(rng.random((records, annotators)) < 0.7, truth, noise)
+    codes[rng.random((records, annotators)) >= COVERAGE] = MISSING_CODE
+    return codes.astype(np.int32)
+
+
+def loop_cohen_kappa(codes):
+    labels = [
+        ["NULL" if code == MISSING_CODE else str(code) for code in column]
+        for column in codes.T.tolist()
+    ]
+    return {
+        f"{an1},{an2}": cohen_kappa(labels[an1], labels[an2])
+        for an1, an2 in itertools.product(range(len(labels)), range(len(labels)))
+    }
+
+
+def vectorized_cohen_kappa(codes):
+    codes = np.where(codes == MISSING_CODE, CATEGORIES, codes)
+    return pairwise_cohen_kappa(codes, CATEGORIES + 1)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    codes = make_codes(RECORDS, ANNOTATORS)
+    print(f"{ANNOTATORS} annotators x {RECORDS} records, {CATEGORIES} categories")
+
+    subset = codes[:LOOP_RECORDS]
+    loop, loop_seconds = timed(loop_cohen_kappa, subset)
+    kappa, _ = timed(vectorized_cohen_kappa, subset)
+    difference = max(
+        abs(loop[f"{an1},{an2}"] - kappa[an1, an2])
+        for an1, an2 in itertools.product(range(ANNOTATORS), range(ANNOTATORS))
+    )
+    loop_seconds *= RECORDS / LOOP_RECORDS
+    print(f"{'cohen_kappa (python loop, extrapolated)':<42} {loop_seconds:>10.2f} s")
+
+    kappa, seconds = timed(vectorized_cohen_kappa, codes)
+    print(
+        f"{'cohen_kappa (vectorized)':<42} {seconds:>10.2f} s"
+        f"  {loop_seconds / seconds:>7.1f}x, max difference {difference:.1e}"
+    )
+    value, seconds = timed(fleiss_kappa, codes, CATEGORIES)
+    print(f"{'fleiss_kappa':<42} {seconds:>10.2f} s  {value:.4f}")
+    value, seconds = timed(krippendorff_alpha, codes, CATEGORIES)
+    print(f"{'krippendorff_alpha':<42} {seconds:>10.2f} s  {value:.4f}")
@@ -0,0 +1,114 @@
+"""
+Micro-benchmark of request payload validation for /annotations/batch.
+Compares building a Draft7Validator and collecting errors on every request
+(previous d7validate) with a validation compiled once (d7compile).
+
+    cd tests/
+    python benchmark/bench_validation.py
+"""
+
+import os
+import sys
+import timeit
+import uuid
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../api"))
+)
+from app.constants import d7compile
+from app.routes.json_validation.base import BaseValidation
+from jsonschema import Draft7Validator
+
+# same as the /annotations/batch route
+VALIDATIONS = {
+    "properties": {
+        "annotation_list": {
+            "type": ["array", "null"],
+            "items": {
+                "type": "object",
+                "properties": {
+                    "labels": {
+                        "type": "object",
+                        "properties": {
+                            "labels_span": {
+                                "type": ["array", "null"],
+                                "items": BaseValidation.label,
+                            },
+                            "labels_record": {
+                                "type": ["array", "null"],
+                                "items": BaseValidation.label,
+                            },
+                        },
+                        "additionalProperties": True,
+                    },
+                    "record_uuid": BaseValidation.uuid,
+                },
+                "additionalProperties": True,
+            },
+        },
+    }
+}
+
+
+def uncompiled_validate(validations, payload):
+    errors = sorted(
+        Draft7Validator(
+            {"type": "object", "additionalProperties": False, **validations}
+        ).iter_errors(payload),
+        key=str,
+    )
+    return len(errors) == 0
+
+
+def make_payload(size):
+    return {
+        "annotation_list": [
+            {
+                "record_uuid": str(uuid.uuid4()),
+                "labels": {
+                    "labels_record": [
+                        {
+                            "label_name": "sentiment",
+                            "label_level": "record",
+                            "label_value": ["pos"],
+                            "metadata_list": [
+                                {"metadata_name": "conf", "metadata_value": 0.9}
+                            ],
+                        }
+                    ],
+                    "labels_span": [
+                        {
+                            "label_name": "entity",
+                            "label_level": "span",
+                            "label_value": ["PER"],
+                            "start_idx": 0,
+                            "end_idx": 5,
+                        }
+                    ],
+                },
+            }
+            for _ in range(size)
+        ]
+    }
+
+
+if __name__ == "__main__":
+    compiled = d7compile(VALIDATIONS)
+    print(f"{'labels':>8} {'uncompiled (ms)':>16} {'compiled (ms)':>14} {'speedup':>8}")
+    for size in [10, 100, 1000, 5000]:
+        payload = make_payload(size)
+        number = max(1, 2000 // size)
+        uncompiled = min(
+            timeit.repeat(
+                lambda: uncompiled_validate(VALIDATIONS, payload),
+                number=number,
+                repeat=3,
+            )
+        )
+        fast = min(
+            timeit.repeat(lambda: compiled.validate(payload), number=number, repeat=3)
+        )
+        print(
+            f"{size * 2:>8} {uncompiled / number * 1000:>16.2f} "
+            f"{fast / number * 1000:>14.2f} {uncompiled / fast:>7.1f}x"
+        )
@@ -0,0 +1,172 @@
+"""
+Load test of the gunicorn worker model: requests/second of synchronous
+workers (MEGANNO_WORKER_THREADS=1) against threaded (gthread) workers.
+By default, gunicorn serves a stand-in app whose requests wait like an
+API request does: an auth service call, then Neo4j round trips. With
+--url, a running API service is loaded instead (GET /schemas), to be run
+once per MEGANNO_WORKER_THREADS setting of the service.
+
+    cd tests/
+    python benchmark/bench_workers.py
+    python benchmark/bench_workers.py --url http://localhost:5000/meganno --token ...
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+from flask import Flask, jsonify
+
+# same number of workers as api/gunicorn.conf.py
+WORKERS = min(multiprocessing.cpu_count(), 4) + 1
+THREADS = [1, 4, 8]
+# concurrent clients and seconds of each run
+CLIENTS = 32
+SECONDS = 10
+# waits of a request of the stand-in app
+AUTH_SECONDS = 0.02
+NEO4J_SECONDS = 0.005
+NEO4J_ROUND_TRIPS = 3
+
+app = Flask(__name__)
+
+
+@app.route("/schemas", methods=["GET"])
+def get_schema():
+    time.sleep(AUTH_SECONDS)
+    for _ in range(NEO4J_ROUND_TRIPS):
+        time.sleep(NEO4J_SECONDS)
+    return jsonify([{"uuid": "schema", "active": True}])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(threads, port):
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            f"--workers={WORKERS}",
+            f"--threads={threads}",
+            f"--worker-class={'gthread' if threads > 1 else 'sync'}",
+            f"--bind=127.0.0.1:{port}",
+            "bench_workers:app",
+        ],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/schemas", timeout=1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start.")
+
+
+def load(url, token=None, clients=CLIENTS, seconds=SECONDS):
+    """
+    Send requests from concurrent clients for a number of seconds.
+    :return: (requests per second, p50 seconds, p99 seconds, errors)
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        # a connection per request, as sync workers do not keep connections
+        # alive; kept-alive connections stay with the worker that accepted them
+        own_latencies, own_errors = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = requests.get(
+                    url, json={"token": token, "active": True}, timeout=30
+                )
+                if response.status_code != 200:
+                    own_errors += 1
+            except requests.RequestException:
+                own_errors += 1
+            own_latencies.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(own_latencies)
+            errors.append(own_errors)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return (
+        len(latencies) / elapsed,
+        latencies[len(latencies) // 2],
+        latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        sum(errors),
+    )
+
+
+def report(name, result, baseline=None):
+    rate, p50, p99, errors = result
+    speedup = f"{rate / baseline:>6.1f}x" if baseline else " " * 7
+    print(
+        f"{name:<24} {rate:>9.1f} req/s {speedup}"
+        f"  p50 {p50 * 1000:>7.1f} ms  p99 {p99 * 1000:>7.1f} ms  errors {errors}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="base url of a running API service")
+    parser.add_argument("--token", help="token of a user of the service")
+    parser.add_argument("--clients", type=int, default=CLIENTS)
+    parser.add_argument("--seconds", type=float, default=SECONDS)
+    arguments = parser.parse_args()
+
+    print(f"{arguments.clients} clients, {arguments.seconds:g} s per run")
+    if arguments.url:
+        result = load(
+            f"{arguments.url}/schemas",
+            arguments.token,
+            arguments.clients,
+            arguments.seconds,
+        )
+        report(arguments.url, result)
+        sys.exit(0)
+
+    print(
+        f"{WORKERS} workers, stand-in requests waiting "
+        f"{(AUTH_SECONDS + NEO4J_ROUND_TRIPS * NEO4J_SECONDS) * 1000:g} ms"
+    )
+    baseline = None
+    for threads in THREADS:
+        port = free_port()
+        process = start_gunicorn(threads, port)
+        try:
+            result = load(
+                f"http://127.0.0.1:{port}/schemas",
+                clients=arguments.clients,
+                seconds=arguments.seconds,
+            )
+        finally:
+            process.terminate()
+            process.wait()
+        name = "sync" if threads == 1 else f"gthread, {threads} threads"
+        report(name, result, baseline)
+        baseline = baseline or result[0]
@@ -3,6 +3,7 @@ import unittest
 import pytest
 from app.constants import MAX_QUERY_LIMIT
 from app.core.subset import Subset
+from app.core.utils import InvalidLabelError
 from conftest import TestCore, ValueStorage
 
 
@@ -217,3 +218,161 @@ class TestAnnotationCore(TestCore):
             )
 
             self.assertIsInstance(result, str)
+
+    @pytest.mark.order(after="test_set_spans")
+    def test_get_view_record_annotation(self):
+        s = Subset(self.project, TestAnnotationCore.sample_uuid_list)
+        record_view = s.get_view_record(record_id=True)
+        annotation_view = s.get_view_annotation(annotator_list=[self.annotator])
+        result = s.get_view_record_annotation(
+            record_id=True, annotator_list=[self.annotator]
+        )
+        self.assertEqual(len(result), 10)
+        for item, record, annotation in zip(result, record_view, annotation_view):
+            self.assertEqual(item["uuid"], record["uuid"])
+            self.assertEqual(item["record_id"], record["record_id"])
+            self.assertEqual(item["record_content"], record["record_content"])
+            self.assertEqual(item["record_metadata"], record["record_metadata"])
+            self.assertCountEqual(
+                item["annotation_list"], annotation["annotation_list"]
+            )
+
+    @pytest.mark.order(after="test_set_spans")
+    def test_annotate_batch(self):
+        batch_annotator = "TEST_BATCH_ANNOTATOR"
+        annotation_list = [
+            {
+                "record_uuid": record_uuid,
+                "labels": {
+                    "labels_record": [ValueStorage.record_label_false],
+                    "labels_span": [ValueStorage.span_label_false1],
+                },
+            }
+            for record_uuid in self.sample_uuid_list[5:9]
+        ]
+        # invalid items should not fail the rest of the batch
+        annotation_list.append({"record_uuid": "NON_EXISTING_UUID", "labels": {}})
+        annotation_list.append({"labels": {}})
+        result = self.project.annotate_batch(
+            annotation_list=annotation_list, annotator=batch_annotator
+        )
+        self.assertEqual(len(result), 6)
+        for item, record_uuid in zip(result[:4], self.sample_uuid_list[5:9]):
+            self.assertEqual(item["uuid"], record_uuid)
+            self.assertIsInstance(item["annotation_uuid"], str)
+        self.assertTrue(result[4]["error"].startswith("ValueNotExistsError"))
+        self.assertTrue(result[5]["error"].startswith("Bad request"))
+
+        s = Subset(self.project, self.sample_uuid_list[5:9])
+        view = s.get_view_annotation(annotator_list=[batch_annotator])
+        for item in view:
+            annotation = item["annotation_list"][0]
+            self.assertEqual(len(annotation["labels_record"]), 1)
+            self.assertEqual(len(annotation["labels_span"]), 1)
+
+        # re-annotating overwrites labels not included in the new batch
+        result = self.project.annotate_batch(
+            annotation_list=[
+                {
+                    "record_uuid": record_uuid,
+                    "labels": {"labels_record": [ValueStorage.record_label_false]},
+                }
+                for record_uuid in self.sample_uuid_list[5:9]
+            ],
+            annotator=batch_annotator,
+        )
+        view = s.get_view_annotation(annotator_list=[batch_annotator])
+        for item in view:
+            self.assertEqual(item["annotation_list"][0]["labels_span"], [])
+
+        # items of the same record are applied in order, the last one wins
+        record_uuid = self.sample_uuid_list[5]
+        result = self.project.annotate_batch(
+            annotation_list=[
+                {
+                    "record_uuid": record_uuid,
+                    "labels": {"labels_record": [ValueStorage.record_label_false]},
+                },
+                {
+                    "record_uuid": record_uuid,
+                    "labels": {"labels_span": [ValueStorage.span_label_false1]},
+                },
+            ],
+            annotator=batch_annotator,
+        )
+        self.assertEqual(result[0]["annotation_uuid"], result[1]["annotation_uuid"])
+        view = Subset(self.project, [record_uuid]).get_view_annotation(
+            annotator_list=[batch_annotator]
+        )
+        annotation = view[0]["annotation_list"][0]
+        self.assertEqual(annotation["labels_record"], [])
+        self.assertEqual(len(annotation["labels_span"]), 1)
+
+    @pytest.mark.order(after="test_annotate_batch")
+    def test_annotate_batch_metadata_conflicts(self):
+        # items of the same record are checked against the metadata
+        # written by the items before them
+        record_uuid = self.sample_uuid_list[6]
+        label = {
+            **ValueStorage.record_label_false,
+            "metadata_list": self.metadata_list[:1],
+        }
+        result = self.project.annotate_batch(
+            annotation_list=[
+                {"record_uuid": record_uuid, "labels": {"labels_record": [label]}},
+                {"record_uuid": record_uuid, "labels": {"labels_record": [label]}},
+            ],
+            annotator="TEST_BATCH_METADATA_ANNOTATOR",
+        )
+        self.assertIsInstance(result[0]["annotation_uuid"], str)
+        self.assertNotIn("annotation_uuid", result[1])
+        self.assertIn("already existed", result[1]["error"])
+
+    @pytest.mark.order(after="test_annotate_batch")
+    def test_label_validation(self):
+        # labels not in the active schema are rejected before any write
+        record_uuid = TestAnnotationCore.sample_uuid_list[0]
+        annotator = "validation_annotator"
+        self.project.validate_labels = True
+        try:
+            with self.assertRaises(InvalidLabelError):
+                self.project.annotate(
+                    record_uuid=record_uuid,
+                    labels={"labels_record": [ValueStorage.record_label2_true]},
+                    annotator=annotator,
+                )
+            with self.assertRaises(InvalidLabelError):
+                self.project.label(
+                    record_uuid=record_uuid,
+                    labels=[{**ValueStorage.record_label_true, "label_value": ["x"]}],
+                    annotator=annotator,
+                )
+            result = self.project.annotate_batch(
+                annotation_list=[
+                    {
+                        "record_uuid": record_uuid,
+                        "labels": {"labels_record": [ValueStorage.record_label_true]},
+                    },
+                    {
+                        "record_uuid": record_uuid,
+                        "labels": {
+                            "labels_span": [
+                                {
+                                    **ValueStorage.span_label_true1,
+                                    "label_name": "pair_validation",
+                                }
+                            ]
+                        },
+                    },
+                ],
+                annotator=annotator,
+            )
+            self.assertIn("annotation_uuid", result[0])
+            self.assertTrue(result[1]["error"].startswith("InvalidLabelError"))
+        finally:
+            self.project.validate_labels = False
+        s = Subset(self.project, [record_uuid])
+        view = s.get_view_annotation(annotator_list=[annotator])
+        self.assertEqual(
+            view[0]["annotation_list"][0]["labels_record"][0]["label_value"], ["true"]
+        )
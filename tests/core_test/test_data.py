@@ -1,8 +1,16 @@
+import io
 import json
+import time
 import unittest
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
 from app.constants import MAX_QUERY_LIMIT
+from app.core.import_manager import ImportManager
+from app.core.import_readers import read_batches, read_vector_batches
+from app.core.subset import Subset
 from conftest import TestCore, ValueStorage
 
 
@@ -38,6 +46,203 @@ class TestDataCore(TestCore):
         )
         self.assertEqual(result, 3)
 
+    @pytest.mark.order(after="test_import_df")
+    def test_import_upload(self):
+        # re-importing the same rows from uploaded files
+        column_mapping = ValueStorage.import_column_mapping
+        ndjson = "\n".join([json.dumps(row) for row in ValueStorage.import_df_dict])
+        result = self.project.import_batches(
+            batches=read_batches(
+                stream=io.BytesIO(ndjson.encode()),
+                file_type="NDJSON",
+                column_mapping=column_mapping,
+                batch_size=2,
+            ),
+            column_mapping=column_mapping,
+        )
+        self.assertEqual(result, 3)
+
+        parquet = io.BytesIO()
+        pq.write_table(pa.Table.from_pylist(ValueStorage.import_df_dict), parquet)
+        parquet.seek(0)
+        result = self.project.import_batches(
+            batches=read_batches(
+                stream=parquet, file_type="PARQUET", column_mapping=column_mapping
+            ),
+            column_mapping=column_mapping,
+        )
+        self.assertEqual(result, 3)
+
+    @pytest.mark.order(after="test_import_df")
+    def test_import_df_background(self):
+        # re-importing the same rows matches the existing records
+        import_manager = ImportManager(self.project, chunk_size=2)
+        job_uuid = import_manager.submit_rows(
+            rows=ValueStorage.import_df_dict,
+            column_mapping=ValueStorage.import_column_mapping,
+        )
+        for _ in range(100):
+            job = import_manager.get_job(job_uuid)
+            if job["status"] not in ["UPLOADING", "RUNNING"]:
+                break
+            time.sleep(0.1)
+        self.assertEqual(job["status"], "COMPLETED")
+        self.assertEqual(job["total_chunks"], 2)
+        self.assertEqual(job["committed_chunks"], 2)
+        self.assertEqual(job["created"], 0)
+        self.assertEqual(job["matched"], 3)
+        self.assertIsNone(import_manager.get_job("invalid"))
+
+    @pytest.mark.order(after="test_import_df_background")
+    def test_import_resume(self):
+        import_manager = ImportManager(self.project, chunk_size=2)
+        job_uuid = import_manager.submit_rows(
+            rows=ValueStorage.import_df_dict,
+            column_mapping=ValueStorage.import_column_mapping,
+        )
+        job = self.__wait_for_job(import_manager, job_uuid)
+        self.assertEqual(job["last_committed_offset"], 3)
+        with self.assertRaises(ValueError):
+            import_manager.retry(job_uuid)
+
+        # a worker crashed while the last chunk was pending
+        self.project.database.write_db(
+            """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            SET j.status = 'RUNNING', j.lease_until = 0, j.last_committed_offset = 2
+            CREATE (:ImportChunk {job_uuid: j.uuid, index: 1, offset: 2,
+                rows: $rows, status: 'PENDING'})
+            """,
+            args={
+                "job_uuid": job_uuid,
+                "rows": json.dumps(ValueStorage.import_df_dict[2:]),
+            },
+        )
+        self.assertEqual(import_manager.resume(), [job_uuid])
+        job = self.__wait_for_job(import_manager, job_uuid)
+        self.assertEqual(job["status"], "COMPLETED")
+        self.assertEqual(job["committed_chunks"], 3)
+        self.assertEqual(job["matched"], 4)
+        self.assertEqual(job["last_committed_offset"], 3)
+        self.assertEqual(import_manager.resume(), [])
+
+    @pytest.mark.order(after="test_import_resume")
+    def test_import_upload_failure(self):
+        import_manager = ImportManager(self.project, chunk_size=2)
+
+        def batches():
+            yield ValueStorage.import_df_dict
+            raise ValueError("truncated file")
+
+        with self.assertRaises(ValueError):
+            import_manager.submit_batches(
+                batches=batches(), column_mapping=ValueStorage.import_column_mapping
+            )
+        job_uuid = self.project.database.read_db(
+            """
+            MATCH (j:ImportJob {upload_failed: true})
+            RETURN j.uuid as uuid ORDER BY j.created_on DESC LIMIT 1
+            """
+        )[0]["uuid"]
+        job = import_manager.get_job(job_uuid)
+        self.assertEqual(job["status"], "FAILED")
+        self.assertEqual(job["failed_chunks"], 0)
+        self.assertTrue(job["errors"][0].startswith("upload:"))
+        # the chunks stored before the failure are not imported by a retry
+        with self.assertRaises(ValueError):
+            import_manager.retry(job_uuid)
+        result = self.project.database.read_db(
+            "MATCH (c:ImportChunk {job_uuid: $job_uuid}) RETURN c",
+            args={"job_uuid": job_uuid},
+        )
+        self.assertEqual(len(result), 0)
+        self.assertEqual(import_manager.get_job(job_uuid)["status"], "FAILED")
+
+    @pytest.mark.order(after="test_import_upload_failure")
+    def test_import_upload_interrupted(self):
+        # the worker storing the rows of a job died during the upload
+        import_manager = ImportManager(self.project, chunk_size=2)
+        job_uuid = self.project.database.write_db(
+            """
+            CREATE (j:ImportJob {uuid: randomUUID(), status: 'UPLOADING',
+                file_type: 'DF', column_mapping: '{}', created_on: DateTime(),
+                updated_on: DateTime(), errors: [], failed_chunks: 0, lease_until: 0})
+            CREATE (:ImportChunk {job_uuid: j.uuid, index: 0, offset: 0,
+                rows: '[]', status: 'PENDING'})
+            RETURN j.uuid as uuid
+            """
+        )[0]["uuid"]
+        self.assertEqual(import_manager.resume(), [])
+        job = import_manager.get_job(job_uuid)
+        self.assertEqual(job["status"], "FAILED")
+        self.assertTrue(job["upload_failed"])
+        result = self.project.database.read_db(
+            "MATCH (c:ImportChunk {job_uuid: $job_uuid}) RETURN c",
+            args={"job_uuid": job_uuid},
+        )
+        self.assertEqual(len(result), 0)
+
+    @pytest.mark.order(after="test_import_csv")
+    def test_import_csv_background(self):
+        import_manager = ImportManager(self.project, chunk_size=300)
+        job_uuid = import_manager.submit_csv(
+            url=ValueStorage.import_url,
+            column_mapping=ValueStorage.import_column_mapping,
+        )
+        job = self.__wait_for_job(import_manager, job_uuid)
+        self.assertEqual(job["status"], "COMPLETED")
+        self.assertEqual(job["source"], ValueStorage.import_url)
+        self.assertEqual(job["column_mapping"], ValueStorage.import_column_mapping)
+        self.assertEqual(job["last_committed_offset"], 1000)
+        self.assertEqual(job["matched"], 1000)
+
+    @pytest.mark.order(after="test_import_csv_background")
+    def test_import_csv_lease_taken_over(self):
+        manager = ImportManager(self.project, chunk_size=300)
+        job_uuid = manager.submit_csv(
+            url=ValueStorage.import_url,
+            column_mapping=ValueStorage.import_column_mapping,
+        )
+        job = self.__wait_for_job(manager, job_uuid)
+        self.assertEqual(job["status"], "COMPLETED")
+
+        # the lease of the job expired while the manager was still running it
+        self.project.database.write_db(
+            """
+            MATCH (j:ImportJob {uuid: $job_uuid})
+            SET j.status = 'RUNNING', j.lease_until = 0, j.lease_owner = $owner,
+                j.last_committed_offset = 0, j.created = 0, j.matched = 0
+            """,
+            args={"job_uuid": job_uuid, "owner": manager.owner},
+        )
+        other_manager = ImportManager(self.project, chunk_size=300)
+        self.assertEqual(other_manager.resume(), [job_uuid])
+        # the first manager stops at its next commit, without counting rows
+        # or failing the job
+        manager._ImportManager__import_csv(
+            {
+                "uuid": job_uuid,
+                "source": ValueStorage.import_url,
+                "column_mapping": ValueStorage.import_column_mapping,
+                "dataset": "",
+                "last_committed_offset": 0,
+            }
+        )
+        job = self.__wait_for_job(other_manager, job_uuid)
+        self.assertEqual(job["status"], "COMPLETED")
+        self.assertEqual(job["last_committed_offset"], 1000)
+        self.assertEqual(job["matched"], 1000)
+        self.assertEqual(job["errors"], [])
+
+    @staticmethod
+    def __wait_for_job(import_manager, job_uuid):
+        for _ in range(100):
+            job = import_manager.get_job(job_uuid)
+            if job["status"] not in ["UPLOADING", "RUNNING"]:
+                break
+            time.sleep(0.1)
+        return job
+
     def test_invalid_input(self):
         pass
 
@@ -52,6 +257,79 @@ class TestDataCore(TestCore):
         result = self.project.search(regex=regex)
         self.assertEqual(len(result), 2)
 
+    @pytest.mark.order(after="test_import_df")
+    def test_search_fulltext(self):
+        keyword_result = self.project.search(
+            keyword="certificate", search_mode="KEYWORD", limit=MAX_QUERY_LIMIT
+        )
+        self.assertGreater(len(keyword_result), 0)
+        for item in self.project.get_data_content(keyword_result):
+            self.assertIn("certificate", item["data"].lower())
+
+        prefix_result = self.project.search(
+            keyword="certif", search_mode="PREFIX", limit=MAX_QUERY_LIMIT
+        )
+        self.assertTrue(set(keyword_result).issubset(set(prefix_result)))
+
+        scored_result = self.project.search(
+            keyword="certificate", search_mode="KEYWORD", include_scores=True
+        )
+        scores = [item["score"] for item in scored_result]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    @pytest.mark.order(after="test_import_df")
+    def test_search_cursor(self):
+        expected = self.project.search(
+            keyword="certificate", limit=MAX_QUERY_LIMIT, with_cursor=True
+        )
+        self.assertIsNone(expected["next_cursor"])
+
+        result = []
+        cursor = None
+        while True:
+            page = self.project.search(
+                keyword="certificate", limit=1, cursor=cursor, with_cursor=True
+            )
+            result.extend(page["uuid_list"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(result, expected["uuid_list"])
+
+        with self.assertRaises(ValueError):
+            self.project.search(cursor="invalid", with_cursor=True)
+
+    @pytest.mark.order(after="test_search_cursor")
+    def test_search_cursor_null_record_id(self):
+        # records without record_id are returned once, and pages still end
+        uuid = "TEST_SEARCH_NULL_RECORD_ID"
+        self.project.database.write_db(
+            "CREATE (r:Record {uuid: $uuid, content: 'certificate, no record id'})",
+            args={"uuid": uuid},
+        )
+        try:
+            result = []
+            cursor = None
+            while True:
+                page = self.project.search(
+                    keyword="certificate", limit=1, cursor=cursor, with_cursor=True
+                )
+                result.extend(page["uuid_list"])
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            self.assertEqual(result.count(uuid), 1)
+            self.assertEqual(result, sorted(set(result)))
+        finally:
+            self.project.database.write_db(
+                "MATCH (r:Record {uuid: $uuid}) DETACH DELETE r", args={"uuid": uuid}
+            )
+
+    @pytest.mark.order(after="test_import_df")
+    def test_search_regex_mode(self):
+        result = self.project.search(keyword="^cr.*s is.*$", search_mode="REGEX")
+        self.assertEqual(len(result), 2)
+
     @pytest.mark.order(after="test_import_df")
     def test_invalid_search(self):
         pass
@@ -77,6 +355,159 @@ class TestDataCore(TestCore):
         )
         self.assertEqual(result, cnt)
 
+    @pytest.mark.order(after="test_import_record_meta")
+    def test_suggest_similar(self):
+        data_uuid_list = self.project.search(limit=4)
+        vectors = [[1.0, 0.0], [0.9, 0.1], [0.0, 1.0], [0.1, 0.9]]
+        self.project.batch_update_metadata(
+            record_meta_name="test_embedding",
+            metadata_list=[
+                {"uuid": uuid, "value": vector}
+                for uuid, vector in zip(data_uuid_list, vectors)
+            ],
+        )
+        subset = Subset(self.project, data_uuid_list[:1])
+        self.assertEqual(
+            subset.suggest_similar("test_embedding", limit=2),
+            [data_uuid_list[1], data_uuid_list[3]],
+        )
+
+        # the index picks up updated vectors
+        self.project.batch_update_metadata(
+            record_meta_name="test_embedding",
+            metadata_list=[{"uuid": data_uuid_list[2], "value": [1.0, 0.0]}],
+        )
+        self.assertEqual(
+            subset.suggest_similar("test_embedding", limit=1), [data_uuid_list[2]]
+        )
+
+    @pytest.mark.order(after="test_suggest_similar")
+    def test_bulk_update_metadata(self):
+        data_uuid_list = self.project.search(limit=4)
+        vectors = np.array(
+            [[0.0, 1.0], [0.1, 0.9], [1.0, 0.0], [0.9, 0.1]], dtype=np.float32
+        )
+        npy = io.BytesIO()
+        np.save(npy, vectors)
+        npy.seek(0)
+        result = self.project.bulk_update_metadata(
+            record_meta_name="test_embedding",
+            batches=read_vector_batches(
+                stream=npy, file_type="NPY", uuid_list=data_uuid_list, batch_size=3
+            ),
+        )
+        self.assertEqual(result, 4)
+        # every batch is picked up by the embedding index
+        subset = Subset(self.project, data_uuid_list[:1])
+        self.assertEqual(
+            subset.suggest_similar("test_embedding", limit=2),
+            [data_uuid_list[1], data_uuid_list[3]],
+        )
+        subset = Subset(self.project, data_uuid_list[2:3])
+        self.assertEqual(
+            subset.suggest_similar("test_embedding", limit=1), [data_uuid_list[3]]
+        )
+
+    @pytest.mark.order(after="test_bulk_update_metadata")
+    def test_import_metadata_refreshes_index(self):
+        data_uuid_list = self.project.search(limit=4)
+        subset = Subset(self.project, data_uuid_list[:1])
+        # the index is loaded before the import
+        self.assertEqual(
+            subset.suggest_similar("test_embedding", limit=1), [data_uuid_list[1]]
+        )
+        record = self.project.database.read_db(
+            """
+            MATCH (r:Record {uuid: $uuid})
+            RETURN r.record_id as record_id, r.content as content, r.dataset as dataset
+            """,
+            args={"uuid": data_uuid_list[2]},
+        )[0]
+        self.project.import_rows(
+            rows=[
+                {
+                    "sent_id": record["record_id"],
+                    "content": record["content"],
+                    "test_embedding": [0.0, 1.0],
+                }
+            ],
+            column_mapping={
+                "id": "sent_id",
+                "content": "content",
+                "metadata": "test_embedding",
+            },
+            dataset=record["dataset"],
+        )
+        self.assertEqual(
+            subset.suggest_similar("test_embedding", limit=1), [data_uuid_list[2]]
+        )
+
+    @pytest.mark.order(after="test_import_record_meta")
+    def test_database_iter_and_pool_stats(self):
+        database = self.project.database
+        q = "MATCH (r:Record) RETURN r.uuid as uuid ORDER BY r.uuid"
+        records = database.iter_db(q)
+        first = next(records)
+        # the session is held until the iterator is exhausted
+        self.assertGreaterEqual(database.pool_stats()["sessions"], 1)
+        uuids = [first["uuid"]] + [item["uuid"] for item in records]
+        self.assertEqual(uuids, [item["uuid"] for item in database.read_db(q)])
+
+        stats = database.pool_stats()
+        self.assertEqual(stats["sessions"], 0)
+        self.assertGreaterEqual(stats["max_sessions"], 1)
+        self.assertGreaterEqual(stats["idle"], 1)
+        self.assertEqual(stats["in_use"], 0)
+
+        # per-query timeouts are enforced by the database
+        with self.assertRaises(Exception):
+            database.read_db("CALL apoc.util.sleep(3000) RETURN 1", timeout=0.5)
+        self.assertEqual(database.read_db("RETURN 1 as one", timeout=5)[0]["one"], 1)
+
+    @pytest.mark.order(after="test_database_iter_and_pool_stats")
+    def test_query_stats(self):
+        database = self.project.database
+        query_stats = database.query_stats
+        database.write_db(
+            "CREATE (:QueryStatsTest {value: $value})",
+            args={"value": "secret"},
+            name="test.create",
+        )
+        stats = query_stats.stats()["test.create"]
+        self.assertEqual(stats["count"], 1)
+        self.assertEqual(stats["nodes_created"], 1)
+        self.assertEqual(sum(stats["buckets"]), 1)
+
+        # query names default to the calling module.function
+        database.read_db("MATCH (n:QueryStatsTest) RETURN n")
+        stats = query_stats.stats()["test_data.test_query_stats"]
+        self.assertEqual(stats["rows"], 1)
+
+        # slow queries are logged with their parameters redacted
+        slow_query_seconds = query_stats.slow_query_seconds
+        profile_rate = query_stats.profile_rate
+        query_stats.slow_query_seconds = 0
+        query_stats.profile_rate = 1
+        try:
+            with self.assertLogs("slow_query", level="WARNING") as logs:
+                database.write_db(
+                    "MATCH (n:QueryStatsTest {value: $value}) DELETE n",
+                    args={"value": "secret"},
+                    name="test.delete",
+                )
+        finally:
+            query_stats.slow_query_seconds = slow_query_seconds
+            query_stats.profile_rate = profile_rate
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry["name"], "test.delete")
+        self.assertEqual(entry["parameters"], {"value": "str[6]"})
+        self.assertNotIn("secret", logs.output[0])
+        stats = query_stats.stats()["test.delete"]
+        self.assertEqual(stats["nodes_deleted"], 1)
+        self.assertEqual(stats["slow"], 1)
+        self.assertEqual(stats["profiled"], 1)
+        self.assertGreater(stats["db_hits"], 0)
+
     @pytest.mark.order(after="test_import_record_meta")
     def test_search_metadata(self):
         # search by record and label metadata
@@ -8,5 +8,35 @@ from conftest import TestCore, ValueStorage
 @pytest.mark.order(6)
 class TestExportCore(TestCore):
     def test_export(self):
-        result = self.project.export_data()
-        pass
+        result = list(self.project.export_data())
+        # every record is exported, labeled or not
+        record_uuids = set([row["uuid"] for row in result])
+        self.assertEqual(
+            len(record_uuids), self.project.get_statistics().get_record_count()
+        )
+        labeled_rows = [row for row in result if row["label_name"] is not None]
+        self.assertTrue(len(labeled_rows) > 0)
+        for row in labeled_rows:
+            self.assertIsInstance(row["label_metadata"], list)
+            self.assertIsInstance(row["verifications"], list)
+
+    def test_export_pagination(self):
+        # small pages return the same rows as a single page
+        result = list(self.project.export_data(page_size=7))
+        self.assertEqual(result, list(self.project.export_data(page_size=10000)))
+
+    def test_export_null_record_id(self):
+        # records without record_id are exported once, and pages still end
+        uuid = "TEST_EXPORT_NULL_RECORD_ID"
+        self.project.database.write_db(
+            "CREATE (r:Record {uuid: $uuid, content: 'no record id'})",
+            args={"uuid": uuid},
+        )
+        try:
+            result = list(self.project.export_data(page_size=1))
+            self.assertEqual(len([row for row in result if row["uuid"] == uuid]), 1)
+            self.assertEqual(result, list(self.project.export_data(page_size=10000)))
+        finally:
+            self.project.database.write_db(
+                "MATCH (r:Record {uuid: $uuid}) DETACH DELETE r", args={"uuid": uuid}
+            )
@@ -0,0 +1,42 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.core.http_client import HttpClient
+
+
+class CookieHandler(BaseHTTPRequestHandler):
+    # sets a cookie and echoes the cookies sent with the request
+    def do_GET(self):
+        body = (self.headers.get("Cookie") or "").encode()
+        self.send_response(200)
+        self.send_header("Set-Cookie", "session=user_a; Path=/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), CookieHandler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_session_stores_no_cookies(self):
+        # the session is shared by the requests of all users of a worker
+        client = HttpClient()
+        first = client.get("cookie", self.url)
+        self.assertEqual(first.cookies.get("session"), "user_a")
+        second = client.get("cookie", self.url)
+        self.assertEqual(second.text, "")
+        self.assertEqual(len(client.session.cookies), 0)
+        self.assertEqual(client.stats()["cookie"]["count"], 2)
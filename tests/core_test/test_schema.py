@@ -2,6 +2,7 @@ import json
 import unittest
 
 import pytest
+from app.core.schema import ActiveSchemaCache
 from conftest import TestCore, ValueStorage
 
 
@@ -58,6 +59,37 @@ class TestSchemaCore(TestCore):
         result_hisotry = result_inactive = self.schema_obj.get_values(active=None)
         self.assertEqual(len(result_hisotry), 2)
 
+    @pytest.mark.order(after="test_get_updated_schema")
+    def test_active_schema_cache(self):
+        cache = self.project.active_schema
+        version = cache.get_database_version()
+        labels = self.schema_obj.get_labels()
+        self.assertEqual(set(labels), {"pair_validation", "related_span"})
+        self.assertEqual(labels["related_span"]["level"], "span")
+        self.assertEqual(
+            labels["pair_validation"]["options"], {"true", "false", "unresolved"}
+        )
+        # the same schemas in another order are not a new version
+        active = self.schema_obj.get_values(active=True)[0]
+        reordered = {
+            "label_schema": list(reversed(ValueStorage.schema2["label_schema"]))
+        }
+        result = self.schema_obj.set_values(reordered)
+        self.assertEqual(result["uuid"], active["uuid"])
+        self.assertEqual(cache.get_database_version(), version)
+        # a schema update is seen by caches of other processes
+        other = ActiveSchemaCache(self.project)
+        self.assertEqual(other.get()["hash"], cache.get()["hash"])
+        self.schema_obj.set_values(ValueStorage.schema1)
+        self.assertEqual(cache.get_database_version(), version + 1)
+        self.assertEqual(set(other.get()["labels"]), {"pair_validation"})
+        # the reload after the update is a miss, unchanged versions are hits
+        other.get()
+        self.assertEqual(
+            {key: other.stats()[key] for key in ["hits", "misses"]},
+            {"hits": 1, "misses": 2},
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
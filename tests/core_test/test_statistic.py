@@ -0,0 +1,286 @@
+import io
+import itertools
+import multiprocessing
+import os
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+from app.core.import_readers import read_vector_batches
+from app.core.projection import ProjectionCache, projection_uid
+from app.core.statistic import cohen_kappa
+from app.enums.projection_status import ProjectionStatus
+from conftest import TestCore, ValueStorage
+
+
+@pytest.mark.order(6)
+class TestStatisticCore(TestCore):
+    def get_statistics(self):
+        statistic = self.project.get_statistics()
+        return {
+            "progress": statistic.get_label_progress(),
+            "distributions": statistic.get_label_distributions(
+                label_name=ValueStorage.record_label_true["label_name"]
+            ),
+            "contributions": statistic.get_annotator_contributions(),
+        }
+
+    def test_materialized_statistics(self):
+        # counters built from the existing labels match the label scans
+        statistic = self.project.get_statistics()
+        expected = self.get_statistics()
+        statistic.rebuild_label_statistics(chunk_size=5)
+        self.assertTrue(statistic.is_materialized())
+        self.assertEqual(self.get_statistics(), expected)
+
+    @pytest.mark.order(after="test_materialized_statistics")
+    def test_statistics_on_write(self):
+        # counters follow annotations and label removals
+        expected = self.get_statistics()
+        record_uuid = self.project.search(limit=1)[0]
+        annotator = "statistic_annotator"
+        self.project.annotate(
+            record_uuid=record_uuid,
+            labels={"labels_record": [ValueStorage.record_label_true]},
+            annotator=annotator,
+        )
+        result = self.get_statistics()
+        self.assertEqual(result["contributions"][annotator], 1)
+        self.assertEqual(result["progress"]["total"], expected["progress"]["total"])
+
+        self.project.remove_label(
+            annotator=annotator,
+            record_uuid=record_uuid,
+            label_name=ValueStorage.record_label_true["label_name"],
+            label_level="record",
+        )
+        self.assertEqual(self.get_statistics(), expected)
+
+    def test_annotator_agreements(self):
+        # pairwise kappas match cohen_kappa on the annotator x record table
+        statistic = self.project.get_statistics()
+        label_name = ValueStorage.record_label_true["label_name"]
+        result = self.project.database.read_db(
+            """
+            MATCH (l:Label)-[]-(an:Annotation)-[]-(r:Record)
+            WHERE l.label_name = $label_name
+            RETURN r.uuid as uuid, l.label_value as label_list, an.annotator as annotator
+            """,
+            args={"label_name": label_name},
+        )
+        labels = {}
+        for item in result:
+            labels.setdefault(item["annotator"], {})[item["uuid"]] = ",".join(
+                item["label_list"]
+            )
+        uuids = sorted({item["uuid"] for item in result})
+        columns = {
+            annotator: [labels[annotator].get(uuid, "NULL") for uuid in uuids]
+            for annotator in labels
+        }
+        agreements = statistic.get_annotator_agreements(label_name=label_name)
+        self.assertEqual(len(agreements), len(columns) ** 2)
+        for an1, an2 in itertools.product(columns, columns):
+            expected = 1.0 if an1 == an2 else cohen_kappa(columns[an1], columns[an2])
+            self.assertAlmostEqual(agreements[f"{an1},{an2}"], expected, places=3)
+
+        for metric in ["fleiss_kappa", "krippendorff_alpha"]:
+            value = statistic.get_annotator_agreements(
+                label_name=label_name, metric=metric
+            )[metric]
+            self.assertTrue(value is None or -1 <= value <= 1)
+        with self.assertRaises(ValueError):
+            statistic.get_annotator_agreements(label_name=label_name, metric="unknown")
+
+    def test_embedding_projection(self):
+        # projections are fitted in the background and cached until the
+        # labeled records or their embeddings change
+        statistic = self.project.get_statistics()
+        label_name = ValueStorage.record_label_true["label_name"]
+        uuid_list = self.project.search(limit=4)
+        for record_uuid in uuid_list:
+            self.project.annotate(
+                record_uuid=record_uuid,
+                labels={"labels_record": [ValueStorage.record_label_true]},
+                annotator="projection_annotator",
+            )
+        npy = io.BytesIO()
+        np.save(npy, np.eye(4, dtype=np.float32))
+        npy.seek(0)
+        self.project.bulk_update_metadata(
+            record_meta_name="projection_embedding",
+            batches=read_vector_batches(
+                stream=npy, file_type="NPY", uuid_list=uuid_list
+            ),
+        )
+        status, result = statistic.get_embedding_aggregated_label(
+            label_name=label_name, embedding_type="projection_embedding"
+        )
+        self.assertEqual(status, ProjectionStatus.COMPUTING)
+        self.assertEqual(result, [])
+        deadline = time.time() + 120
+        while status == ProjectionStatus.COMPUTING and time.time() < deadline:
+            time.sleep(0.5)
+            status, result = statistic.get_embedding_aggregated_label(
+                label_name=label_name, embedding_type="projection_embedding"
+            )
+        self.assertEqual(status, ProjectionStatus.READY)
+        self.assertEqual(len(result), 4)
+        self.assertTrue(
+            all(set(item) == {"x_axis", "y_axis", "agg_label"} for item in result)
+        )
+
+        # a changed embedding is refreshed, serving the previous projection
+        npy = io.BytesIO()
+        np.save(npy, np.ones((1, 4), dtype=np.float32))
+        npy.seek(0)
+        self.project.bulk_update_metadata(
+            record_meta_name="projection_embedding",
+            batches=read_vector_batches(
+                stream=npy, file_type="NPY", uuid_list=uuid_list[:1]
+            ),
+        )
+        status, stale = statistic.get_embedding_aggregated_label(
+            label_name=label_name, embedding_type="projection_embedding"
+        )
+        self.assertEqual(status, ProjectionStatus.COMPUTING)
+        self.assertEqual(len(stale), 4)
+
+    @pytest.mark.order(after="test_embedding_projection")
+    def test_embedding_projection_methods(self):
+        statistic = self.project.get_statistics()
+        label_name = ValueStorage.record_label_true["label_name"]
+        for method in ["PCA", "SVD", "SAMPLE"]:
+            deadline = time.time() + 60
+            status = ProjectionStatus.COMPUTING
+            while status == ProjectionStatus.COMPUTING and time.time() < deadline:
+                status, result = statistic.get_embedding_aggregated_label(
+                    label_name=label_name,
+                    embedding_type="projection_embedding",
+                    method=method,
+                )
+                time.sleep(0.5)
+            self.assertEqual(status, ProjectionStatus.READY)
+            self.assertEqual(len(result), 4)
+
+        # a fitted SAMPLE projection places changed records without refitting
+        uuid_list = self.project.search(limit=4)
+        npy = io.BytesIO()
+        np.save(npy, np.full((1, 4), 0.5, dtype=np.float32))
+        npy.seek(0)
+        self.project.bulk_update_metadata(
+            record_meta_name="projection_embedding",
+            batches=read_vector_batches(
+                stream=npy, file_type="NPY", uuid_list=uuid_list[1:2]
+            ),
+        )
+        status, result = statistic.get_embedding_aggregated_label(
+            label_name=label_name,
+            embedding_type="projection_embedding",
+            method="SAMPLE",
+        )
+        self.assertEqual(status, ProjectionStatus.READY)
+        self.assertEqual(len(result), 4)
+        with self.assertRaises(ValueError):
+            statistic.get_embedding_aggregated_label(
+                label_name=label_name, embedding_type="projection_embedding", method="X"
+            )
+
+    def test_embedding_projection_broken_pool(self):
+        # a pool broken by a dying process is replaced, not reported as an
+        # error of the records
+        cache = ProjectionCache(self.project.database)
+        broken = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        )
+        with self.assertRaises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+        cache._ProjectionCache__executor = broken
+        cache._ProjectionCache__pid = os.getpid()
+        uuids = ["broken_pool_a", "broken_pool_b", "broken_pool_c"]
+        embeddings = np.eye(3)
+        status, _ = cache.get("broken_pool", "label", uuids, embeddings, method="PCA")
+        self.assertEqual(status, ProjectionStatus.COMPUTING)
+        self.assertIsNot(cache.executor, broken)
+        deadline = time.time() + 60
+        while status == ProjectionStatus.COMPUTING and time.time() < deadline:
+            time.sleep(0.5)
+            status, result = cache.get(
+                "broken_pool", "label", uuids, embeddings, method="PCA"
+            )
+        self.assertEqual(status, ProjectionStatus.READY)
+        self.assertEqual(set(result), set(uuids))
+
+    def test_embedding_projection_sample_refit(self):
+        # a SAMPLE projection places new records until they double
+        cache = ProjectionCache(self.project.database)
+        uuids = [f"sample_refit_{index}" for index in range(5)]
+        embeddings = np.random.default_rng(0).random((5, 3))
+
+        def get(count):
+            return cache.get(
+                "sample_refit", "label", uuids[:count], embeddings[:count], "SAMPLE"
+            )
+
+        status, _ = get(2)
+        deadline = time.time() + 60
+        while status == ProjectionStatus.COMPUTING and time.time() < deadline:
+            time.sleep(0.5)
+            status, _ = get(2)
+        self.assertEqual(status, ProjectionStatus.READY)
+        status, result = get(4)
+        self.assertEqual(status, ProjectionStatus.READY)
+        self.assertEqual(len(result), 4)
+        # fitted on 2 records, 5 records are fitted again
+        status, result = get(5)
+        self.assertEqual(status, ProjectionStatus.COMPUTING)
+        self.assertEqual(len(result), 4)
+
+    def test_embedding_projection_stale_fit(self):
+        # a fit claimed before the saved one does not overwrite it
+        cache = ProjectionCache(self.project.database)
+        uuids = ["stale_fit_a", "stale_fit_b", "stale_fit_c"]
+        embeddings = np.eye(3)
+        status, _ = cache.get("stale_fit", "label", uuids, embeddings, method="PCA")
+        deadline = time.time() + 60
+        while status == ProjectionStatus.COMPUTING and time.time() < deadline:
+            time.sleep(0.5)
+            status, result = cache.get(
+                "stale_fit", "label", uuids, embeddings, method="PCA"
+            )
+        self.assertEqual(status, ProjectionStatus.READY)
+        cache._ProjectionCache__save(
+            projection_uid("stale_fit", "label", "PCA"),
+            "stale",
+            uuids[:2],
+            np.zeros((2, 2)),
+            (np.zeros(3), np.zeros((2, 3))),
+            claimed_on=0,
+        )
+        status, stale = cache.get("stale_fit", "label", uuids, embeddings, method="PCA")
+        self.assertEqual(status, ProjectionStatus.READY)
+        self.assertEqual(stale, result)
+
+    def test_label_distribution_aggregations(self):
+        statistic = self.project.get_statistics()
+        label_name = ValueStorage.record_label_true["label_name"]
+        expected = statistic.get_label_distributions(label_name=label_name)
+        # unweighted votes match the majority vote counters
+        self.assertEqual(
+            statistic.get_label_distributions(
+                label_name=label_name, aggregation="weighted_majority_vote"
+            ),
+            expected,
+        )
+        # one label per record, whichever the function
+        result = statistic.get_label_distributions(
+            label_name=label_name, aggregation="verified_label"
+        )
+        self.assertEqual(sum(result.values()), sum(expected.values()))
+        with self.assertRaises(NotImplementedError):
+            statistic.get_label_distributions(
+                label_name=label_name, aggregation="unknown"
+            )
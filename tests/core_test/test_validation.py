@@ -0,0 +1,82 @@
+import importlib.util
+import os
+import unittest
+
+from jsonschema import Draft7Validator
+
+
+def load_constants(service):
+    # api and auth are built as separate images, each with its own copy of
+    # the validation compiler in app/constants.py; both are loaded here
+    path = os.path.abspath(
+        os.path.join(os.path.dirname(__file__), f"../../{service}/app/constants.py")
+    )
+    spec = importlib.util.spec_from_file_location(f"{service}_constants", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+SERVICES = {service: load_constants(service) for service in ["api", "auth"]}
+
+# (schema, values) cases, compiled results must equal Draft7Validator's
+CASES = [
+    ({"type": "string"}, ["a", "", 1, None, True]),
+    ({"type": ["integer", "null"]}, [1, 1.0, 1.5, None, True, "1"]),
+    ({"type": "number", "minimum": 0, "maximum": 1}, [0, 0.5, 1, -1, 2, False]),
+    ({"type": "string", "minLength": 1, "maxLength": 3}, ["", "a", "abcd", 3]),
+    ({"enum": ["a", "b", None]}, ["a", "c", None, 1]),
+    ({"enum": [1, 2]}, [1, 2, 3, True]),
+    ({"type": "boolean"}, [True, False, 0, None]),
+    (
+        {"type": "array", "items": {"type": "string", "format": "uuid"}},
+        [[], ["a", "b"], ["a", 1], "a", None],
+    ),
+    (
+        {
+            "type": "object",
+            "properties": {"name": {"type": "string"}, "n": {"type": "integer"}},
+            "required": ["name"],
+            "additionalProperties": False,
+        },
+        [{"name": "a"}, {"name": "a", "n": 1}, {"n": 1}, {"name": "a", "x": 1}, []],
+    ),
+    (
+        {"type": "object", "additionalProperties": {"type": "integer"}},
+        [{}, {"a": 1}, {"a": "1"}],
+    ),
+    # keywords that are not compiled fall back to Draft7Validator
+    ({"type": "string", "pattern": "^a"}, ["ab", "ba"]),
+    ({"anyOf": [{"type": "string"}, {"type": "integer"}]}, ["a", 1, None]),
+    ({"items": [{"type": "string"}]}, [["a"], [1]]),
+]
+
+
+class TestValidation(unittest.TestCase):
+    def test_compile_schema(self):
+        for service, constants in SERVICES.items():
+            for schema, values in CASES:
+                is_valid = constants.compile_schema(schema)
+                for value in values:
+                    with self.subTest(service=service, schema=schema, value=value):
+                        self.assertEqual(
+                            is_valid(value), Draft7Validator(schema).is_valid(value)
+                        )
+
+    def test_d7validate_errors(self):
+        validations = {
+            "properties": {
+                "limit": {"type": ["integer", "null"]},
+                "names": {"type": "array", "items": {"type": "string"}},
+            }
+        }
+        payload = {"limit": "1", "names": ["a", 1], "other": None}
+        errors = {}
+        for service, constants in SERVICES.items():
+            compiled = constants.d7compile(validations)
+            constants.d7validate(compiled, {"limit": None, "names": ["a"]})
+            with self.assertRaises(constants.InvalidRequestJson) as context:
+                constants.d7validate(compiled, payload)
+            errors[service] = context.exception.errors
+        self.assertEqual(errors["api"], errors["auth"])
+        self.assertEqual(set(errors["api"].keys()), {"", "limit", "names"})
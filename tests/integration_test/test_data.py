@@ -1,3 +1,4 @@
+import io
 import json
 
 import pydash
@@ -44,6 +45,58 @@ class TestDataService:
         assert pydash.is_equal(len(result), 5)
         
 
+    def test_search_record_fulltext(self):
+        parameters = {
+            "keyword": "history",
+            "search_mode": "KEYWORD",
+            "include_scores": True,
+        }
+        log_test_case(
+            "GET /data/search returns 200 with parameters: {}".format(json.dumps(parameters))
+        )
+        payload = self.service.get_base_payload()
+        payload.update(parameters)
+        response = self.service.get("/data/search", json=payload)
+        assert pydash.is_equal(response.status_code, 200)
+        result = response.json
+        assert type(result) is list
+        assert len(result) > 0
+        assert all(item["score"] is not None for item in result)
+
+    def test_search_record_invalid_mode(self):
+        parameters = {"keyword": "history", "search_mode": "FUZZY"}
+        log_test_case(
+            "GET /data/search returns 422 with parameters: {}".format(json.dumps(parameters))
+        )
+        payload = self.service.get_base_payload()
+        payload.update(parameters)
+        response = self.service.get("/data/search", json=payload)
+        assert pydash.is_equal(response.status_code, 422)
+
+    def test_search_record_cursor(self):
+        parameters = {"limit": 2, "cursor": None}
+        log_test_case(
+            "GET /data/search returns 200 with parameters: {}".format(json.dumps(parameters))
+        )
+        payload = self.service.get_base_payload()
+        payload.update(parameters)
+        response = self.service.get("/data/search", json=payload)
+        assert pydash.is_equal(response.status_code, 200)
+        first_page = response.json
+        assert pydash.is_equal(len(first_page["uuid_list"]), 2)
+        assert first_page["next_cursor"] is not None
+
+        payload.update({"cursor": first_page["next_cursor"]})
+        response = self.service.get("/data/search", json=payload)
+        assert pydash.is_equal(response.status_code, 200)
+        second_page = response.json
+        assert pydash.is_equal(len(second_page["uuid_list"]), 2)
+        assert not set(first_page["uuid_list"]) & set(second_page["uuid_list"])
+
+        payload.update({"cursor": "invalid"})
+        response = self.service.get("/data/search", json=payload)
+        assert pydash.is_equal(response.status_code, 400)
+
     def test_search_record_regex(self):
         parameters = {
             "regex": "^cr.*s is.*$"
@@ -142,3 +195,67 @@ class TestDataService:
         response = self.service.get("/data/search", json=payload)
         assert pydash.is_equal(response.status_code, 422)
         
+
+    def test_upload_data_invalid_file_type(self):
+        parameters = {"file_type": "XLSX"}
+        log_test_case(
+            "POST /data/upload returns 422 with parameters: {}".format(json.dumps(parameters))
+        )
+        data = self.service.get_base_payload()
+        data.update(parameters)
+        data["column_mapping"] = json.dumps({"id": "sent_id", "content": "content"})
+        data["file"] = (io.BytesIO(b""), "data.xlsx")
+        response = self.service.post(
+            "/data/upload", data=data, content_type="multipart/form-data"
+        )
+        assert pydash.is_equal(response.status_code, 422)
+
+    def test_upload_data_token_in_query(self):
+        log_test_case("POST /data/upload returns 401 with the token as a query argument")
+        response = self.service.post(
+            "/data/upload",
+            query_string={**self.service.get_base_payload(), "file_type": "XLSX"},
+            data=b"",
+            content_type="application/octet-stream",
+        )
+        assert pydash.is_equal(response.status_code, 401)
+
+    def test_upload_data_bearer_token(self):
+        log_test_case("POST /data/upload returns 422 with a bearer token and a raw body")
+        response = self.service.post(
+            "/data/upload",
+            query_string={"file_type": "XLSX"},
+            headers={
+                "Authorization": f"Bearer {self.service.get_base_payload()['token']}"
+            },
+            data=b"",
+            content_type="application/octet-stream",
+        )
+        assert pydash.is_equal(response.status_code, 422)
+
+    def test_upload_data_missing_column(self):
+        parameters = {"file_type": "NDJSON"}
+        log_test_case(
+            "POST /data/upload returns 400 with parameters: {}".format(json.dumps(parameters))
+        )
+        data = self.service.get_base_payload()
+        data.update(parameters)
+        data["column_mapping"] = json.dumps({"id": "sent_id", "content": "content"})
+        data["file"] = (io.BytesIO(b'{"content": "no id"}\n'), "data.ndjson")
+        response = self.service.post(
+            "/data/upload", data=data, content_type="multipart/form-data"
+        )
+        assert pydash.is_equal(response.status_code, 400)
+
+    def test_upload_metadata_missing_uuid_list(self):
+        parameters = {"record_meta_name": "embedding", "file_type": "NPY"}
+        log_test_case(
+            "POST /data/metadata/upload returns 400 with parameters: {}".format(json.dumps(parameters))
+        )
+        data = self.service.get_base_payload()
+        data.update(parameters)
+        data["file"] = (io.BytesIO(b""), "embedding.npy")
+        response = self.service.post(
+            "/data/metadata/upload", data=data, content_type="multipart/form-data"
+        )
+        assert pydash.is_equal(response.status_code, 400)
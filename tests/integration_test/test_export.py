@@ -1,3 +1,5 @@
+import json
+
 import pydash
 import pytest
 from conftest import TEST_USER_ID, app
@@ -8,5 +10,41 @@ from context import Service, log_test_case
 class TestExportService:
     service = Service(app)
 
-    def test_export_data(self): 
-        pass
+    def test_export_data(self):
+        payload = self.service.get_base_payload()
+        log_test_case("GET /data/export returns 200")
+        response = self.service.get("/data/export", json=payload)
+        assert pydash.is_equal(response.status_code, 200)
+        assert pydash.is_list(response.json)
+
+    def test_export_data_ndjson(self):
+        payload = self.service.get_base_payload()
+        payload.update({"format": "ndjson"})
+        log_test_case("GET /data/export returns 200 with parameters: ndjson")
+        response = self.service.get("/data/export", json=payload)
+        assert pydash.is_equal(response.status_code, 200)
+        rows = [json.loads(line) for line in response.get_data(True).splitlines()]
+        assert len(rows) > 0
+        assert pydash.is_equal(
+            set(rows[0].keys()),
+            {
+                "record_id",
+                "uuid",
+                "content",
+                "annotator",
+                "label_name",
+                "label_value",
+                "label_level",
+                "start_idx",
+                "end_idx",
+                "label_metadata",
+                "verifications",
+            },
+        )
+
+    def test_export_data_invalid_format(self):
+        payload = self.service.get_base_payload()
+        payload.update({"format": "xml"})
+        log_test_case("GET /data/export returns 422 with parameters: xml")
+        response = self.service.get("/data/export", json=payload)
+        assert pydash.is_equal(response.status_code, 422)
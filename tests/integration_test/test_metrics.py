@@ -0,0 +1,56 @@
+import pydash
+import pytest
+from app.core.metrics import Metrics
+from conftest import app
+from context import Service, log_test_case
+from prometheus_client import CollectorRegistry, Counter
+
+
+@pytest.mark.order(8)
+class TestMetricsService:
+    service = Service(app)
+
+    def test_metrics_without_token(self):
+        log_test_case("GET /metrics returns 200 without a token")
+        response = self.service.get("metrics")
+        assert pydash.is_equal(response.status_code, 200)
+        assert response.content_type.startswith("text/plain")
+
+    def test_metrics_series(self):
+        payload = self.service.get_base_payload()
+        self.service.get("schemas", json=payload)
+        log_test_case("GET /metrics returns request, pool and cache metrics")
+        body = self.service.get("metrics").get_data(True)
+        for series in [
+            'meganno_http_requests_total{method="GET",route="/schemas",status="200"}',
+            "meganno_http_request_duration_seconds_bucket",
+            "meganno_http_requests_in_flight",
+            "meganno_upstream_request_duration_seconds_bucket",
+            'meganno_neo4j_pool_connections{state="in_use"}',
+            "meganno_neo4j_pool_max_connections",
+            "meganno_neo4j_sessions",
+            'meganno_cache_lookups_total{cache="token",result="hit"}',
+            'meganno_cache_lookups_total{cache="schema",result="miss"}',
+        ]:
+            assert series in body, series
+
+    def test_metrics_count(self):
+        # cumulative stats are added as the increase since the last refresh
+        registry = CollectorRegistry()
+        counter = Counter("test_stat", "Test stat", registry=registry)
+        lookups = Counter(
+            "test_lookups", "Test lookups", ["cache", "result"], registry=registry
+        )
+        metrics = Metrics()
+        for value, expected in [(5, 5), (8, 8), (8, 8), (3, 11)]:
+            # a stat lower than the last one was reset, e.g. a replaced cache
+            metrics.count("stat", value, counter)
+            assert registry.get_sample_value("test_stat_total") == expected
+        metrics.count(("test", "hit"), 2, lookups, "test", "hit")
+        metrics.count(("test", "hit"), 6, lookups, "test", "hit")
+        assert (
+            registry.get_sample_value(
+                "test_lookups_total", {"cache": "test", "result": "hit"}
+            )
+            == 6
+        )